@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""LINCOT CoT generation hot-path benchmarks with regression gates.
+
+Usage::
+
+    python3 benchmarks/bench_cot.py --save            # record baseline.json
+    python3 benchmarks/bench_cot.py --threshold 20    # compare, exit 1 on regression
+
+Comparing without a baseline exits 2: the baseline is machine specific and not
+committed, so record one (``make bench_baseline``) on the reference commit first.
+
+Host facts (machine-id, routes, interface addresses) are mocked so that runs are
+reproducible and never touch the real network configuration. I/O is tracked as
+``sys.addaudithook`` audit events for file, socket, ioctl and subprocess
+operations, which is portable and needs no strace. These are not syscalls: one
+audit event may cost several syscalls, and reads and writes on an open file raise none.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, Dict, List
+from unittest import mock
+
+import lincot
+from lincot.position import static_tpv
+from lincot.remarks import build_remarks, get_cockpit_url
+from lincot.settings import Settings
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_ITERATIONS = 2000
+DEFAULT_THRESHOLD = 25.0
+
+AUDIT_EVENTS = frozenset(
+    {
+        "open",
+        "os.listdir",
+        "os.scandir",
+        "socket.__new__",
+        "socket.connect",
+        "socket.gethostname",
+        "fcntl.ioctl",
+        "subprocess.Popen",
+        "os.system",
+        "os.exec",
+        "os.fork",
+    }
+)
+
+# metric -> True when higher is better
+METRICS = {
+    "events_per_sec": True,
+    "p50_us": False,
+    "p90_us": False,
+    "p99_us": False,
+    "peak_alloc_bytes": False,
+    "audit_events_per_call": False,
+}
+
+GPS_INFO = {
+    "class": "TPV",
+    "device": "/dev/ttyACM0",
+    "mode": 3,
+    "time": "2023-06-14T17:32:03.000Z",
+    "lat": 37.760050100,
+    "lon": -122.497702900,
+    "altHAE": 20.6260,
+    "epx": 3.0,
+    "epy": 4.0,
+    "epv": 6.5,
+    "track": 359.4589,
+    "speed": 0.027,
+}
+
+CONFIG = {
+    "COT_URL": "tls://tak.example.com:8089",
+    "CALLSIGN": "bench-node",
+    "SSH_USER": "pi",
+    "STATIC_LAT": "45.0",
+    "STATIC_LON": "-122.0",
+    "STATIC_HAE": "100.0",
+}
+
+# Position events for gpsd mode: no STATIC_* keys.
+GPSD_CONFIG = {key: val for key, val in CONFIG.items() if not key.startswith("STATIC")}
+
+# The workers parse the config once and pass Settings to every call.
+SETTINGS = Settings.from_config(CONFIG)
+GPSD_SETTINGS = Settings.from_config(GPSD_CONFIG)
+
+
+class _AuditCounter:
+    def __init__(self) -> None:
+        self.count = 0
+        self.enabled = False
+
+    def __call__(self, event: str, _args) -> None:
+        if self.enabled and event in AUDIT_EVENTS:
+            self.count += 1
+
+
+_COUNTER = _AuditCounter()
+sys.addaudithook(_COUNTER)
+
+
+def cases() -> Dict[str, Callable[[], object]]:
+    """Benchmarked hot-path calls."""
+    return {
+        "position_to_cot": lambda: lincot.position_to_cot(GPS_INFO, GPSD_SETTINGS),
+        "position_to_cot_xml": lambda: lincot.position_to_cot_xml(
+            GPS_INFO, GPSD_SETTINGS
+        ),
+        "gen_sensor_cot": lambda: lincot.gen_sensor_cot(
+            SETTINGS, 37.76, -122.49, 20.6, "5.0", "6.5"
+        ),
+        "build_remarks": lambda: build_remarks(GPSD_SETTINGS, position_source="gpsd"),
+        "get_cockpit_url": lambda: get_cockpit_url(GPSD_SETTINGS),
+        "static_tpv": lambda: static_tpv(SETTINGS),
+    }
+
+
+def _mock_host(stack: ExitStack) -> None:
+    stack.enter_context(
+        mock.patch("lincot.identity._read_machine_id", lambda: "0" * 32)
+    )
+    stack.enter_context(
+        mock.patch("lincot.identity._read_hostname", lambda: "bench-node")
+    )
+    stack.enter_context(
+        mock.patch("lincot.network._default_route_interface", lambda: "eth0")
+    )
+    stack.enter_context(
+        mock.patch("lincot.network._interface_ipv4", lambda name: "192.0.2.10")
+    )
+
+
+def measure(func: Callable[[], object], iterations: int) -> Dict[str, float]:
+    """Measure one call site: throughput, latency, allocations and audit events."""
+    for _ in range(max(iterations // 10, 10)):
+        func()
+
+    samples: List[int] = []
+    clock = time.perf_counter_ns
+    gc.collect()
+    gc.disable()
+    try:
+        started = clock()
+        for _ in range(iterations):
+            before = clock()
+            func()
+            samples.append(clock() - before)
+        elapsed = clock() - started
+    finally:
+        gc.enable()
+
+    _COUNTER.count = 0
+    _COUNTER.enabled = True
+    try:
+        for _ in range(iterations):
+            func()
+    finally:
+        _COUNTER.enabled = False
+
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(min(iterations, 200)):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(samples, n=100)
+    return {
+        "events_per_sec": round(iterations / (elapsed / 1e9), 1),
+        "p50_us": round(quantiles[49] / 1000, 2),
+        "p90_us": round(quantiles[89] / 1000, 2),
+        "p99_us": round(quantiles[98] / 1000, 2),
+        "peak_alloc_bytes": int(statistics.median(peaks)),
+        "audit_events_per_call": round(_COUNTER.count / iterations, 3),
+    }
+
+
+def run(iterations: int = DEFAULT_ITERATIONS) -> dict:
+    """Run every case and return a JSON-serializable result document."""
+    with ExitStack() as stack:
+        _mock_host(stack)
+        lincot.cache.clear_all()
+        results = {name: measure(func, iterations) for name, func in cases().items()}
+    lincot.cache.clear_all()
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "iterations": iterations,
+        "cases": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Return a description of every metric that regressed beyond threshold %."""
+    regressions = []
+    for name, metrics in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if old is None or new is None:
+                continue
+            if higher_is_better:
+                worse = old > 0 and (old - new) / old * 100 > threshold
+            elif old == 0:
+                worse = new > 0
+            else:
+                worse = (new - old) / old * 100 > threshold
+            if worse:
+                regressions.append(f"{name}.{metric}: {old} -> {new}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed regression, in percent (default: %(default)s)",
+    )
+    parser.add_argument("--save", action="store_true", help="Write the baseline")
+    parser.add_argument("--output", type=Path, help="Also write results here")
+    args = parser.parse_args(argv)
+
+    current = run(args.iterations)
+    text = json.dumps(current, indent=2, sort_keys=True)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    if args.save:
+        args.baseline.write_text(text + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+    if not args.baseline.exists():
+        print(
+            f"No baseline at {args.baseline}; record one with --save", file=sys.stderr
+        )
+        return 2
+
+    regressions = compare(
+        json.loads(args.baseline.read_text(encoding="utf-8")), current, args.threshold
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,38 +14,98 @@
 # limitations under the License.
 #
 
-"""LINCOT: Linux GPS to TAK Gateway."""
+"""LINCOT: Linux GPS to TAK Gateway.
 
-from pathlib import Path
+Only the constants are imported eagerly. Workers, CoT functions and the rest of
+the public API (which pull in PyTAK, asyncio and ElementTree) are imported on
+first attribute access, keeping ``import lincot`` cheap for the CLI, the
+subcommands and plugins.
+"""
 
-__version__ = (
-    Path(__file__).resolve().parent.joinpath("VERSION").read_text(encoding="utf-8").strip()
-)
+import importlib
+import os
 
-from lincot.constants import (  # noqa: E402
+from lincot.constants import (
     DEFAULT_COCKPIT_PORT,
     DEFAULT_COT_DETAIL_XML_CMD_TIMEOUT,
     DEFAULT_COT_STALE,
     DEFAULT_COT_TYPE,
+    DEFAULT_DETAIL_PROVIDER_TIMEOUT,
+    DEFAULT_DETAIL_PROVIDER_TTL,
+    DEFAULT_FANOUT_BACKOFF_MAX,
+    DEFAULT_FANOUT_POLICY,
+    DEFAULT_FANOUT_QUEUE_SIZE,
+    DEFAULT_FANOUT_SEND_TIMEOUT,
+    DEFAULT_FIX_AGGREGATE_OUTLIER,
+    DEFAULT_FIX_AGGREGATE_SAMPLES,
     DEFAULT_GPS_INFO_CMD,
+    DEFAULT_GPS_INFO_CMD_TIMEOUT,
+    DEFAULT_GPSD_BACKOFF_INITIAL,
+    DEFAULT_GPSD_BACKOFF_MAX,
+    DEFAULT_GPSD_HOST,
+    DEFAULT_GPSD_PORT,
+    DEFAULT_HOST_INFO_TTL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    DEFAULT_NMEA_BAUD,
     DEFAULT_POLL_INTERVAL,
     DEFAULT_REMARKS_EXTRA_CMD_TIMEOUT,
+    DEFAULT_SPOOL_DRAIN_RATE,
+    DEFAULT_SPOOL_MAX_BYTES,
+    DEFAULT_SPOOL_SEGMENT_BYTES,
     DEFAULT_SSH_USER,
+    DEFAULT_SUPPRESS_MAX_SILENCE,
+    DEFAULT_TX_COALESCE,
     DEFAULT_SENSOR_COT_TYPE,
     DEFAULT_SENSOR_HAE,
-    DEFAULT_SENSOR_ID,
     DEFAULT_SENSOR_KEEPALIVE_PERIOD,
     DEFAULT_SENSOR_LAT,
     DEFAULT_SENSOR_LON,
     DEFAULT_SENSOR_PAYLOAD_TYPE,
     MACHINE_ID_PATHS,
 )
-from lincot.functions import (  # noqa: E402
-    create_tasks,
-    gen_sensor_cot,
-    gpspipe_to_cot,
-    gpspipe_to_cot_xml,
-    position_to_cot,
-    position_to_cot_xml,
-)
-from lincot.classes import LincotWorker, SensorWorker  # noqa: E402
+
+# Public name -> module it lives in, imported on first access.
+_LAZY = {
+    "DEFAULT_SENSOR_ID": "lincot.constants",
+    "create_tasks": "lincot.functions",
+    "gen_sensor_cot": "lincot.functions",
+    "gpspipe_to_cot": "lincot.functions",
+    "gpspipe_to_cot_xml": "lincot.functions",
+    "position_to_cot": "lincot.functions",
+    "position_to_cot_xml": "lincot.functions",
+    "position_to_proto": "lincot.functions",
+    "Fix": "lincot.bus",
+    "PositionBus": "lincot.bus",
+    "GpsdClient": "lincot.gpsd_client",
+    "NmeaReader": "lincot.nmea",
+    "detail_provider": "lincot.providers",
+    "DetailProviderWorker": "lincot.classes",
+    "FailoverWorker": "lincot.classes",
+    "FanoutWorker": "lincot.classes",
+    "LincotWorker": "lincot.classes",
+    "MetricsWorker": "lincot.classes",
+    "PositionService": "lincot.classes",
+    "SensorWorker": "lincot.classes",
+    "SpoolWorker": "lincot.classes",
+}
+
+
+def _read_version() -> str:
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "VERSION")
+    with open(path, encoding="utf-8") as handle:
+        return handle.read().strip()
+
+
+def __getattr__(name: str):
+    if name == "__version__":
+        value = _read_version()
+    elif name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | {"__version__"})
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Fuse the GNSS samples of a burst or time window into one fix.
+
+With FIX_AGGREGATE on, LINCOT no longer reports whichever TPV happened to be
+newest. ``FixWindow`` keeps every TPV of the last FIX_AGGREGATE_WINDOW seconds
+(one per GNSS epoch, at most FIX_AGGREGATE_SAMPLES), and ``fuse`` combines them:
+
+1. samples without a 2D/3D fix are dropped;
+2. each sample is dead-reckoned along its track and speed to the newest
+   sample's time, so a moving receiver is not dragged back along its path;
+3. samples farther from the median position than FIX_AGGREGATE_OUTLIER times
+   the normal-scaled median absolute deviation (MAD) are rejected;
+4. the rest are averaged, weighted by their reported error when every sample
+   has one. ``eph``/``epv`` become the RMS spread of the kept samples, but never
+   less than the best error the receiver reported.
+
+The fused TPV is the newest kept sample with ``lat``/``lon``/``altHAE``/``eph``/
+``epv`` replaced and ``samples`` (kept) and ``rejected`` counts added.
+"""
+
+import math
+import time
+from collections import deque
+from configparser import SectionProxy
+from statistics import median
+from typing import Deque, List, Optional, Sequence, Tuple, Union
+
+import lincot
+from lincot.coprocess import is_enabled
+from lincot.metrics import FIX_SAMPLES_REJECTED
+from lincot.position import fix_time, is_valid_fix
+from lincot.suppression import EARTH_RADIUS_M
+
+# Scales the MAD of normally distributed errors to their standard deviation.
+MAD_SCALE: float = 1.4826
+
+# Samples this close (m) to the median are never outliers, so a receiver whose
+# samples all coincide does not reject the first one that moves a little.
+MIN_OUTLIER_DISTANCE: float = 1.0
+
+_METERS_PER_DEGREE: float = math.pi / 180 * EARTH_RADIUS_M
+
+
+def _float(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def horizontal_error(tpv: dict) -> Optional[float]:
+    """The receiver's horizontal error estimate (``eph`` or ``epx``/``epy``)."""
+    eph = _float(tpv.get("eph"))
+    if eph is not None:
+        return eph
+    epx = _float(tpv.get("epx"))
+    epy = _float(tpv.get("epy"))
+    if epx is None or epy is None:
+        return None
+    return math.hypot(epx, epy)
+
+
+def _weights(errors: Sequence[Optional[float]]) -> List[float]:
+    # Inverse-variance weights, or equal weights unless every error is known.
+    if all(error for error in errors):
+        return [1.0 / (error * error) for error in errors]
+    return [1.0] * len(errors)
+
+
+def _mean_spread(
+    values: Sequence[float], weights: Sequence[float]
+) -> Tuple[float, float]:
+    total = sum(weights)
+    mean = sum(w * v for w, v in zip(weights, values)) / total
+    variance = sum(w * (v - mean) ** 2 for w, v in zip(weights, values)) / total
+    return mean, math.sqrt(variance)
+
+
+def _error(spread: float, reported: Sequence[Optional[float]]) -> float:
+    known = [error for error in reported if error is not None]
+    return max(spread, min(known)) if known else spread
+
+
+def _offsets(
+    fixes: Sequence[dict], lat0: float, lon0: float, newest: Optional[float]
+) -> List[Tuple[float, float]]:
+    """East/north offsets (m) from lat0/lon0, dead-reckoned to ``newest``."""
+    north_m = _METERS_PER_DEGREE
+    east_m = _METERS_PER_DEGREE * math.cos(math.radians(lat0))
+    offsets = []
+    for tpv in fixes:
+        east = ((float(tpv["lon"]) - lon0 + 540) % 360 - 180) * east_m
+        north = (float(tpv["lat"]) - lat0) * north_m
+        taken = fix_time(tpv)
+        speed = _float(tpv.get("speed"))
+        track = _float(tpv.get("track"))
+        if None not in (newest, taken, speed, track):
+            travelled = speed * max(0.0, newest - taken)
+            east += travelled * math.sin(math.radians(track))
+            north += travelled * math.cos(math.radians(track))
+        offsets.append((east, north))
+    return offsets
+
+
+def fuse(
+    samples: Sequence[dict], outlier: float = lincot.DEFAULT_FIX_AGGREGATE_OUTLIER
+) -> Optional[dict]:
+    """One TPV combining ``samples`` (oldest first); None when there are none.
+
+    Without any 2D/3D fix the newest sample is returned unchanged, so a lost
+    fix is still reported as such.
+    """
+    if not samples:
+        return None
+    fixes = [tpv for tpv in samples if is_valid_fix(tpv)]
+    if len(fixes) < 2:
+        return fixes[0] if fixes else samples[-1]
+
+    # Local east/north frame around the newest fix (median longitudes would
+    # break across the antimeridian); the robust center is found in meters.
+    lat0 = float(fixes[-1]["lat"])
+    lon0 = float(fixes[-1]["lon"])
+    offsets = _offsets(fixes, lat0, lon0, fix_time(fixes[-1]))
+    center_e = median(east for east, _ in offsets)
+    center_n = median(north for _, north in offsets)
+    distances = [math.hypot(e - center_e, n - center_n) for e, n in offsets]
+    limit = max(outlier * MAD_SCALE * median(distances), MIN_OUTLIER_DISTANCE)
+    kept = [index for index, distance in enumerate(distances) if distance <= limit]
+    FIX_SAMPLES_REJECTED.inc(len(fixes) - len(kept))
+
+    errors = [horizontal_error(fixes[index]) for index in kept]
+    weights = _weights(errors)
+    east, east_spread = _mean_spread([offsets[i][0] for i in kept], weights)
+    north, north_spread = _mean_spread([offsets[i][1] for i in kept], weights)
+    newest = fixes[kept[-1]]
+    fused = dict(newest)
+    fused.pop("epx", None)
+    fused.pop("epy", None)
+    fused["lat"] = lat0 + north / _METERS_PER_DEGREE
+    fused["lon"] = (
+        lon0 + east / (_METERS_PER_DEGREE * math.cos(math.radians(lat0))) + 540
+    ) % 360 - 180
+    fused["eph"] = _error(math.hypot(east_spread, north_spread), errors)
+    fused["samples"] = len(kept)
+    fused["rejected"] = len(fixes) - len(kept)
+
+    heights = [
+        (_float(fixes[i].get("altHAE")), _float(fixes[i].get("epv"))) for i in kept
+    ]
+    heights = [(alt, epv) for alt, epv in heights if alt is not None]
+    if heights:
+        vertical = [epv for _, epv in heights]
+        alt, alt_spread = _mean_spread(
+            [alt for alt, _ in heights], _weights(vertical)
+        )
+        fused["altHAE"] = alt
+        fused["epv"] = _error(alt_spread, vertical)
+    return fused
+
+
+class FixWindow:
+    """The TPVs of the last ``window`` seconds, one per GNSS epoch."""
+
+    def __init__(
+        self,
+        window: float,
+        max_samples: int = lincot.DEFAULT_FIX_AGGREGATE_SAMPLES,
+        outlier: float = lincot.DEFAULT_FIX_AGGREGATE_OUTLIER,
+    ) -> None:
+        self.window = window
+        self.outlier = outlier
+        self._samples: Deque[Tuple[float, dict]] = deque(maxlen=max_samples)
+
+    @classmethod
+    def from_config(
+        cls, config: Union[dict, SectionProxy, None], poll_interval: float
+    ) -> Optional["FixWindow"]:
+        """A window from the FIX_AGGREGATE_* settings, or None when disabled."""
+        config = config or {}
+        if not is_enabled(config.get("FIX_AGGREGATE")):
+            return None
+        return cls(
+            float(config.get("FIX_AGGREGATE_WINDOW") or poll_interval),
+            int(
+                config.get("FIX_AGGREGATE_SAMPLES")
+                or lincot.DEFAULT_FIX_AGGREGATE_SAMPLES
+            ),
+            float(
+                config.get("FIX_AGGREGATE_OUTLIER")
+                or lincot.DEFAULT_FIX_AGGREGATE_OUTLIER
+            ),
+        )
+
+    @property
+    def max_samples(self) -> int:
+        """Samples kept at most."""
+        return self._samples.maxlen
+
+    def add(self, tpv: dict, now: Optional[float] = None) -> None:
+        """Record a TPV; a later report for the same epoch replaces the earlier."""
+        now = time.monotonic() if now is None else now
+        epoch = tpv.get("time")
+        if epoch is not None and self._samples and self._samples[-1][1].get(
+            "time"
+        ) == epoch:
+            self._samples.pop()
+        self._samples.append((now, tpv))
+
+    def samples(self, now: Optional[float] = None) -> List[dict]:
+        """TPVs received in the last ``window`` seconds, oldest first."""
+        now = time.monotonic() if now is None else now
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+        return [tpv for _, tpv in self._samples]
+
+    def fuse(self, now: Optional[float] = None) -> Optional[dict]:
+        """One fused TPV from the current window."""
+        return fuse(self.samples(now), self.outlier)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""In-process position bus shared by the LINCOT workers.
+
+``PositionService`` is the only task that acquires position (gpsd, NMEA, a
+command or static config). It publishes each fix to a ``PositionBus`` as an
+immutable ``Fix`` snapshot; workers read the latest one or wait for the next
+without any I/O of their own. Slow subscribers simply see the newest fix.
+"""
+
+import asyncio
+import time
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+from lincot.position import fix_time, is_valid_fix
+
+
+class Fix(NamedTuple):
+    """One published position report."""
+
+    seq: int
+    tpv: Mapping
+    source: str
+    received: float
+    taken: Optional[float]
+
+
+class PositionBus:
+    """Latest-value broadcast of ``Fix`` snapshots over an asyncio condition."""
+
+    def __init__(self) -> None:
+        self._fix: Optional[Fix] = None
+        self._valid: Optional[Fix] = None
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _cond(self) -> asyncio.Condition:
+        # Created lazily so the Condition binds to the running loop on Python 3.9.
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def latest(self) -> Optional[Fix]:
+        """The newest published fix, if any."""
+        return self._fix
+
+    @staticmethod
+    def _age(fix: Optional[Fix]) -> Optional[float]:
+        if fix is None:
+            return None
+        if fix.taken is not None:
+            return time.time() - fix.taken
+        return time.monotonic() - fix.received
+
+    def fix_age(self) -> Optional[float]:
+        """Age of the newest fix, from its GNSS time when the TPV has one."""
+        return self._age(self._fix)
+
+    def valid_fix_age(self) -> Optional[float]:
+        """Age of the newest fix that has a position (mode 2 or better).
+
+        Receivers keep sending no-fix TPVs with a current time after they lose
+        lock, so this, not ``fix_age``, tells whether a source is usable.
+        """
+        return self._age(self._valid)
+
+    async def publish(self, tpv: Mapping, source: str) -> Fix:
+        """Snapshot ``tpv`` and wake every waiting subscriber."""
+        seq = self._fix.seq + 1 if self._fix else 1
+        fix = Fix(
+            seq,
+            MappingProxyType(dict(tpv)),
+            source,
+            time.monotonic(),
+            fix_time(tpv),
+        )
+        async with self._cond():
+            self._fix = fix
+            if is_valid_fix(fix.tpv):
+                self._valid = fix
+            self._cond().notify_all()
+        return fix
+
+    async def wait(
+        self, after: int = 0, timeout: Optional[float] = None
+    ) -> Optional[Fix]:
+        """Wait for a fix newer than sequence ``after``; None on timeout."""
+        condition = self._cond()
+        async with condition:
+            try:
+                await asyncio.wait_for(
+                    condition.wait_for(
+                        lambda: self._fix is not None and self._fix.seq > after
+                    ),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                return None
+            return self._fix
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Small TTL cache for host facts that rarely change (hostname, IP, machine-id)."""
+
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_CACHES: List["TTLCache"] = []
+
+
+class TTLCache:
+    """Memoize zero-argument lookups by key for ``ttl`` seconds.
+
+    A ``ttl`` of None keeps values until the cache is cleared. ``None`` results
+    are cached as well, so a missing machine-id is not re-probed every event.
+    """
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self.ttl = ttl
+        self._values: Dict[str, Tuple[float, Any]] = {}
+        _CACHES.append(self)
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for ``key``, calling ``loader`` when expired."""
+        now = time.monotonic()
+        entry = self._values.get(key)
+        if entry is not None and (self.ttl is None or now - entry[0] < self.ttl):
+            return entry[1]
+        value = loader()
+        self._values[key] = (now, value)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        """Drop one cached value."""
+        self._values.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop all cached values."""
+        self._values.clear()
+
+
+def clear_all() -> None:
+    """Drop every cached host fact, e.g. on SIGHUP or a network change."""
+    for cache in _CACHES:
+        cache.clear()
@@ -17,143 +17,677 @@
 """LINCOT Class Definitions."""
 
 import asyncio
-import json
+import functools
 import os
+import signal
+import time
 import xml.etree.ElementTree as ET
 from typing import Optional
 
 import pytak
 
 import lincot
-from lincot.position import static_position_configured, static_tpv
+from lincot.aggregate import FixWindow, fuse
+from lincot.bus import PositionBus
+from lincot.cache import clear_all as clear_host_caches
+from lincot.coalesce import Backfill, CoalescingQueue
+from lincot.coprocess import close_coprocesses
+from lincot.fanout import Fanout, get_fanout
+from lincot.gpsd_client import GpsdClient
+from lincot.nmea import NmeaReader
+from lincot.netlink import NetlinkMonitor, start_monitor
+from lincot.metrics import (
+    COT_BUILD,
+    COT_SERIALIZE,
+    DEADLINES_MISSED,
+    EVENTS_EMITTED,
+    EVENTS_FAILED,
+    EVENTS_SUPPRESSED,
+    FIX_ACQUISITION,
+    FIX_AGE,
+    FIX_CLOCK,
+    FIXES_STALE,
+    REGISTRY,
+    SUBPROCESS_TIMEOUTS,
+    TX_QUEUE_DEPTH,
+    get_server,
+    parse_listen,
+    set_server,
+)
+from lincot.position import (
+    fix_time,
+    gps_info_from_command,
+    gpsd_stream_configured,
+    nmea_configured,
+    static_position_configured,
+    static_tpv,
+    tpvs_from_command,
+)
+from lincot.providers import load_providers, set_active
+from lincot.remarks import warm_host_info
+from lincot.scheduler import Schedule
+from lincot.zones import RatePolicy
+from lincot.settings import Settings
+from lincot.sources import Failover
+from lincot.spool import Spool, get_recorder, get_spool, transport_failed
+from lincot.suppression import MovementFilter
+from lincot.tak_proto import encode_event, enabled as tak_proto_enabled, wire_format
 
-try:
-    import gpsd as _gpsd
-except ImportError:
-    _gpsd = None
 
+class _EventProducer(pytak.QueueWorker):
+    """A worker putting CoT events on the (possibly coalescing) tx_queue."""
 
-class LincotWorker(pytak.QueueWorker):
-    """Poll GPS or static position and emit CoT events."""
+    async def put_queue(self, data, queue_arg=None) -> None:
+        """Queue ``data``; on a full coalescing queue, supersede before dropping."""
+        queue = queue_arg or self.queue
+        if isinstance(queue, CoalescingQueue) and queue.replace(data):
+            return
+        await super().put_queue(data, queue_arg)
+
+
+class PositionService(pytak.QueueWorker):
+    """Acquire position once (gpsd, NMEA, command or static) and publish it."""
+
+    def __init__(
+        self,
+        queue,
+        config,
+        bus: Optional[PositionBus] = None,
+        settings: Optional[Settings] = None,
+    ) -> None:
+        super().__init__(queue, config)
+        self.settings: Settings = settings or Settings.from_config(self.config)
+        self.bus: PositionBus = bus or PositionBus()
+        self.gpsd: Optional[GpsdClient] = None
+        self.nmea: Optional[NmeaReader] = None
+        self._stream_task: Optional[asyncio.Future] = None
+        self.running: bool = False
+        self.poll_interval: int = int(
+            self.config.get("POLL_INTERVAL", lincot.DEFAULT_POLL_INTERVAL)
+        )
+        self.gps_info_cmd = self.config.get("GPS_INFO_CMD", lincot.DEFAULT_GPS_INFO_CMD)
+        self.gps_info_cmd_timeout = float(
+            self.config.get("GPS_INFO_CMD_TIMEOUT")
+            or lincot.DEFAULT_GPS_INFO_CMD_TIMEOUT
+        )
+        self.window: Optional[FixWindow] = FixWindow.from_config(
+            self.config, self.poll_interval
+        )
+        self.rates: Optional[RatePolicy] = RatePolicy.from_config(
+            self.config, self.poll_interval
+        )
+        if static_position_configured(self.config):
+            self.source = "static"
+        elif nmea_configured(self.config):
+            self.source = "nmea"
+        elif gpsd_stream_configured(self.config):
+            self.source = "gpsd"
+        else:
+            self.source = "command"
 
     async def handle_data(self, data) -> None:
-        """Handle received GPS Info data."""
-        event: Optional[bytes] = lincot.position_to_cot(data, self.config)
-        if event:
-            await self.put_queue(event)
+        """The position service does not consume queue data."""
+
+    async def get_gps_info(self) -> Optional[dict]:
+        """Get GPS Info data by running GPS_INFO_CMD without blocking the loop.
 
-    async def get_gps_info(self) -> None:
-        """Get GPS Info data via gpspipe (or GPS_INFO_CMD)."""
-        gpspipe_data: Optional[str] = None
-        gps_data: Optional[str] = None
+        With FIX_AGGREGATE on, the command's whole burst (up to
+        FIX_AGGREGATE_SAMPLES fixes) is fused into one TPV.
+        """
         try:
-            with os.popen(self.gps_info_cmd) as gps_info_cmd:
-                gpspipe_data = gps_info_cmd.read()
+            if self.window is None:
+                gps_info = await gps_info_from_command(
+                    self.gps_info_cmd, self.gps_info_cmd_timeout
+                )
+            else:
+                gps_info = fuse(
+                    await tpvs_from_command(
+                        self.gps_info_cmd,
+                        self.gps_info_cmd_timeout,
+                        self.window.max_samples,
+                    ),
+                    self.window.outlier,
+                )
+        except asyncio.TimeoutError:
+            SUBPROCESS_TIMEOUTS.inc()
+            self._logger.warning(
+                "GPS command timed out after %ss without a fix: %s",
+                self.gps_info_cmd_timeout,
+                self.gps_info_cmd,
+            )
+            return None
         except OSError as exc:
             self._logger.warning("GPS command failed: %s", exc)
-            return
+            return None
 
-        if not gpspipe_data:
-            self._logger.debug("No output from %s", self.gps_info_cmd)
-            return
+        if not gps_info:
+            self._logger.debug("No TPV record in output of %s", self.gps_info_cmd)
+        return gps_info
 
-        for line in gpspipe_data.split("\n"):
-            if "TPV" in line:
-                gps_data = line
+    def _fused(self) -> Optional[dict]:
+        # FIX_AGGREGATE: the fused window; the newest TPV once the window is empty.
+        return self.window.fuse() if self.window is not None else None
 
-        if not gps_data:
-            self._logger.debug("No TPV record in gpspipe output")
-            return
+    def get_gpsd_info(self) -> Optional[dict]:
+        """Return the newest (or fused) TPV cached by the persistent gpsd client."""
+        tpv = (self._fused() or self.gpsd.latest()) if self.gpsd else None
+        if not tpv:
+            self._logger.debug("No TPV received from gpsd %s yet", self.gpsd.address)
+        return tpv
+
+    def start_gpsd(self) -> GpsdClient:
+        """Start the persistent gpsd client in the background."""
+        self.gpsd = GpsdClient.from_config(self.config, self._logger)
+        if self.window is not None:
+            self.gpsd.on_tpv = self.window.add
+        self._stream_task = asyncio.ensure_future(self.gpsd.run())
+        return self.gpsd
+
+    def get_nmea_info(self) -> Optional[dict]:
+        """Return the newest (or fused) TPV parsed from the NMEA serial device."""
+        tpv = (self._fused() or self.nmea.latest()) if self.nmea else None
+        if not tpv:
+            self._logger.debug("No NMEA fix from %s yet", self.nmea.address)
+        return tpv
 
-        self._logger.debug("GPS_INFO=%s", gps_data)
+    def start_nmea(self) -> NmeaReader:
+        """Start reading the NMEA serial device in the background."""
+        self.nmea = NmeaReader.from_config(self.config, self._logger)
+        if self.window is not None:
+            self.nmea.on_tpv = self.window.add
+        self._stream_task = asyncio.ensure_future(self.nmea.run())
+        return self.nmea
+
+    @property
+    def address(self) -> str:
+        """Where position comes from, for logging."""
+        if self.source == "nmea":
+            return f"NMEA {self.nmea.address if self.nmea else ''}".strip()
+        if self.source == "gpsd":
+            return f"gpsd {self.gpsd.address if self.gpsd else ''}".strip()
+        if self.source == "command":
+            return str(self.gps_info_cmd)
+        return "static config"
+
+    async def acquire(self) -> Optional[dict]:
+        """Read one TPV from the configured source."""
+        if self.source == "static":
+            return static_tpv(self.settings)
+        if self.source == "nmea":
+            return self.get_nmea_info()
+        if self.source == "gpsd":
+            return self.get_gpsd_info()
+        return await self.get_gps_info()
+
+    def adapt(self, schedule: Schedule, gps_info: dict) -> None:
+        """Set the poll period for the fix's zone and speed (ZONES_FILE/SPEED_BANDS)."""
+        interval = self.rates.interval(gps_info)
+        if interval != schedule.period:
+            self._logger.info("Reporting every %ss", interval)
+            schedule.set_period(interval)
+
+    async def close(self) -> None:
+        """Stop the background gpsd/NMEA reader."""
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            self._stream_task = None
+
+    async def run(self, _=-1) -> None:
+        """Publish a fix from the configured source every POLL_INTERVAL."""
+        self.running = True
         try:
-            gps_info = json.loads(gps_data)
-        except json.JSONDecodeError as exc:
-            self._logger.warning("Invalid GPS JSON: %s", exc)
+            if self.source == "nmea":
+                await self.start_nmea().wait(self.poll_interval)
+            elif self.source == "gpsd":
+                await self.start_gpsd().wait(self.poll_interval)
+            self._logger.info(
+                "Reading position from %s every %s seconds.",
+                self.address,
+                self.poll_interval,
+            )
+            schedule = Schedule.from_config(
+                self.config,
+                self.poll_interval,
+                DEADLINES_MISSED["position"],
+                "Position",
+            )
+            while True:
+                started = time.perf_counter()
+                gps_info = await self.acquire()
+                FIX_ACQUISITION["position"].observe(time.perf_counter() - started)
+                if gps_info:
+                    self._logger.debug("GPS_INFO=%s", gps_info)
+                    await self.bus.publish(gps_info, self.source)
+                    if self.rates is not None:
+                        self.adapt(schedule, gps_info)
+                await schedule.wait()
+        finally:
+            await self.close()
+            self.running = False
+
+
+class LincotWorker(_EventProducer):
+    """Emit position CoT events for each fix published on the position bus."""
+
+    def __init__(
+        self,
+        queue,
+        config,
+        bus: Optional[PositionBus] = None,
+        settings: Optional[Settings] = None,
+    ) -> None:
+        super().__init__(queue, config)
+        self.settings: Settings = settings or Settings.from_config(self.config)
+        self.bus: Optional[PositionBus] = bus
+        self._service_task: Optional[asyncio.Future] = None
+        self._warm_task: Optional[asyncio.Future] = None
+        self.network_monitor: Optional[NetlinkMonitor] = None
+        self.movement_filter: Optional[MovementFilter] = MovementFilter.from_config(
+            self.config
+        )
+        # Remarks/detail commands may block for their timeout; keep them off the loop.
+        self.build_in_thread: bool = bool(
+            self.settings.remarks_cmd or self.settings.detail_cmd
+        )
+        self.max_fix_age: float = float(self.config.get("MAX_FIX_AGE") or 0)
+        self.encode = (
+            lincot.position_to_proto
+            if self.settings.tak_proto
+            else lincot.position_to_cot
+        )
+        self.fix_taken: Optional[float] = None
+        FIX_AGE.set_function(self.fix_age)
+
+    def fix_age(self) -> Optional[float]:
+        """Age of the newest fix, from its GNSS time when the TPV has one."""
+        if self.fix_taken is not None:
+            return time.time() - self.fix_taken
+        if self.bus is not None:
+            return self.bus.fix_age()
+        return None
+
+    async def handle_data(self, data) -> None:
+        """Handle received GPS Info data."""
+        taken = fix_time(data)
+        if taken is not None:
+            self.fix_taken = taken
+            age = time.time() - taken
+            if 0 < self.max_fix_age < age:
+                FIXES_STALE.inc()
+                self._logger.warning(
+                    "Dropping fix from %s, %.1fs older than MAX_FIX_AGE (%ss)",
+                    data.get("time"),
+                    age,
+                    self.max_fix_age,
+                )
+                return
+        now = time.monotonic()
+        if self.movement_filter and not self.movement_filter.should_send(data, now):
+            EVENTS_SUPPRESSED.inc()
+            self._logger.debug(
+                "Suppressed report within dead-reckoning thresholds (%s)",
+                self.movement_filter.stats(),
+            )
             return
-        await self.handle_data(gps_info)
+        event: Optional[bytes]
+        if self.build_in_thread:
+            event = await asyncio.to_thread(self.encode, data, self.settings)
+        else:
+            event = self.encode(data, self.settings)
+        if not event:
+            EVENTS_FAILED["position"].inc()
+            return
+        FIX_CLOCK.enqueued(event, taken, "position")
+        await self.put_queue(event)
+        if self.movement_filter:
+            self.movement_filter.mark_sent(data, now)
+        EVENTS_EMITTED["position"].inc()
+
+    def install_reload_handler(self) -> None:
+        """Re-probe hostname, machine-id and host IP on SIGHUP."""
+
+        def _reload() -> None:
+            self._logger.info("SIGHUP received, refreshing cached host info")
+            clear_host_caches()
+            if self.network_monitor is not None:
+                try:
+                    self.network_monitor.resync()
+                except OSError as exc:
+                    self._logger.warning("Netlink resync failed: %s", exc)
+
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _reload)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            # No SIGHUP on this platform, or not running in the main thread.
+            pass
+
+    async def close(self) -> None:
+        """Stop a position service started by this worker and command co-processes."""
+        if self._service_task is not None:
+            self._service_task.cancel()
+            self._service_task = None
+        if self.network_monitor is not None:
+            self.network_monitor.close()
+            self.network_monitor = None
+        await asyncio.to_thread(close_coprocesses)
 
     async def run(self, number_of_iterations=-1) -> None:
-        """Run worker loop: read position and output CoT."""
+        """Run worker loop: output CoT for every new fix on the bus."""
         cot_url: str = self.config.get("COT_URL")
         if not cot_url:
             self._logger.error("COT_URL not set, exiting.")
             return
         self._logger.info("Sending to: %s", cot_url)
-
-        poll_interval: int = int(
-            self.config.get("POLL_INTERVAL", lincot.DEFAULT_POLL_INTERVAL)
+        self.install_reload_handler()
+        # Follow address/route changes instead of probing /proc per event.
+        self.network_monitor = start_monitor()
+        # Host facts for the remarks are probed while the first fix is acquired,
+        # never ahead of it; an early fix simply probes them itself.
+        self._warm_task = asyncio.ensure_future(
+            asyncio.to_thread(warm_host_info, self.config)
         )
-        self.gps_info_cmd = self.config.get("GPS_INFO_CMD", lincot.DEFAULT_GPS_INFO_CMD)
-        use_static = static_position_configured(self.config)
+        if self.bus is None:
+            # Running on its own: acquire position for ourselves.
+            self.bus = PositionBus()
+            self._service_task = asyncio.ensure_future(
+                PositionService(self.queue, self.config, self.bus).run()
+            )
 
-        while True:
-            if use_static:
-                self._logger.info(
-                    "Sending static position to %s every %s seconds.",
-                    cot_url,
-                    poll_interval,
-                )
-                tpv = static_tpv(self.config)
-                if tpv:
-                    await self.handle_data(tpv)
-            else:
-                self._logger.info(
-                    "Sending position from %s to %s every %s seconds.",
-                    self.gps_info_cmd,
-                    cot_url,
-                    poll_interval,
-                )
-                await self.get_gps_info()
+        seq = 0
+        try:
+            while True:
+                fix = await self.bus.wait(seq)
+                seq = fix.seq
+                self._logger.debug("Sending %s position to %s", fix.source, cot_url)
+                await self.handle_data(fix.tpv)
+        finally:
+            if self.network_monitor is not None:
+                self.network_monitor.close()
+                self.network_monitor = None
+
+
+class FailoverWorker(pytak.QueueWorker):
+    """Run a SOURCES primary/backup failover relay."""
+
+    def __init__(self, queue, config, failover: Failover) -> None:
+        super().__init__(queue, config)
+        self.failover: Failover = failover
+
+    async def handle_data(self, data) -> None:
+        """The failover relay does not consume queue data."""
+
+    async def run(self, _=-1) -> None:
+        """Relay the primary's or the backup's fixes."""
+        self._logger.info(
+            "Source %s fails over to %s after %ss without a fix",
+            self.failover.name,
+            self.failover.backup_name,
+            self.failover.after,
+        )
+        await self.failover.run()
 
-            await asyncio.sleep(poll_interval)
 
+class SensorWorker(_EventProducer):
+    """Periodic sensor CoT heartbeat, positioned from the bus, config or null island."""
 
-class SensorWorker(pytak.QueueWorker):
-    """Periodic sensor CoT heartbeat. Sources position from gpsd, config, or null island."""
+    def __init__(
+        self,
+        queue,
+        config,
+        bus: Optional[PositionBus] = None,
+        settings: Optional[Settings] = None,
+    ) -> None:
+        super().__init__(queue, config)
+        self.settings: Settings = settings or Settings.from_config(self.config)
+        self.bus: Optional[PositionBus] = bus
 
     async def run(self, _=-1) -> None:
         """Run worker loop: emit sensor beacon CoT at configured interval."""
         period = int(self.config.get(
             "SENSOR_KEEPALIVE_PERIOD", lincot.DEFAULT_SENSOR_KEEPALIVE_PERIOD))
         self._logger.info(
-            "Running SensorWorker (period=%ds, gpsd=%s)", period, _gpsd is not None)
+            "Running SensorWorker (period=%ds, bus=%s)", period, self.bus is not None)
+        schedule = Schedule.from_config(
+            self.config, period, DEADLINES_MISSED["sensor"], "SensorWorker"
+        )
         while True:
-            lat, lon, hae, ce, le = await self._get_position()
-            cot = lincot.gen_sensor_cot(self.config, lat, lon, hae, ce, le)
-            if cot is not None:
-                await self.put_queue(ET.tostring(cot))
-            await asyncio.sleep(period)
-
-    async def _get_position(self):
-        """Resolve sensor position: gpsd → static config → null island."""
-        if _gpsd is not None:
-            try:
-                result = await asyncio.to_thread(self._poll_gpsd)
-                if result is not None:
-                    return result
-            except Exception as exc:
-                self._logger.debug("gpsd unavailable: %s", exc)
+            started = time.perf_counter()
+            lat, lon, hae, ce, le = self._get_position()
+            acquired = time.perf_counter()
+            FIX_ACQUISITION["sensor"].observe(acquired - started)
+            cot = lincot.gen_sensor_cot(self.settings, lat, lon, hae, ce, le)
+            built = time.perf_counter()
+            COT_BUILD["sensor"].observe(built - acquired)
+            if cot is None:
+                EVENTS_FAILED["sensor"].inc()
+            else:
+                if tak_proto_enabled(self.config):
+                    event = encode_event(cot, wire_format(self.config))
+                else:
+                    event = ET.tostring(cot)
+                serialized = time.perf_counter()
+                COT_SERIALIZE["sensor"].observe(serialized - built)
+                FIX_CLOCK.enqueued(event, None, "sensor")
+                await self.put_queue(event)
+                EVENTS_EMITTED["sensor"].inc()
+            await schedule.wait()
+
+    def _get_position(self):
+        """Resolve sensor position: live bus fix → static config → null island."""
+        fix = self.bus.latest() if self.bus else None
+        if fix is not None and fix.source != "static":
+            position = _sensor_position(fix.tpv)
+            if position is not None:
+                return position
         lat = float(self.config.get("SENSOR_LAT") or lincot.DEFAULT_SENSOR_LAT)
         lon = float(self.config.get("SENSOR_LON") or lincot.DEFAULT_SENSOR_LON)
         hae = float(self.config.get("SENSOR_HAE") or lincot.DEFAULT_SENSOR_HAE)
         return lat, lon, hae, "9999999.0", "9999999.0"
 
-    @staticmethod
-    def _poll_gpsd():
-        """Poll gpsd for current position. Returns None if fix is unavailable."""
-        _gpsd.connect()
-        packet = _gpsd.get_current()
-        if packet.mode < 2:
+
+def _sensor_position(tpv) -> Optional[tuple]:
+    """lat, lon, hae, ce, le from a TPV with at least a 2D fix, else None."""
+    try:
+        if int(tpv.get("mode") or 0) < 2:
             return None
+        lat = float(tpv["lat"])
+        lon = float(tpv["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    hae = tpv.get("altHAE", tpv.get("alt"))
+    ce = str(tpv.get("epx") or "9999999.0")
+    le = str(tpv.get("epv") or "9999999.0")
+    return lat, lon, float(hae) if hae is not None else 0.0, ce, le
+
+
+class FanoutWorker(pytak.QueueWorker):
+    """Start delivery to the FANOUT_URLS destinations and the event producers.
+
+    The destinations and the workers adopted by the fan-out run for the life
+    of the process, not of this worker, so events keep being built and
+    delivered while COT_URL reconnects.
+    """
+
+    def __init__(self, queue, config, fanout: Optional[Fanout] = None) -> None:
+        super().__init__(queue, config)
+        self.fanout: Optional[Fanout] = fanout or get_fanout(self.config)
+
+    async def handle_data(self, data) -> None:
+        """The fan-out worker does not consume queue data."""
+
+    async def run(self, _=-1) -> None:
+        """Start every destination and producer, if not already running."""
+        if self.fanout is None:
+            return
+        self._logger.info(
+            "Fanning out to %s",
+            ", ".join(destination.name for destination in self.fanout.destinations),
+        )
+        self.fanout.start()
+        await self.fanout.run_workers()
+
+
+class SpoolWorker(pytak.QueueWorker):
+    """Backfill positions spooled while offline, at SPOOL_DRAIN_RATE per second."""
+
+    def __init__(
+        self, queue, config, spool: Optional[Spool] = None, clitool=None
+    ) -> None:
+        super().__init__(queue, config)
+        self.spool: Optional[Spool] = spool or get_spool(self.config)
+        # The CLITool whose tasks tell a transport error from a normal shutdown.
+        self.clitool = clitool
+        self.rate: float = float(
+            self.config.get("SPOOL_DRAIN_RATE") or lincot.DEFAULT_SPOOL_DRAIN_RATE
+        )
+        # Backfilled events carry the time of the original fix.
+        self.backfill_settings = Settings.from_config(self.config)._replace(
+            time_from_fix=True
+        )
+        self.encode = (
+            lincot.position_to_proto
+            if tak_proto_enabled(self.config)
+            else lincot.position_to_cot
+        )
+
+    async def handle_data(self, data) -> None:
+        """The spool worker does not consume queue data."""
+
+    async def drain_once(self) -> bool:
+        """Queue the oldest spooled fix not queued yet; False when there is none.
+
+        The fix is only drained from the spool once the TX worker has sent it.
+        """
+        taken = self.spool.take()
+        if taken is None:
+            return False
+        tpv, ticket = taken
+        event = await asyncio.to_thread(self.encode, tpv, self.backfill_settings)
+        if event:
+            event = Backfill(event)
+            event.on_sent = functools.partial(self.spool.acknowledge, ticket)
+            await self.put_queue(event)
+        else:
+            self.spool.acknowledge(ticket)
+        return True
+
+    async def close(self) -> None:
+        """On a transport error, record positions until the TAK workers return."""
+        if self.spool is None:
+            return
+        self.spool.rewind()
+        if transport_failed(getattr(self.clitool, "running_tasks", ())):
+            get_recorder(self.spool, self.config).start()
+
+    async def run(self, _=-1) -> None:
+        """Stop offline recording, then drain the spool at the configured rate."""
+        if self.spool is None:
+            return
+        get_recorder(self.spool, self.config).stop()
+        # Whatever an earlier connection queued but never sent is sent again.
+        self.spool.rewind()
+        pending = self.spool.pending
+        if not pending:
+            return
+        self._logger.info(
+            "Backfilling %d spooled position(s) at %s/s", pending, self.rate
+        )
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        schedule = Schedule(
+            interval, missed_counter=DEADLINES_MISSED["spool"], name="SpoolWorker"
+        )
+        while await self.drain_once():
+            await schedule.wait()
+        self._logger.info("Spool %s drained", self.spool.directory)
+
+
+class DetailProviderWorker(pytak.QueueWorker):
+    """Refresh in-process detail providers in the background."""
+
+    async def handle_data(self, data) -> None:
+        """Providers do not consume queue data."""
+
+    async def run(self, _=-1) -> None:
+        """Load providers and refresh each one on its own TTL."""
+        # Entry-point discovery reads every installed distribution's metadata;
+        # keep it off the loop so it never holds up the first position.
+        providers = await asyncio.to_thread(load_providers, self.config)
+        set_active(providers)
+        if not providers:
+            return
+        self._logger.info(
+            "Running %d detail provider(s): %s",
+            len(providers),
+            ", ".join(provider.name for provider in providers),
+        )
         try:
-            lat, lon = packet.position()
-        except Exception:
-            return None
+            await asyncio.gather(*(provider.run(self.config) for provider in providers))
+        finally:
+            set_active([])
+
+
+class MetricsWorker(pytak.QueueWorker):
+    """Serve LINCOT metrics in the Prometheus text format on METRICS_LISTEN.
+
+    The endpoint runs for the life of the process, not of this worker, so
+    metrics stay available while PyTAK reconnects COT_URL.
+    """
+
+    def __init__(self, queue, config) -> None:
+        super().__init__(queue, config)
+        self.listen: str = str(self.config.get("METRICS_LISTEN") or "").strip()
+        # Per-event latency bookkeeping is only worth it with an endpoint.
+        FIX_CLOCK.enabled = True
+
+    async def handle_data(self, data) -> None:
+        """The metrics endpoint does not consume queue data."""
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer one HTTP request with the current metrics."""
         try:
-            hae = packet.altitude()
-        except Exception:
-            hae = 0.0
-        ce = str(getattr(packet, "error", {}).get("x", "9999999.0") or "9999999.0")
-        le = str(getattr(packet, "error", {}).get("v", "9999999.0") or "9999999.0")
-        return lat, lon, hae, ce, le
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (
+                b"\r\n",
+                b"\n",
+                b"",
+            ):
+                pass
+            parts = request.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) > 1 else "/"
+            if path in ("/", "/metrics"):
+                status = "200 OK"
+                body = REGISTRY.render().encode("utf-8")
+            else:
+                status = "404 Not Found"
+                body = b"Not Found\n"
+            writer.write(
+                f"HTTP/1.0 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1")
+                + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as exc:
+            self._logger.debug("Metrics client error: %s", exc)
+        finally:
+            writer.close()
+
+    async def start_server(self) -> asyncio.AbstractServer:
+        """Listen on METRICS_LISTEN (``host:port`` or ``unix:/path``)."""
+        kind, address, port = parse_listen(self.listen)
+        if kind == "unix":
+            if os.path.exists(address):
+                os.unlink(address)
+            return await asyncio.start_unix_server(self.handle_client, path=address)
+        return await asyncio.start_server(self.handle_client, address, port)
+
+    async def run(self, _=-1) -> None:
+        """Start the process-wide endpoint unless an earlier connection did."""
+        TX_QUEUE_DEPTH.set_function(self.queue.qsize)
+        if get_server(self.listen) is not None:
+            return
+        set_server(self.listen, await self.start_server())
+        self._logger.info("Serving metrics on %s", self.listen)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Latest-value coalescing for the TX queue.
+
+While the TAK connection is down or slow, only the newest pending event per CoT
+uid is worth sending. ``CoalescingQueue`` replaces a queued event in place when
+a newer one with the same uid arrives, so an outage leaves at most one event per
+uid (plus any events without a uid) waiting, instead of a burst of stale fixes.
+"""
+
+import asyncio
+import itertools
+import re
+from collections import OrderedDict
+from configparser import SectionProxy
+from typing import Callable, Hashable, Optional, Union
+
+import lincot
+from lincot.metrics import EVENTS_SUPERSEDED
+from lincot.tak_proto import STREAM_HEADER, event_uid as proto_event_uid
+
+_XML_UID = re.compile(rb"<event\b[^>]*?\suid=\"([^\"]*)\"")
+
+
+def coalesce_enabled(config: Union[dict, SectionProxy, None]) -> bool:
+    """TX_COALESCE, on unless set to a false value."""
+    config = config or {}
+    value = config.get("TX_COALESCE")
+    if value is None or str(value).strip() == "":
+        return lincot.DEFAULT_TX_COALESCE
+    return str(value).strip().lower() in ("1", "true", "yes", "on")
+
+
+def event_uid(data) -> Optional[str]:
+    """The CoT uid of an XML or TAK protobuf event, or None."""
+    if not isinstance(data, (bytes, bytearray)):
+        return None
+    if data.startswith(STREAM_HEADER):
+        return proto_event_uid(bytes(data))
+    match = _XML_UID.search(data)
+    return match.group(1).decode("utf-8", "replace") if match else None
+
+
+class Backfill(bytes):
+    """An event replaying an older fix; never superseded by a newer one.
+
+    ``on_sent`` is called once the TX worker has written the event.
+    """
+
+    on_sent: Optional[Callable[[], None]] = None
+
+
+class CoalescingQueue(asyncio.Queue):
+    """An ``asyncio.Queue`` holding only the newest pending event per CoT uid.
+
+    A superseded event keeps its place in line, so a uid is never starved by
+    newer reports from others, and is counted in ``superseded``.
+    """
+
+    def _init(self, maxsize: int) -> None:
+        self._queue: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._anonymous = itertools.count()
+        self._uid: Optional[str] = None
+        self.superseded: int = 0
+
+    def replace(self, item) -> bool:
+        """Put ``item`` in place of a pending event with its uid; False if none."""
+        return self._replace(self._key(item), item)
+
+    @staticmethod
+    def _key(item) -> Optional[str]:
+        return None if isinstance(item, Backfill) else event_uid(item)
+
+    def _replace(self, uid: Optional[str], item) -> bool:
+        if uid is None or uid not in self._queue:
+            return False
+        self._queue[uid] = item
+        self.superseded += 1
+        EVENTS_SUPERSEDED.inc()
+        return True
+
+    def put_nowait(self, item) -> None:
+        # Superseding never grows the queue, so it works even when it is full.
+        uid = self._key(item)
+        if not self._replace(uid, item):
+            self._uid = uid
+            super().put_nowait(item)
+
+    async def put(self, item) -> None:
+        if not self.replace(item):
+            await super().put(item)
+
+    def _put(self, item) -> None:
+        # Only reached through put_nowait, which looked the uid up already.
+        uid = self._uid
+        self._queue[("", next(self._anonymous)) if uid is None else uid] = item
+
+    def _get(self):
+        return self._queue.popitem(last=False)[1]
+
+
+def install(clitool) -> Optional[CoalescingQueue]:
+    """Swap the CLITool's tx_queue, and its TX workers' queue, for a coalescing one."""
+    old = clitool.tx_queue
+    if isinstance(old, CoalescingQueue) or not isinstance(old, asyncio.Queue):
+        return None
+    new = CoalescingQueue(old.maxsize)
+    replace_tx_queue(clitool, new)
+    return new
+
+
+def replace_tx_queue(clitool, new: asyncio.Queue) -> None:
+    """Move pending events to ``new`` and point the CLITool and its workers at it."""
+    old = clitool.tx_queue
+    while not old.empty():
+        new.put_nowait(old.get_nowait())
+    for worker in getattr(clitool, "tasks", ()):
+        if getattr(worker, "queue", None) is old:
+            worker.queue = new
+    for queues in getattr(clitool, "queues", {}).values():
+        if queues.get("tx_queue") is old:
+            queues["tx_queue"] = new
+    clitool.tx_queue = new
@@ -16,11 +16,20 @@
 
 """LINCOT Command Line."""
 
-import pytak
+import importlib
+import sys
+
+# ``lincot <name> ...`` runs ``lincot.<name>.main``.
+SUBCOMMANDS = ("replay", "simulate", "sink")
 
 
 def main() -> None:
-    """CLI tool boilerplate."""
+    """CLI tool boilerplate, plus the replay, simulate and sink subcommands."""
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        module = importlib.import_module(f"lincot.{sys.argv[1]}")
+        sys.exit(module.main(sys.argv[2:]))
+    import pytak  # pylint: disable=import-outside-toplevel
+
     pytak.cli(__name__.split(".", maxsplit=1)[0])
 
 
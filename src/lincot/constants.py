@@ -16,18 +16,35 @@
 
 """LINCOT Constants."""
 
-import socket
-
-_hostname = socket.gethostname()
-
 DEFAULT_COT_STALE: str = "3600"
 DEFAULT_COT_TYPE: str = "a-f-G-E-S"
 DEFAULT_POLL_INTERVAL: int = 61
+DEFAULT_MIN_POLL_INTERVAL: float = 1.0
 DEFAULT_GPS_INFO_CMD: str = "gpspipe --json -n 5"
+DEFAULT_GPS_INFO_CMD_TIMEOUT: float = 10.0
+DEFAULT_GPSD_HOST: str = "127.0.0.1"
+DEFAULT_GPSD_PORT: int = 2947
+DEFAULT_GPSD_BACKOFF_INITIAL: float = 1.0
+DEFAULT_GPSD_BACKOFF_MAX: float = 30.0
+DEFAULT_NMEA_BAUD: int = 9600
 DEFAULT_SSH_USER: str = "pi"
 DEFAULT_COCKPIT_PORT: int = 9090
+DEFAULT_SUPPRESS_MAX_SILENCE: float = 600.0
+DEFAULT_TX_COALESCE: bool = True
+DEFAULT_SPOOL_SEGMENT_BYTES: int = 1048576
+DEFAULT_SPOOL_MAX_BYTES: int = 16777216
+DEFAULT_SPOOL_DRAIN_RATE: float = 5.0
+DEFAULT_FANOUT_QUEUE_SIZE: int = 100
+DEFAULT_FANOUT_POLICY: str = "coalesce"
+DEFAULT_FANOUT_SEND_TIMEOUT: float = 10.0
+DEFAULT_FANOUT_BACKOFF_MAX: float = 60.0
+DEFAULT_FIX_AGGREGATE_SAMPLES: int = 10
+DEFAULT_FIX_AGGREGATE_OUTLIER: float = 3.0
 DEFAULT_REMARKS_EXTRA_CMD_TIMEOUT: float = 2.0
 DEFAULT_COT_DETAIL_XML_CMD_TIMEOUT: float = 2.0
+DEFAULT_HOST_INFO_TTL: float = 300.0
+DEFAULT_DETAIL_PROVIDER_TTL: float = 60.0
+DEFAULT_DETAIL_PROVIDER_TIMEOUT: float = 5.0
 MACHINE_ID_PATHS = ("/etc/machine-id", "/var/lib/dbus/machine-id")
 
 # Sensor keep-alive / heartbeat
@@ -35,6 +52,15 @@ DEFAULT_SENSOR_KEEPALIVE_PERIOD: int = 30
 DEFAULT_SENSOR_LAT: float = 0.0
 DEFAULT_SENSOR_LON: float = 0.0
 DEFAULT_SENSOR_HAE: float = 0.0
-DEFAULT_SENSOR_ID: str = f"lincot_{_hostname}"
 DEFAULT_SENSOR_COT_TYPE: str = "a-f-G-E-S-E"
 DEFAULT_SENSOR_PAYLOAD_TYPE: str = "GPS-Receiver"
+
+
+def __getattr__(name: str):
+    # DEFAULT_SENSOR_ID needs the hostname; look it up only when first used.
+    if name == "DEFAULT_SENSOR_ID":
+        import socket  # pylint: disable=import-outside-toplevel
+
+        value = globals()[name] = f"lincot_{socket.gethostname()}"
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
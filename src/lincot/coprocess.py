@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Run remarks/detail commands, once per event or as persistent co-processes.
+
+Co-process protocol: LINCOT writes one empty line to the helper's stdin per
+request. The helper answers with its fragment (zero or more non-empty lines)
+followed by one empty line. The helper is started once, restarted if it exits,
+and on timeout the last good answer is reused.
+"""
+
+import queue
+import shlex
+import subprocess
+import threading
+from typing import Dict, List, Optional
+
+from lincot.metrics import SUBPROCESS_TIMEOUTS
+
+_HELPERS: Dict[str, "CoProcess"] = {}
+_HELPERS_LOCK = threading.Lock()
+
+
+def is_enabled(value) -> bool:
+    """Interpret a config flag such as ``1``, ``true``, ``yes`` or ``on``."""
+    return str(value or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class CoProcess:
+    """A long-running helper command answering line-delimited requests."""
+
+    def __init__(self, command: str, timeout: float) -> None:
+        self.command = command
+        self.timeout = timeout
+        self.last_good: Optional[str] = None
+        self.starts: int = 0
+        self.timeouts: int = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._responses: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._unanswered: int = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _read_responses(stdout, responses: "queue.Queue[Optional[str]]") -> None:
+        lines: List[str] = []
+        for line in stdout:
+            line = line.rstrip("\r\n")
+            if line:
+                lines.append(line)
+                continue
+            responses.put("\n".join(lines))
+            lines = []
+        responses.put(None)
+
+    def _start(self) -> None:
+        self._proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            shlex.split(self.command),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        self._responses = queue.Queue()
+        self._unanswered = 0
+        self.starts += 1
+        threading.Thread(
+            target=self._read_responses,
+            args=(self._proc.stdout, self._responses),
+            name=f"lincot-coprocess-{self.starts}",
+            daemon=True,
+        ).start()
+
+    def _stop(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        if proc.poll() is None:
+            proc.kill()
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        for stream in (proc.stdin, proc.stdout):
+            try:
+                stream.close()
+            except (OSError, ValueError):
+                pass
+
+    def query(self) -> Optional[str]:
+        """Ask the helper for a fragment; fall back to the last good answer."""
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._stop()
+                try:
+                    self._start()
+                except (OSError, ValueError):
+                    return self.last_good
+            try:
+                self._proc.stdin.write("\n")
+                self._proc.stdin.flush()
+            except (OSError, ValueError):
+                self._stop()
+                return self.last_good
+
+            while True:
+                try:
+                    response = self._responses.get(timeout=self.timeout)
+                except queue.Empty:
+                    self.timeouts += 1
+                    SUBPROCESS_TIMEOUTS.inc()
+                    self._unanswered += 1
+                    return self.last_good
+                if response is None:
+                    self._stop()
+                    return self.last_good
+                if self._unanswered:
+                    # Late answer to a request that already timed out.
+                    self._unanswered -= 1
+                    continue
+                self.last_good = response
+                return response
+
+    def close(self) -> None:
+        """Stop the helper process."""
+        with self._lock:
+            self._stop()
+
+
+def get_coprocess(command: str, timeout: float) -> CoProcess:
+    """Return the shared co-process for ``command``, creating it on first use."""
+    with _HELPERS_LOCK:
+        helper = _HELPERS.get(command)
+        if helper is None:
+            helper = _HELPERS[command] = CoProcess(command, timeout)
+        helper.timeout = timeout
+        return helper
+
+
+def close_coprocesses() -> None:
+    """Stop every co-process started by this module."""
+    with _HELPERS_LOCK:
+        helpers = list(_HELPERS.values())
+        _HELPERS.clear()
+    for helper in helpers:
+        helper.close()
+
+
+def command_output(command: str, timeout: float, persistent: bool = False) -> str:
+    """Return stripped stdout of ``command``, or "" on failure or timeout."""
+    if persistent:
+        return (get_coprocess(command, timeout).query() or "").strip()
+    try:
+        run = subprocess.run(
+            shlex.split(command),
+            check=False,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        SUBPROCESS_TIMEOUTS.inc()
+        return ""
+    except (OSError, ValueError):
+        return ""
+    if run.returncode != 0:
+        return ""
+    return (run.stdout or "").strip()
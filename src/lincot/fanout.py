@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Deliver every TX event to extra destinations (FANOUT_URLS).
+
+Events are built and serialized once and put on PyTAK's tx_queue for COT_URL.
+``install`` replaces that queue with a ``TeeQueue`` that also offers the same
+bytes to each ``Destination``: an extra PyTAK transport (``udp://``, ``tcp://``,
+``tls://`` ...) or an append-only ``file://`` log. TAK protobuf events are only
+re-framed (stream vs. mesh header) for destinations that need the other
+framing, never re-encoded.
+
+Each destination has its own bounded queue, drop or coalesce policy, send
+timeout and reconnect backoff, and runs in its own task for the life of the
+process, so a stalled TLS server neither blocks the others nor the producers,
+and keeps its queue across COT_URL reconnects.
+
+PyTAK tears down every task it runs when COT_URL fails. With fan-out on, the
+workers that build events therefore run outside PyTAK's task set too (see
+``Fanout.adopt``), and the teeing tx_queue is reused by every new connection:
+the destinations keep receiving events while COT_URL is down, and COT_URL gets
+what is still queued when it is back.
+"""
+
+import asyncio
+import logging
+from configparser import ConfigParser, SectionProxy
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import pytak
+
+import lincot
+from lincot.coalesce import CoalescingQueue, replace_tx_queue
+from lincot.metrics import fanout_connected, fanout_dropped, fanout_sent
+from lincot.settings import config_dict, number
+from lincot.tak_proto import (
+    MESH,
+    MESH_HEADER,
+    STREAM_HEADER,
+    enabled as tak_proto_enabled,
+    ensure_framed,
+    frame,
+    unframe,
+    wire_format,
+)
+
+_LOGGER = logging.getLogger(__name__)
+_FANOUTS: Dict[Tuple[str, ...], "Fanout"] = {}
+
+POLICIES = ("coalesce", "drop-oldest")
+
+
+def fanout_urls(config: Union[dict, SectionProxy, None]) -> List[str]:
+    """FANOUT_URLS as a list; empty when fan-out is off."""
+    config = config or {}
+    urls = [url.strip() for url in str(config.get("FANOUT_URLS") or "").split(",")]
+    for url in urls:
+        if url and "://" not in url:
+            raise ValueError(f"FANOUT_URLS: {url!r} is not a URL")
+    return [url for url in urls if url]
+
+
+def _section(config: dict, url: str) -> SectionProxy:
+    # PyTAK's TLS client needs SectionProxy.getboolean; no interpolation so
+    # '%' in passwords survives.
+    parser = ConfigParser(interpolation=None)
+    parser.read_dict({"fanout": {**config, "COT_URL": url}})
+    return parser["fanout"]
+
+
+def reframe(data: bytes, wire: str) -> bytes:
+    """``data`` with TAK protobuf framing for ``wire``; XML is unchanged."""
+    if not isinstance(data, (bytes, bytearray)) or not data.startswith(
+        STREAM_HEADER
+    ):
+        return data
+    is_mesh = data.startswith(MESH_HEADER)
+    if is_mesh == (wire == MESH):
+        return data
+    return frame(unframe(bytes(data)), wire)
+
+
+class Destination:
+    """One extra output with its own queue, connection and failure handling."""
+
+    def __init__(
+        self,
+        url: str,
+        config: Union[dict, SectionProxy, None] = None,
+        queue_size: int = lincot.DEFAULT_FANOUT_QUEUE_SIZE,
+        policy: str = lincot.DEFAULT_FANOUT_POLICY,
+        send_timeout: float = lincot.DEFAULT_FANOUT_SEND_TIMEOUT,
+        backoff_max: float = lincot.DEFAULT_FANOUT_BACKOFF_MAX,
+    ) -> None:
+        self.url = url
+        self.name = pytak.sanitize_url_credentials(url)
+        self.config = _section(config_dict(config), url)
+        self.wire = wire_format(self.config)
+        self.tak_proto = tak_proto_enabled(self.config)
+        self.queue: asyncio.Queue = (
+            CoalescingQueue(queue_size) if policy == "coalesce"
+            else asyncio.Queue(queue_size)
+        )
+        self.send_timeout = send_timeout
+        self.backoff_max = backoff_max
+        self.sent = fanout_sent(self.name)
+        self.dropped = fanout_dropped(self.name)
+        self.connected = fanout_connected(self.name)
+        self._writer = None
+        self._task: Optional[asyncio.Task] = None
+
+    def offer(self, data: bytes) -> None:
+        """Queue ``data`` without waiting, dropping the oldest event when full.
+
+        With ``coalesce``, an event superseding a queued one drops nothing.
+        """
+        try:
+            self.queue.put_nowait(data)
+            return
+        except asyncio.QueueFull:
+            pass
+        try:
+            self.queue.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        else:
+            self.dropped.inc()
+        self.queue.put_nowait(data)
+
+    async def connect(self) -> None:
+        """Open the transport; file:// destinations are appended to."""
+        parsed = urlparse(self.url)
+        if parsed.scheme.lower() == "file":
+            path = Path(parsed.netloc + parsed.path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = open(path, "ab")  # pylint: disable=consider-using-with
+        else:
+            _, self._writer = await pytak.protocol_factory(self.config)
+        self.connected.set(1)
+
+    async def send(self, data: bytes) -> None:
+        """Write one event, bounded by the send timeout."""
+        if self.tak_proto:
+            data = ensure_framed(data, self.wire)
+            if data is None:
+                return
+        data = reframe(data, self.wire)
+        writer = self._writer
+        if hasattr(writer, "send"):
+            await asyncio.wait_for(writer.send(data), self.send_timeout)
+            return
+        writer.write(data)
+        if hasattr(writer, "drain"):
+            await asyncio.wait_for(writer.drain(), self.send_timeout)
+        if hasattr(writer, "flush"):
+            writer.flush()
+
+    def disconnect(self) -> None:
+        """Drop the transport; queued events wait for the next connection."""
+        writer, self._writer = self._writer, None
+        self.connected.set(0)
+        if writer is None:
+            return
+        try:
+            writer.close()
+        except Exception:  # pylint: disable=broad-exception-caught
+            pass
+
+    async def run(self) -> None:
+        """Connect, deliver queued events and reconnect with backoff, forever."""
+        delay = 1.0
+        while True:
+            try:
+                await self.connect()
+                _LOGGER.info("Fan-out to %s connected", self.name)
+                delay = 1.0
+                while True:
+                    data = await self.queue.get()
+                    await self.send(data)
+                    self.sent.inc()
+            except asyncio.CancelledError:
+                self.disconnect()
+                raise
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                self.disconnect()
+                _LOGGER.warning(
+                    "Fan-out to %s failed (%s: %s); retrying in %.0fs",
+                    self.name,
+                    type(exc).__name__,
+                    exc,
+                    delay,
+                )
+            await asyncio.sleep(delay)
+            delay = min(self.backoff_max, delay * 2)
+
+    def start(self) -> None:
+        """Start delivering in the background, if not already."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+
+    def stop(self) -> None:
+        """Stop delivering and close the transport."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.disconnect()
+
+
+async def _run_worker(worker) -> None:
+    try:
+        await worker.run()
+    finally:
+        await worker.close()
+
+
+class Fanout:
+    """The set of extra destinations every TX event is copied to.
+
+    It also owns what must outlive a COT_URL connection: the tx_queue and the
+    workers producing events for it.
+    """
+
+    def __init__(self, destinations: List[Destination]) -> None:
+        self.destinations = destinations
+        self.tx_queue: Optional["TeeQueue"] = None
+        self.workers: list = []
+        self._running: List[asyncio.Future] = []
+
+    @classmethod
+    def from_config(cls, config: Union[dict, SectionProxy, None]) -> "Fanout":
+        """Build destinations from FANOUT_URLS and the FANOUT_* settings."""
+        config = config or {}
+        policy = str(
+            config.get("FANOUT_POLICY") or lincot.DEFAULT_FANOUT_POLICY
+        ).strip().lower()
+        if policy not in POLICIES:
+            raise ValueError(
+                f"FANOUT_POLICY must be one of {', '.join(POLICIES)}, got {policy!r}"
+            )
+        queue_size = number(
+            config, "FANOUT_QUEUE_SIZE", lincot.DEFAULT_FANOUT_QUEUE_SIZE, int, 1
+        )
+        send_timeout = number(
+            config, "FANOUT_SEND_TIMEOUT", lincot.DEFAULT_FANOUT_SEND_TIMEOUT,
+            minimum=0,
+        )
+        backoff_max = number(
+            config, "FANOUT_BACKOFF_MAX", lincot.DEFAULT_FANOUT_BACKOFF_MAX,
+            minimum=1,
+        )
+        return cls(
+            [
+                Destination(url, config, queue_size, policy, send_timeout, backoff_max)
+                for url in fanout_urls(config)
+            ]
+        )
+
+    def offer(self, data: bytes) -> None:
+        """Hand the same event bytes to every destination."""
+        for destination in self.destinations:
+            destination.offer(data)
+
+    def start(self) -> None:
+        """Start every destination's delivery task."""
+        for destination in self.destinations:
+            destination.start()
+
+    def stop(self) -> None:
+        """Stop every destination and every adopted worker."""
+        for destination in self.destinations:
+            destination.stop()
+        self._cancel_workers()
+
+    def needs_workers(self) -> bool:
+        """True unless adopted workers exist and none of them has finished."""
+        return not self.workers or any(task.done() for task in self._running)
+
+    def adopt(self, workers: Iterable) -> None:
+        """Run ``workers`` for the life of the process, not of a connection."""
+        self._cancel_workers()
+        self.workers = list(workers)
+
+    def _cancel_workers(self) -> None:
+        for task in self._running:
+            task.cancel()
+        self._running = []
+
+    async def run_workers(self) -> None:
+        """Start the adopted workers if needed and wait until one of them fails.
+
+        Cancelling this (a COT_URL teardown) leaves the workers running; a
+        worker's exception is raised here so PyTAK handles it as before.
+        """
+        if not self._running:
+            self._running = [
+                asyncio.ensure_future(_run_worker(worker)) for worker in self.workers
+            ]
+        if not self._running:
+            return
+        done, _ = await asyncio.wait(
+            self._running, return_when=asyncio.FIRST_EXCEPTION
+        )
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+
+class TeeQueue(asyncio.Queue):
+    """A TX queue that also offers every event to a ``Fanout``."""
+
+    fanout: Optional[Fanout] = None
+
+    def _put(self, item) -> None:
+        super()._put(item)
+        if self.fanout is not None:
+            self.fanout.offer(item)
+
+
+class CoalescingTeeQueue(TeeQueue, CoalescingQueue):
+    """A coalescing TX queue (TX_COALESCE) that also feeds a ``Fanout``."""
+
+    def _replace(self, uid: Optional[str], item) -> bool:
+        # A superseding event never reaches _put; offer it here instead.
+        if not super()._replace(uid, item):
+            return False
+        if self.fanout is not None:
+            self.fanout.offer(item)
+        return True
+
+
+def get_fanout(config: Union[dict, SectionProxy, None]) -> Optional[Fanout]:
+    """Return the process-wide fan-out for FANOUT_URLS, or None when unset."""
+    urls = tuple(fanout_urls(config))
+    if not urls:
+        return None
+    fanout = _FANOUTS.get(urls)
+    if fanout is None:
+        fanout = _FANOUTS[urls] = Fanout.from_config(config)
+    return fanout
+
+
+def install(clitool, fanout: Fanout) -> Optional[TeeQueue]:
+    """Swap the CLITool's tx_queue for one that also feeds ``fanout``.
+
+    The first connection creates the queue; later ones reuse it, with whatever
+    was queued while COT_URL was down.
+    """
+    old = clitool.tx_queue
+    new = fanout.tx_queue
+    if new is None:
+        if isinstance(old, TeeQueue):
+            old.fanout = fanout
+            fanout.tx_queue = old
+            return old
+        if not isinstance(old, asyncio.Queue):
+            return None
+        cls = CoalescingTeeQueue if isinstance(old, CoalescingQueue) else TeeQueue
+        new = fanout.tx_queue = cls(old.maxsize)
+        new.fanout = fanout
+    if old is not new:
+        replace_tx_queue(clitool, new)
+    return new
+
+
+def close_fanouts() -> None:
+    """Stop every fan-out destination started by this module."""
+    for fanout in _FANOUTS.values():
+        fanout.stop()
+    _FANOUTS.clear()
@@ -18,48 +18,51 @@
 
 from configparser import SectionProxy
 import math
-import shlex
-import subprocess
-from typing import Optional, Union
+import time
+from typing import Optional, Tuple, Union
 import xml.etree.ElementTree as ET
 from xml.etree.ElementTree import Element
 
 import pytak
 
 import lincot
+from lincot.coalesce import (
+    Backfill,
+    coalesce_enabled,
+    install as install_coalescing_queue,
+)
+from lincot.coprocess import command_output
+from lincot.fanout import get_fanout, install as install_fanout
 from lincot.identity import get_callsign, get_uid
-from lincot.position import static_position_configured
+from lincot.metrics import COT_BUILD, COT_SERIALIZE, FIX_CLOCK
+from lincot.position import cot_time_at, fix_time
+from lincot.providers import cached_elements
 from lincot.remarks import build_remarks, get_cockpit_url
-
-
-def _detail_children_from_command(
-    config: Union[dict, SectionProxy, None],
-) -> list[Element]:
+from lincot.settings import Settings, as_settings
+from lincot.sources import create_source_tasks, source_names
+from lincot.spool import get_recorder, get_spool
+from lincot.tak_proto import (
+    encode_position,
+    enabled as tak_proto_enabled,
+    ensure_framed,
+    wire_format,
+)
+from lincot.template import (
+    compile_position_template,
+    escape_attrib,
+    escape_text,
+    is_template_safe,
+    position_event,
+)
+
+
+def _detail_children_from_command(settings: Settings) -> list[Element]:
     """Run an optional command that emits XML detail children."""
-    config = config or {}
-    command = str(config.get("COT_DETAIL_XML_CMD") or "").strip()
-    if not command:
-        return []
-    try:
-        timeout = float(
-            config.get("COT_DETAIL_XML_CMD_TIMEOUT")
-            or lincot.DEFAULT_COT_DETAIL_XML_CMD_TIMEOUT
-        )
-    except (TypeError, ValueError):
-        timeout = lincot.DEFAULT_COT_DETAIL_XML_CMD_TIMEOUT
-    try:
-        run = subprocess.run(
-            shlex.split(command),
-            check=False,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-    except (OSError, ValueError, subprocess.TimeoutExpired):
-        return []
-    if run.returncode != 0:
+    if not settings.detail_cmd:
         return []
-    xml_text = (run.stdout or "").strip()
+    xml_text = command_output(
+        settings.detail_cmd, settings.detail_cmd_timeout, settings.detail_cmd_persistent
+    )
     if not xml_text:
         return []
     try:
@@ -69,17 +72,101 @@ def _detail_children_from_command(
     return list(wrapper)
 
 
+def _prepare_tx_workers(
+    config: Union[dict, SectionProxy], clitool: pytak.CLITool
+) -> None:
+    """Hook fix-to-send latency into PyTAK TX workers.
+
+    With TAK_PROTO set, LINCOT encodes protobuf itself, so PyTAK's XML to
+    protobuf conversion is switched off; XML that still reaches tx_queue (PyTAK's
+    hello event) is encoded by the send wrapper. Unless TX_COALESCE is off, tx_queue is
+    replaced by a queue that keeps only the newest pending event per uid. With
+    FANOUT_URLS set, the queue also copies every event to those destinations.
+    A spool backfill event is acknowledged to its spool once it has been sent.
+    """
+    if coalesce_enabled(config):
+        install_coalescing_queue(clitool)
+    fanout = get_fanout(config)
+    if fanout is not None:
+        install_fanout(clitool, fanout)
+    native_proto = tak_proto_enabled(config)
+    wire = wire_format(config)
+    for worker in getattr(clitool, "tasks", ()):
+        if not isinstance(worker, pytak.TXWorker):
+            continue
+        if native_proto:
+            worker.use_protobuf = False
+        if hasattr(worker, "_lincot_send"):
+            continue
+        send_data = worker.send_data
+
+        async def _send_data(data, _send_data=send_data) -> None:
+            payload = ensure_framed(data, wire) if native_proto else data
+            if payload is None:
+                return
+            await _send_data(payload)
+            FIX_CLOCK.sent(data)
+            if isinstance(data, Backfill) and data.on_sent is not None:
+                data.on_sent()
+
+        worker._lincot_send = send_data  # pylint: disable=protected-access
+        worker.send_data = _send_data
+
+
 def create_tasks(config: Union[dict, SectionProxy], clitool: pytak.CLITool) -> set:
-    """Bootstrap coroutine tasks for this PyTAK application."""
-    tasks = {lincot.LincotWorker(clitool.tx_queue, config)}
-    tasks.add(lincot.SensorWorker(clitool.tx_queue, config))
+    """Bootstrap coroutine tasks for this PyTAK application.
+
+    The config is parsed and validated once here; a bad value raises ValueError
+    before anything starts. With FANOUT_URLS set, the event producers are handed
+    to the process-wide fan-out on the first connection and only the
+    connection-bound workers are returned.
+    """
+    settings = Settings.from_config(config)
+    _prepare_tx_workers(config, clitool)
+    fanout = get_fanout(config)
+    spool = get_spool(config)
+    if spool is not None:
+        # Connected again: the new workers acquire position themselves.
+        get_recorder(spool, config).stop()
+    tasks: set = set()
+    if fanout is None or fanout.needs_workers():
+        producers = _producer_tasks(config, clitool, settings)
+        if fanout is None:
+            tasks = producers
+        else:
+            # Keep building events for the destinations while COT_URL is down.
+            fanout.adopt(producers)
+    if spool is not None:
+        tasks.add(lincot.SpoolWorker(clitool.tx_queue, config, spool, clitool))
+    if str(config.get("METRICS_LISTEN") or "").strip():
+        tasks.add(lincot.MetricsWorker(clitool.tx_queue, config))
+    if fanout is not None:
+        tasks.add(lincot.FanoutWorker(clitool.tx_queue, config, fanout))
     return tasks
 
 
-def _position_source(config: Union[dict, SectionProxy, None]) -> str:
-    if static_position_configured(config):
-        return "static"
-    return "gpsd"
+def _producer_tasks(
+    config: Union[dict, SectionProxy], clitool: pytak.CLITool, settings: Settings
+) -> set:
+    """The workers that acquire position and put events on tx_queue."""
+    if source_names(config):
+        tasks, bus = create_source_tasks(config, clitool.tx_queue)
+    else:
+        bus = lincot.PositionBus()
+        tasks = {lincot.PositionService(clitool.tx_queue, config, bus, settings)}
+        tasks.add(lincot.LincotWorker(clitool.tx_queue, config, bus, settings))
+    tasks.add(lincot.SensorWorker(clitool.tx_queue, config, bus, settings))
+    tasks.add(lincot.DetailProviderWorker(clitool.tx_queue, config))
+    spool = get_spool(config)
+    if spool is not None:
+        # Record outages from this bus rather than opening the receiver again.
+        service = next(
+            task
+            for task in tasks
+            if isinstance(task, lincot.PositionService) and task.bus is bus
+        )
+        get_recorder(spool, config).follow(service)
+    return tasks
 
 
 def _horizontal_error(gps_info: dict) -> str:
@@ -99,14 +186,8 @@ def _vertical_error(gps_info: dict) -> str:
     return "9999999.0"
 
 
-# pylint: disable=too-many-locals
-def position_to_cot_xml(
-    gps_info: dict,
-    config: Union[dict, SectionProxy, None] = None,
-) -> Optional[Element]:
-    """Convert a TPV position dict to a Cursor on Target event."""
-    config = config or {}
-
+def _position_parts(gps_info: dict, settings: Settings) -> Optional[dict]:
+    """Resolve every value a position event needs, or None for unusable TPVs."""
     if gps_info.get("class") != "TPV":
         return None
 
@@ -115,47 +196,106 @@ def position_to_cot_xml(
     if lat is None or lon is None:
         return None
 
-    cot_type: str = str(config.get("COT_TYPE") or lincot.DEFAULT_COT_TYPE)
-    cot_stale: int = int(config.get("COT_STALE") or lincot.DEFAULT_COT_STALE)
-    cot_callsign: str = get_callsign(config)
-    uid: str = get_uid(config)
-    position_source = _position_source(config)
-    cockpit_url = get_cockpit_url(config)
-
+    cockpit_url = get_cockpit_url(settings)
+    return {
+        "uid": settings.cot_uid or get_uid(None),
+        "cot_type": settings.cot_type,
+        "stale": settings.cot_stale,
+        "access": settings.cot_access,
+        "callsign": settings.callsign or get_callsign(None),
+        "link_url": cockpit_url.rstrip("/"),
+        "lat": lat,
+        "lon": lon,
+        "hae": gps_info.get("altHAE") or gps_info.get("altMSL") or "9999999.0",
+        "ce": _horizontal_error(gps_info),
+        "le": _vertical_error(gps_info),
+        "course": str(gps_info.get("track") or "0.0"),
+        "speed": str(gps_info.get("speed") or "0.0"),
+        "remarks": build_remarks(
+            settings,
+            position_source=settings.position_source,
+            cockpit_url=cockpit_url,
+        ),
+        "children": _detail_children_from_command(settings) + cached_elements(),
+        "fix_time": fix_time(gps_info) if settings.time_from_fix else None,
+    }
+
+
+def _event_times(parts: dict) -> Tuple[str, str, str]:
+    """CoT time/start and stale strings, from the fix time when requested."""
+    if parts["fix_time"] is None:
+        now = pytak.cot_time()
+        return now, now, pytak.cot_time(parts["stale"])
+    taken = cot_time_at(parts["fix_time"])
+    return taken, taken, cot_time_at(parts["fix_time"], parts["stale"])
+
+
+def _position_element(parts: dict) -> Element:
     point = pytak.cot_point(
-        lat=lat,
-        lon=lon,
-        hae=gps_info.get("altHAE") or gps_info.get("altMSL") or "9999999.0",
-        ce=_horizontal_error(gps_info),
-        le=_vertical_error(gps_info),
+        lat=parts["lat"],
+        lon=parts["lon"],
+        hae=parts["hae"],
+        ce=parts["ce"],
+        le=parts["le"],
     )
-
-    track = Element("track")
-    track.set("course", str(gps_info.get("track") or "0.0"))
-    track.set("speed", str(gps_info.get("speed") or "0.0"))
-
-    contact = Element("contact")
-    contact.set("callsign", cot_callsign)
-
-    link = Element("link")
-    link.set("url", cockpit_url.rstrip("/"))
-    link.set("relation", "r-u")
-    link.set("type", cot_type)
-
-    detail = pytak.cot_detail(track, contact)
-    pytak.add_remarks(detail, [build_remarks(config, position_source=position_source)])
-    for child in _detail_children_from_command(config):
-        detail.append(child)
-    detail.append(link)
-
-    return pytak.cot_event(
-        uid=uid,
-        cot_type=cot_type,
-        stale=cot_stale,
+    event = position_event(
+        uid=parts["uid"],
+        cot_type=parts["cot_type"],
+        stale=parts["stale"],
+        access=parts["access"],
         point=point,
-        detail=detail,
-        access=config.get("COT_ACCESS", pytak.DEFAULT_COT_ACCESS),
+        course=parts["course"],
+        speed=parts["speed"],
+        callsign=parts["callsign"],
+        remarks=parts["remarks"],
+        children=parts["children"],
+        link_url=parts["link_url"],
     )
+    if parts["fix_time"] is not None:
+        event_time, start, stale = _event_times(parts)
+        event.set("time", event_time)
+        event.set("start", start)
+        event.set("stale", stale)
+    return event
+
+
+def _render_position(parts: dict) -> bytes:
+    """Render a position event through its compiled template."""
+    template = compile_position_template(
+        parts["uid"],
+        parts["cot_type"],
+        parts["stale"],
+        parts["access"],
+        parts["callsign"],
+        parts["link_url"],
+    )
+    event_time, start, stale = _event_times(parts)
+    flow_time = event_time if parts["fix_time"] is None else pytak.cot_time()
+    values = {
+        "time": event_time.encode("ascii"),
+        "start": start.encode("ascii"),
+        "stale": stale.encode("ascii"),
+        "flow_time": flow_time.encode("ascii"),
+        "lat": escape_attrib(pytak.truncate_float(parts["lat"], 4)),
+        "lon": escape_attrib(pytak.truncate_float(parts["lon"], 4)),
+        "hae": escape_attrib(str(parts["hae"])),
+        "ce": escape_attrib(str(parts["ce"])),
+        "le": escape_attrib(str(parts["le"])),
+        "course": escape_attrib(parts["course"]),
+        "speed": escape_attrib(parts["speed"]),
+        "remarks": escape_text(parts["remarks"]),
+        "children": b"".join(ET.tostring(child) for child in parts["children"]),
+    }
+    return template.render(values)
+
+
+def position_to_cot_xml(
+    gps_info: dict,
+    config: Union[dict, SectionProxy, None] = None,
+) -> Optional[Element]:
+    """Convert a TPV position dict to a Cursor on Target event."""
+    parts = _position_parts(gps_info, as_settings(config))
+    return _position_element(parts) if parts is not None else None
 
 
 def position_to_cot(
@@ -163,10 +303,45 @@ def position_to_cot(
     config: Union[dict, SectionProxy, None] = None,
     known_gps_info: Optional[dict] = None,
 ) -> Optional[bytes]:
-    """Convert position to CoT XML (TAK Protocol v0)."""
+    """Convert position to CoT XML (TAK Protocol v0).
+
+    Uses the compiled event template; output is byte-identical to serializing
+    ``position_to_cot_xml()`` with ``pytak.serialize_cot(..., trailing_newline=True)``.
+    """
     del known_gps_info  # backward-compatible signature
-    cot: Optional[Element] = position_to_cot_xml(gps_info, config)
-    return pytak.serialize_cot(cot, trailing_newline=True) if cot is not None else None
+    started = time.perf_counter()
+    parts = _position_parts(gps_info, as_settings(config))
+    if parts is None:
+        return None
+    built = time.perf_counter()
+    COT_BUILD["position"].observe(built - started)
+    if not is_template_safe(parts["children"]):
+        event = pytak.serialize_cot(_position_element(parts), trailing_newline=True)
+    else:
+        event = _render_position(parts)
+    COT_SERIALIZE["position"].observe(time.perf_counter() - built)
+    return event
+
+
+def position_to_proto(
+    gps_info: dict,
+    config: Union[dict, SectionProxy, None] = None,
+    wire: Optional[str] = None,
+) -> Optional[bytes]:
+    """Convert position straight to framed TAK Protocol Version 1 (protobuf).
+
+    ``wire`` is ``"mesh"`` or ``"stream"``; by default it follows COT_URL like PyTAK.
+    """
+    settings = as_settings(config)
+    started = time.perf_counter()
+    parts = _position_parts(gps_info, settings)
+    if parts is None:
+        return None
+    built = time.perf_counter()
+    COT_BUILD["position"].observe(built - started)
+    event = encode_position(parts, wire or settings.wire)
+    COT_SERIALIZE["position"].observe(time.perf_counter() - built)
+    return event
 
 
 def gpspipe_to_cot_xml(
@@ -195,19 +370,14 @@ def gen_sensor_cot(
     le: str = "9999999.0",
 ):
     """Generate a periodic sensor beacon CoT (a-f-G-E-S-E)."""
-    config = config or {}
-    sensor_id = config.get("SENSOR_ID", lincot.DEFAULT_SENSOR_ID)
-    cot_type = config.get("SENSOR_COT_TYPE", lincot.DEFAULT_SENSOR_COT_TYPE)
-    cot_stale = int(config.get("COT_STALE", pytak.DEFAULT_COT_STALE))
-    callsign = config.get("SENSOR_CALLSIGN", sensor_id)
-    payload_type = config.get("SENSOR_PAYLOAD_TYPE", lincot.DEFAULT_SENSOR_PAYLOAD_TYPE)
+    settings = as_settings(config)
 
     contact = ET.Element("contact")
-    contact.set("callsign", callsign)
+    contact.set("callsign", settings.sensor_callsign)
 
     sensor_elem = ET.Element("sensor")
-    sensor_elem.set("sensor_id", sensor_id)
-    sensor_elem.set("type", payload_type)
+    sensor_elem.set("sensor_id", settings.sensor_id)
+    sensor_elem.set("type", settings.sensor_payload_type)
 
     detail = pytak.cot_detail(contact, sensor_elem)
 
@@ -217,9 +387,9 @@ def gen_sensor_cot(
         hae=str(hae),
         ce=ce,
         le=le,
-        uid=f"SENSOR.{sensor_id}",
-        cot_type=cot_type,
-        stale=cot_stale,
+        uid=f"SENSOR.{settings.sensor_id}",
+        cot_type=settings.sensor_cot_type,
+        stale=settings.cot_stale,
         detail=detail,
-        access=config.get("COT_ACCESS", pytak.DEFAULT_COT_ACCESS),
+        access=settings.cot_access,
     )
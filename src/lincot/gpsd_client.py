@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Long-lived gpsd JSON protocol client for LINCOT."""
+
+import asyncio
+import json
+import logging
+import time
+from configparser import SectionProxy
+from typing import Callable, Optional, Union
+
+import lincot
+
+WATCH_COMMAND: bytes = b'?WATCH={"enable":true,"json":true}\n'
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class GpsdClient:
+    """Stream gpsd reports over one connection and keep the newest TPV in memory.
+
+    The client reconnects with exponential backoff when gpsd is unavailable or
+    drops the connection, so readers only ever look at the cached report. The
+    cached report expires ``max_age`` seconds after it was received, so a dead
+    gpsd is not reported as a live position.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        host: str = lincot.DEFAULT_GPSD_HOST,
+        port: int = lincot.DEFAULT_GPSD_PORT,
+        path: Optional[str] = None,
+        backoff_initial: float = lincot.DEFAULT_GPSD_BACKOFF_INITIAL,
+        backoff_max: float = lincot.DEFAULT_GPSD_BACKOFF_MAX,
+        logger: Optional[logging.Logger] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.path = path
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_age = max_age
+        self.connected: bool = False
+        self.tpv: Optional[dict] = None
+        self.tpv_received: Optional[float] = None
+        # Called with every TPV, e.g. to collect samples for FIX_AGGREGATE.
+        self.on_tpv: Optional[Callable[[dict], None]] = None
+        self._logger = logger or _LOGGER
+        self._updated: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Union[dict, SectionProxy, None],
+        logger: Optional[logging.Logger] = None,
+    ) -> "GpsdClient":
+        """Build a client from GPSD_HOST / GPSD_PORT / GPSD_SOCKET settings.
+
+        The cached TPV expires after two POLL_INTERVALs without a new report.
+        """
+        config = config or {}
+        poll = float(config.get("POLL_INTERVAL") or lincot.DEFAULT_POLL_INTERVAL)
+        return cls(
+            host=str(config.get("GPSD_HOST") or lincot.DEFAULT_GPSD_HOST).strip(),
+            port=int(config.get("GPSD_PORT") or lincot.DEFAULT_GPSD_PORT),
+            path=str(config.get("GPSD_SOCKET") or "").strip() or None,
+            logger=logger,
+            max_age=2 * poll,
+        )
+
+    @property
+    def address(self) -> str:
+        """Human-readable gpsd address for logging."""
+        return self.path or f"{self.host}:{self.port}"
+
+    def _event(self) -> asyncio.Event:
+        # Created lazily so the Event binds to the running loop on Python 3.9.
+        if self._updated is None:
+            self._updated = asyncio.Event()
+        return self._updated
+
+    def latest(self) -> Optional[dict]:
+        """Return the newest TPV report, or None once it is older than max_age."""
+        if self.max_age is not None:
+            age = self.fix_age()
+            if age is None or age > self.max_age:
+                return None
+        return self.tpv
+
+    def fix_age(self) -> Optional[float]:
+        """Seconds since the newest TPV report was received."""
+        if self.tpv_received is None:
+            return None
+        return time.monotonic() - self.tpv_received
+
+    async def wait(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Wait until at least one TPV has been received, then return it."""
+        if self.tpv is None:
+            try:
+                await asyncio.wait_for(self._event().wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.latest()
+
+    def handle_line(self, line: bytes) -> Optional[dict]:
+        """Parse one gpsd JSON line, caching it when it is a TPV report."""
+        if b'"TPV"' not in line:
+            return None
+        try:
+            report = json.loads(line)
+        except ValueError as exc:
+            self._logger.debug("Invalid gpsd JSON: %s", exc)
+            return None
+        if not isinstance(report, dict) or report.get("class") != "TPV":
+            return None
+        self.tpv = report
+        self.tpv_received = time.monotonic()
+        self._event().set()
+        if self.on_tpv is not None:
+            self.on_tpv(report)
+        return report
+
+    async def _connect(self):
+        if self.path:
+            return await asyncio.open_unix_connection(self.path)
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def _stream(self, reader: asyncio.StreamReader) -> bool:
+        """Read reports until EOF. Returns True if any TPV arrived."""
+        got_tpv = False
+        while True:
+            line = await reader.readline()
+            if not line:
+                return got_tpv
+            if self.handle_line(line) is not None:
+                got_tpv = True
+
+    async def run(self) -> None:
+        """Connect to gpsd, enable JSON watch mode, and stream forever."""
+        delay = self.backoff_initial
+        while True:
+            try:
+                reader, writer = await self._connect()
+            except OSError as exc:
+                self._logger.warning(
+                    "gpsd %s unavailable (%s), retrying in %.1fs",
+                    self.address,
+                    exc,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+                continue
+
+            self._logger.info("Connected to gpsd at %s", self.address)
+            self.connected = True
+            try:
+                writer.write(WATCH_COMMAND)
+                await writer.drain()
+                if await self._stream(reader):
+                    delay = self.backoff_initial
+                self._logger.warning("gpsd %s closed the connection", self.address)
+            except (OSError, ValueError) as exc:
+                self._logger.warning("gpsd %s stream error: %s", self.address, exc)
+            finally:
+                self.connected = False
+                writer.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.backoff_max)
@@ -22,20 +22,26 @@ from configparser import SectionProxy
 from typing import Optional, Union
 
 import lincot
+from lincot.cache import TTLCache
 
 _MACHINE_ID_RE = re.compile(r"^[a-f0-9]{32}$")
 
+_CACHE = TTLCache(lincot.DEFAULT_HOST_INFO_TTL)
 
-def get_hostname() -> str:
-    """Return the system hostname (short name, no domain)."""
+
+def _read_hostname() -> str:
     name = socket.gethostname().strip()
     if "." in name:
         return name.split(".", maxsplit=1)[0]
     return name or "localhost"
 
 
-def get_machine_id() -> Optional[str]:
-    """Read Linux machine-id, if present and valid."""
+def get_hostname() -> str:
+    """Return the system hostname (short name, no domain)."""
+    return _CACHE.get("hostname", _read_hostname)
+
+
+def _read_machine_id() -> Optional[str]:
     for path in lincot.MACHINE_ID_PATHS:
         try:
             with open(path, encoding="utf-8") as handle:
@@ -47,6 +53,11 @@ def get_machine_id() -> Optional[str]:
     return None
 
 
+def get_machine_id() -> Optional[str]:
+    """Read Linux machine-id, if present and valid."""
+    return _CACHE.get("machine_id", _read_machine_id)
+
+
 def get_callsign(config: Union[dict, SectionProxy, None]) -> str:
     """Callsign for contact element; defaults to hostname."""
     config = config or {}
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Cheap in-process metrics rendered in the Prometheus text format.
+
+Metrics are module-level singletons with preallocated bucket arrays, so
+recording an observation only bumps existing counters. Set METRICS_LISTEN to
+``host:port`` or ``unix:/path`` to serve them with ``MetricsWorker``.
+"""
+
+import math
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# METRICS_LISTEN -> asyncio server, serving for the life of the process.
+_SERVERS: Dict[str, Any] = {}
+
+# Seconds; spans sub-millisecond template renders up to slow GPS commands.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Fix latencies include the poll interval and gpsd/command lag.
+LATENCY_BUCKETS: Tuple[float, ...] = DEFAULT_BUCKETS + (120.0, 300.0, 600.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Optional[Dict[str, str]], extra: str = "") -> str:
+    pairs = [f'{key}="{_escape(val)}"' for key, val in sorted((labels or {}).items())]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Optional[Dict[str, str]] = None
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = dict(labels or {})
+
+    def samples(self) -> List[str]:
+        """Sample lines for this metric (without HELP/TYPE)."""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.value: int = 0
+
+    def inc(self, amount: int = 1) -> None:
+        """Add ``amount`` to the counter."""
+        self.value += amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labels)} {_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """Point-in-time value, either set directly or read from a callback."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.value: float = math.nan
+        self.function: Optional[Callable[[], Optional[float]]] = None
+
+    def set(self, value: float) -> None:
+        """Set the gauge to ``value``."""
+        self.value = value
+
+    def set_function(self, function: Optional[Callable[[], Optional[float]]]) -> None:
+        """Read the gauge from ``function`` at scrape time (None means NaN)."""
+        self.function = function
+
+    def get(self) -> float:
+        """Current value of the gauge."""
+        if self.function is None:
+            return self.value
+        try:
+            value = self.function()
+        except Exception:  # pylint: disable=broad-exception-caught
+            return math.nan
+        return math.nan if value is None else float(value)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labels)} {_value(self.get())}"]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values with preallocated buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            labels = _labels(self.labels, f'le="{_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _labels(self.labels, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{labels} {self.count}")
+        lines.append(f"{self.name}_sum{_labels(self.labels)} {_value(self.sum)}")
+        lines.append(f"{self.name}_count{_labels(self.labels)} {self.count}")
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add ``metric`` and return it."""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        families: Dict[str, List[_Metric]] = {}
+        for metric in self.metrics:
+            families.setdefault(metric.name, []).append(metric)
+        lines: List[str] = []
+        for name, metrics in families.items():
+            lines.append(f"# HELP {name} {metrics[0].documentation}")
+            lines.append(f"# TYPE {name} {metrics[0].kind}")
+            for metric in metrics:
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _histogram(name: str, documentation: str, worker: str) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, {"worker": worker}))
+
+
+def _counter(name: str, documentation: str, worker: str) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, {"worker": worker}))
+
+
+FIX_ACQUISITION = {
+    worker: _histogram(
+        "lincot_fix_acquisition_seconds", "Time to obtain a position fix.", worker
+    )
+    for worker in ("position", "sensor")
+}
+COT_BUILD = {
+    worker: _histogram(
+        "lincot_cot_build_seconds", "Time to resolve the values of a CoT event.", worker
+    )
+    for worker in ("position", "sensor")
+}
+COT_SERIALIZE = {
+    worker: _histogram(
+        "lincot_cot_serialize_seconds", "Time to serialize a CoT event.", worker
+    )
+    for worker in ("position", "sensor")
+}
+QUEUE_WAIT = {
+    worker: _histogram(
+        "lincot_queue_wait_seconds", "Time events wait in tx_queue to be sent.", worker
+    )
+    for worker in ("position", "sensor")
+}
+EVENTS_EMITTED = {
+    worker: _counter("lincot_events_emitted_total", "Events put on tx_queue.", worker)
+    for worker in ("position", "sensor")
+}
+EVENTS_FAILED = {
+    worker: _counter(
+        "lincot_events_failed_total", "Fixes that did not produce an event.", worker
+    )
+    for worker in ("position", "sensor")
+}
+DEADLINES_MISSED = {
+    worker: _counter(
+        "lincot_deadlines_missed_total",
+        "Scheduled ticks that started late because earlier work overran.",
+        worker,
+    )
+    for worker in ("position", "sensor", "spool")
+}
+EVENTS_SUPPRESSED: Counter = REGISTRY.register(
+    Counter(
+        "lincot_events_suppressed_total",
+        "Position reports suppressed by dead reckoning.",
+    )
+)
+EVENTS_SUPERSEDED: Counter = REGISTRY.register(
+    Counter(
+        "lincot_events_superseded_total",
+        "Queued events replaced by a newer event for the same uid.",
+    )
+)
+SUBPROCESS_TIMEOUTS: Counter = REGISTRY.register(
+    Counter(
+        "lincot_subprocess_timeouts_total",
+        "GPS, remarks and detail commands that timed out.",
+    )
+)
+TX_QUEUE_DEPTH: Gauge = REGISTRY.register(
+    Gauge("lincot_tx_queue_depth", "Events waiting in tx_queue.")
+)
+FIX_AGE: Gauge = REGISTRY.register(
+    Gauge("lincot_fix_age_seconds", "Age of the newest position fix.")
+)
+
+FIXES_STALE: Counter = REGISTRY.register(
+    Counter("lincot_fixes_stale_total", "Fixes rejected as older than MAX_FIX_AGE.")
+)
+FIX_SAMPLES_REJECTED: Counter = REGISTRY.register(
+    Counter(
+        "lincot_fix_samples_rejected_total",
+        "GNSS samples rejected as outliers by FIX_AGGREGATE.",
+    )
+)
+FIX_TO_ENQUEUE: Histogram = REGISTRY.register(
+    Histogram(
+        "lincot_fix_to_enqueue_seconds",
+        "Time from the GNSS fix to its event entering tx_queue.",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+FIX_TO_SEND: Histogram = REGISTRY.register(
+    Histogram(
+        "lincot_fix_to_send_seconds",
+        "Time from the GNSS fix to its event being sent.",
+        buckets=LATENCY_BUCKETS,
+    )
+)
+
+
+class FixClock:
+    """Remember when queued events were built and queued to time their sending.
+
+    Besides fix-to-send latency, this measures how long each event waited in
+    tx_queue (``lincot_queue_wait_seconds``) once the TX worker sends it. It is a
+    no-op until ``enabled`` is set (by ``MetricsWorker``), so nothing is stored
+    per event without a metrics endpoint.
+    """
+
+    def __init__(self, size: int = 256) -> None:
+        self.size = size
+        self.enabled: bool = False
+        self._pending: "OrderedDict[bytes, Tuple[Optional[float], float, str]]" = (
+            OrderedDict()
+        )
+
+    def enqueued(
+        self,
+        event: bytes,
+        taken: Optional[float],
+        worker: str = "position",
+        now: Optional[float] = None,
+    ) -> None:
+        """Record that ``event``, built from a fix taken at ``taken``, was queued.
+
+        ``taken`` is None for events without a GNSS fix time; only their queue
+        wait is measured.
+        """
+        if not self.enabled:
+            return
+        if taken is not None:
+            now = time.time() if now is None else now
+            FIX_TO_ENQUEUE.observe(max(0.0, now - taken))
+        self._pending[event] = (taken, time.monotonic(), worker)
+        if len(self._pending) > self.size:
+            # Dropped from a full queue, or never sent.
+            self._pending.popitem(last=False)
+
+    def sent(self, event: bytes, now: Optional[float] = None) -> None:
+        """Record that ``event`` left the TX worker."""
+        if not self._pending:
+            return
+        pending = self._pending.pop(event, None)
+        if pending is None:
+            return
+        taken, queued, worker = pending
+        QUEUE_WAIT[worker].observe(max(0.0, time.monotonic() - queued))
+        if taken is not None:
+            now = time.time() if now is None else now
+            FIX_TO_SEND.observe(max(0.0, now - taken))
+
+
+FIX_CLOCK = FixClock()
+
+SPOOL_RECORDED: Counter = REGISTRY.register(
+    Counter("lincot_spool_recorded_total", "Fixes spooled while the TAK link was down.")
+)
+SPOOL_DRAINED: Counter = REGISTRY.register(
+    Counter("lincot_spool_drained_total", "Spooled fixes backfilled after reconnect.")
+)
+SPOOL_DROPPED: Counter = REGISTRY.register(
+    Counter("lincot_spool_dropped_total", "Spooled fixes dropped at SPOOL_MAX_BYTES.")
+)
+SPOOL_PENDING: Gauge = REGISTRY.register(
+    Gauge("lincot_spool_pending", "Spooled fixes waiting to be backfilled.")
+)
+
+_SOURCE_FIX_AGE: Dict[str, Gauge] = {}
+_SOURCE_FAILOVERS: Dict[str, Counter] = {}
+
+
+def source_fix_age(source: str) -> Gauge:
+    """Fix age gauge of one SOURCES receiver, registered on first use."""
+    if source not in _SOURCE_FIX_AGE:
+        _SOURCE_FIX_AGE[source] = REGISTRY.register(
+            Gauge(
+                "lincot_source_fix_age_seconds",
+                "Age of the newest fix from each receiver.",
+                {"source": source},
+            )
+        )
+    return _SOURCE_FIX_AGE[source]
+
+
+def source_failovers(source: str) -> Counter:
+    """Failovers of one SOURCES receiver to its backup, registered on first use."""
+    if source not in _SOURCE_FAILOVERS:
+        _SOURCE_FAILOVERS[source] = REGISTRY.register(
+            Counter(
+                "lincot_source_failovers_total",
+                "Switches from a receiver to its backup.",
+                {"source": source},
+            )
+        )
+    return _SOURCE_FAILOVERS[source]
+
+
+_FANOUT_SENT: Dict[str, Counter] = {}
+_FANOUT_DROPPED: Dict[str, Counter] = {}
+_FANOUT_CONNECTED: Dict[str, Gauge] = {}
+
+
+def fanout_sent(destination: str) -> Counter:
+    """Events delivered to one FANOUT_URLS destination, registered on first use."""
+    if destination not in _FANOUT_SENT:
+        _FANOUT_SENT[destination] = REGISTRY.register(
+            Counter(
+                "lincot_fanout_sent_total",
+                "Events delivered to each fan-out destination.",
+                {"destination": destination},
+            )
+        )
+    return _FANOUT_SENT[destination]
+
+
+def fanout_dropped(destination: str) -> Counter:
+    """Events dropped from one destination's full queue, registered on first use."""
+    if destination not in _FANOUT_DROPPED:
+        _FANOUT_DROPPED[destination] = REGISTRY.register(
+            Counter(
+                "lincot_fanout_dropped_total",
+                "Events dropped because a fan-out destination's queue was full.",
+                {"destination": destination},
+            )
+        )
+    return _FANOUT_DROPPED[destination]
+
+
+def fanout_connected(destination: str) -> Gauge:
+    """1 while a fan-out destination is connected, registered on first use."""
+    if destination not in _FANOUT_CONNECTED:
+        _FANOUT_CONNECTED[destination] = REGISTRY.register(
+            Gauge(
+                "lincot_fanout_connected",
+                "Whether each fan-out destination is connected.",
+                {"destination": destination},
+            )
+        )
+    return _FANOUT_CONNECTED[destination]
+
+
+def parse_listen(value: str) -> Tuple[str, Optional[str], Optional[int]]:
+    """Parse METRICS_LISTEN into ``("unix", path, None)`` or ``("tcp", host, port)``.
+
+    Raises ValueError naming METRICS_LISTEN when the value is neither.
+    """
+    value = str(value).strip()
+    if value.startswith("unix:"):
+        path = value[len("unix:"):]
+        if not path:
+            raise ValueError(f"METRICS_LISTEN must name a socket path, got {value!r}")
+        return "unix", path, None
+    host, _, port = value.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    try:
+        parsed = int(port)
+    except ValueError:
+        parsed = -1
+    if not 0 <= parsed <= 65535:
+        raise ValueError(
+            f"METRICS_LISTEN must be host:port or unix:/path, got {value!r}"
+        )
+    return "tcp", host, parsed
+
+
+def get_server(listen: str):
+    """The process-wide metrics server for METRICS_LISTEN ``listen``, if serving."""
+    server = _SERVERS.get(listen)
+    return server if server is not None and server.is_serving() else None
+
+
+def set_server(listen: str, server) -> None:
+    """Keep ``server`` for the life of the process, across COT_URL reconnects."""
+    _SERVERS[listen] = server
+
+
+def close_servers() -> None:
+    """Stop every metrics server (tests and clean shutdown)."""
+    for server in _SERVERS.values():
+        server.close()
+    _SERVERS.clear()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Track the default-route interface and its IPv4 address over rtnetlink.
+
+Instead of re-reading ``/proc/net/route`` and issuing ``SIOCGIFADDR`` ioctls for
+every lookup, a ``NETLINK_ROUTE`` socket subscribed to the IPv4 address and route
+multicast groups is read from the asyncio loop. The state is seeded with one
+address and one route dump, then updated only when the kernel reports a change,
+so ``lincot.network.get_host_ip`` becomes a dictionary lookup and follows roaming
+(e.g. WiFi to LTE) as soon as the new route appears.
+"""
+
+import asyncio
+import errno
+import logging
+import socket
+import struct
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from lincot import network
+
+_LOGGER = logging.getLogger(__name__)
+
+RTMGRP_IPV4_IFADDR: int = 0x10
+RTMGRP_IPV4_ROUTE: int = 0x40
+
+NLMSG_ERROR: int = 2
+NLMSG_DONE: int = 3
+RTM_NEWROUTE: int = 24
+RTM_DELROUTE: int = 25
+RTM_GETROUTE: int = 26
+RTM_NEWADDR: int = 20
+RTM_DELADDR: int = 21
+RTM_GETADDR: int = 22
+
+NLM_F_REQUEST: int = 0x1
+NLM_F_DUMP: int = 0x300
+
+IFA_ADDRESS: int = 1
+IFA_LOCAL: int = 2
+IFA_LABEL: int = 3
+RTA_OIF: int = 4
+RTA_PRIORITY: int = 6
+RTA_TABLE: int = 15
+RT_TABLE_MAIN: int = 254
+
+NLMSGHDR = struct.Struct("=IHHII")  # len, type, flags, seq, pid
+IFADDRMSG = struct.Struct("=BBBBI")  # family, prefixlen, flags, scope, index
+RTMSG = struct.Struct("=BBBBBBBBI")  # family, dst/src len, tos, table, ..., flags
+RTATTR = struct.Struct("=HH")  # len, type
+
+RECV_SIZE: int = 65536
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def messages(data: bytes) -> Iterator[Tuple[int, bytes]]:
+    """Split a netlink datagram into ``(type, payload)`` pairs."""
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, _flags, _seq, _pid = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size or offset + length > len(data):
+            return
+        yield msg_type, data[offset + NLMSGHDR.size : offset + length]
+        offset += _align(length)
+
+
+def attributes(payload: bytes, offset: int) -> Dict[int, bytes]:
+    """Route attributes (``rtattr``) following a fixed-size message header."""
+    attrs: Dict[int, bytes] = {}
+    while offset + RTATTR.size <= len(payload):
+        length, attr_type = RTATTR.unpack_from(payload, offset)
+        if length < RTATTR.size:
+            break
+        attrs[attr_type] = payload[offset + RTATTR.size : offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def _u32(value: Optional[bytes], default: int = 0) -> int:
+    if value is None or len(value) < 4:
+        return default
+    return struct.unpack("=I", value[:4])[0]
+
+
+class NetlinkMonitor:
+    """In-memory view of IPv4 addresses and default routes, fed by rtnetlink."""
+
+    def __init__(self) -> None:
+        # ifindex -> {address: None}, in the order the kernel reported them.
+        self.addresses: Dict[int, Dict[str, None]] = {}
+        self.names: Dict[int, str] = {}
+        # (ifindex, metric) of every main-table IPv4 default route.
+        self.default_routes: Set[Tuple[int, int]] = set()
+        self.ready: bool = False
+        self.changes: int = 0
+        # Workers sharing this monitor; the last close() stops it.
+        self.users: int = 0
+        self._sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq: int = 0
+        self._host_ip: Optional[str] = None
+
+    def _name(self, index: int) -> str:
+        name = self.names.get(index)
+        if name is None:
+            try:
+                name = socket.if_indextoname(index)
+            except OSError:
+                name = ""
+            self.names[index] = name
+        return name
+
+    def _address_message(self, msg_type: int, payload: bytes) -> None:
+        if len(payload) < IFADDRMSG.size:
+            return
+        family, _prefix, _flags, _scope, index = IFADDRMSG.unpack_from(payload)
+        if family != socket.AF_INET:
+            return
+        attrs = attributes(payload, IFADDRMSG.size)
+        raw = attrs.get(IFA_LOCAL) or attrs.get(IFA_ADDRESS)
+        if raw is None or len(raw) != 4:
+            return
+        if IFA_LABEL in attrs:
+            self.names[index] = attrs[IFA_LABEL].split(b"\0", 1)[0].decode(
+                "utf-8", "replace"
+            )
+        address = socket.inet_ntoa(raw)
+        if msg_type == RTM_NEWADDR:
+            self.addresses.setdefault(index, {})[address] = None
+            return
+        self.addresses.get(index, {}).pop(address, None)
+        if not self.addresses.get(index):
+            self.addresses.pop(index, None)
+
+    def _route_message(self, msg_type: int, payload: bytes) -> None:
+        if len(payload) < RTMSG.size:
+            return
+        family, dst_len, _src, _tos, table = RTMSG.unpack_from(payload)[:5]
+        if family != socket.AF_INET or dst_len != 0:
+            return
+        attrs = attributes(payload, RTMSG.size)
+        if _u32(attrs.get(RTA_TABLE), table) != RT_TABLE_MAIN:
+            return
+        index = _u32(attrs.get(RTA_OIF))
+        if not index:
+            return
+        route = (index, _u32(attrs.get(RTA_PRIORITY)))
+        if msg_type == RTM_NEWROUTE:
+            self.default_routes.add(route)
+        else:
+            self.default_routes.discard(route)
+
+    def apply(self, data: bytes, update: bool = True) -> bool:
+        """Apply a netlink datagram; True when the dump it belongs to finished."""
+        done = False
+        for msg_type, payload in messages(data):
+            if msg_type in (RTM_NEWADDR, RTM_DELADDR):
+                self._address_message(msg_type, payload)
+            elif msg_type in (RTM_NEWROUTE, RTM_DELROUTE):
+                self._route_message(msg_type, payload)
+            elif msg_type in (NLMSG_DONE, NLMSG_ERROR):
+                done = True
+        if update:
+            self._update()
+        return done
+
+    def _interface_ip(self, index: int) -> Optional[str]:
+        for address in self.addresses.get(index, ()):
+            if not address.startswith("127."):
+                return address
+        return None
+
+    def _lookup(self) -> Optional[str]:
+        for index, _metric in sorted(self.default_routes, key=lambda r: (r[1], r[0])):
+            ip = self._interface_ip(index)
+            if ip:
+                return ip
+        by_name = {self._name(index): index for index in self.addresses}
+        for name in network.WIFI_INTERFACE_NAMES:
+            if name in by_name:
+                ip = self._interface_ip(by_name[name])
+                if ip:
+                    return ip
+        return None
+
+    def _update(self) -> None:
+        host_ip = self._lookup()
+        if host_ip != self._host_ip:
+            if self.ready:
+                self.changes += 1
+                _LOGGER.info("Host address changed: %s -> %s", self._host_ip, host_ip)
+            self._host_ip = host_ip
+
+    def host_ip(self) -> Optional[str]:
+        """The address ``get_host_ip`` would pick, from the in-memory state."""
+        return self._host_ip
+
+    def _dump(self, request: int) -> None:
+        """Seed the state with a blocking RTM_GETADDR / RTM_GETROUTE dump."""
+        self._seq += 1
+        if request == RTM_GETADDR:
+            body = IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)
+        else:
+            body = RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)
+        header = NLMSGHDR.pack(
+            NLMSGHDR.size + len(body), request, NLM_F_REQUEST | NLM_F_DUMP, self._seq, 0
+        )
+        with socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE
+        ) as sock:
+            sock.settimeout(2.0)
+            sock.send(header + body)
+            while not self.apply(sock.recv(RECV_SIZE), update=False):
+                pass
+
+    def resync(self) -> None:
+        """Rebuild the whole state from fresh dumps."""
+        self.addresses.clear()
+        self.default_routes.clear()
+        self._dump(RTM_GETADDR)
+        self._dump(RTM_GETROUTE)
+        self._update()
+
+    def _on_readable(self) -> None:
+        while self._sock is not None:
+            try:
+                data = self._sock.recv(RECV_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as exc:
+                if exc.errno != errno.ENOBUFS:
+                    _LOGGER.warning("Netlink monitor stopped: %s", exc)
+                    self.close()
+                    return
+                # The kernel dropped notifications; start over from a dump.
+                _LOGGER.debug("Netlink receive buffer overrun, resyncing")
+                try:
+                    self.resync()
+                except OSError:
+                    pass
+                continue
+            self.apply(data)
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """Subscribe, seed from dumps and register the socket with ``loop``."""
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        try:
+            sock.bind((0, RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE))
+            sock.setblocking(False)
+            # Subscribe before dumping so no change between the two is lost.
+            self.resync()
+            self._loop = loop or asyncio.get_running_loop()
+            self._loop.add_reader(sock.fileno(), self._on_readable)
+        except BaseException:
+            sock.close()
+            raise
+        self._sock = sock
+        self.ready = True
+        self.users = 1
+        network.set_monitor(self)
+
+    def close(self) -> None:
+        """Release this user; the last one stops listening and lookups probe again."""
+        if self.users > 1:
+            self.users -= 1
+            return
+        self.users = 0
+        self.ready = False
+        network.clear_monitor(self)
+        sock, self._sock = self._sock, None
+        if sock is None:
+            return
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.remove_reader(sock.fileno())
+        sock.close()
+
+
+def start_monitor() -> Optional[NetlinkMonitor]:
+    """Start (or share) a monitor on the running loop; None without rtnetlink.
+
+    Every caller must close() the monitor it got back.
+    """
+    running = network.current_monitor()
+    if isinstance(running, NetlinkMonitor) and running.ready:
+        running.users += 1
+        return running
+    if not hasattr(socket, "AF_NETLINK"):
+        return None
+    monitor = NetlinkMonitor()
+    try:
+        monitor.start()
+    except OSError as exc:
+        _LOGGER.info("rtnetlink unavailable (%s); probing routes per lookup", exc)
+        return None
+    return monitor
@@ -22,10 +22,18 @@ import struct
 import sys
 from typing import Optional, Sequence
 
+import lincot
+from lincot.cache import TTLCache
+
 WIFI_INTERFACE_NAMES: Sequence[str] = ("wifi0", "wlan0")
 
 _LOCALHOST_NAMES = frozenset({"localhost", "127.0.0.1", "::1"})
 
+_CACHE = TTLCache(lincot.DEFAULT_HOST_INFO_TTL)
+
+# A running lincot.netlink.NetlinkMonitor, when rtnetlink is available.
+_MONITOR = None
+
 
 def _default_route_interface() -> Optional[str]:
     """Return the interface name for the lowest-metric default IPv4 route."""
@@ -91,8 +99,7 @@ def _interface_ipv4(name: str) -> Optional[str]:
     return ip
 
 
-def get_host_ip() -> Optional[str]:
-    """Prefer the default-route interface IP, then WiFi interface IPs."""
+def _lookup_host_ip() -> Optional[str]:
     iface = _default_route_interface()
     if iface:
         ip = _interface_ipv4(iface)
@@ -107,6 +114,46 @@ def get_host_ip() -> Optional[str]:
     return _outbound_ipv4()
 
 
+def get_host_ip() -> Optional[str]:
+    """Prefer the default-route interface IP, then WiFi interface IPs.
+
+    While a netlink monitor runs, this reads its in-memory state. Otherwise, or
+    when the monitor knows no address (e.g. only the outbound-socket fallback
+    would find one), the result is probed and cached for DEFAULT_HOST_INFO_TTL
+    seconds, or until invalidate_host_ip() / lincot.cache.clear_all() is called.
+    """
+    monitor = _MONITOR
+    if monitor is not None and monitor.ready:
+        ip = monitor.host_ip()
+        if ip:
+            return ip
+    return _CACHE.get("host_ip", _lookup_host_ip)
+
+
+def current_monitor():
+    """The monitor answering get_host_ip(), if any."""
+    return _MONITOR
+
+
+def set_monitor(monitor) -> None:
+    """Answer get_host_ip() from ``monitor`` while it is ready."""
+    global _MONITOR  # pylint: disable=global-statement
+    _MONITOR = monitor
+
+
+def clear_monitor(monitor) -> None:
+    """Go back to probing, if ``monitor`` is the one in use."""
+    global _MONITOR  # pylint: disable=global-statement
+    if _MONITOR is monitor:
+        _MONITOR = None
+    invalidate_host_ip()
+
+
+def invalidate_host_ip() -> None:
+    """Force the next get_host_ip() call to re-probe routes and interfaces."""
+    _CACHE.invalidate("host_ip")
+
+
 def is_localhost_host(host: Optional[str]) -> bool:
     """Return True when host refers to this machine via loopback."""
     if not host:
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Direct NMEA 0183 serial position source for LINCOT (no gpsd).
+
+``NmeaParser`` incrementally parses RMC, GGA, GSA, GST and VTG sentences, with
+any talker ID, into the same TPV-shaped dict gpsd produces. ``NmeaReader``
+feeds it from a tty opened non-blocking and watched with ``loop.add_reader``.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from configparser import SectionProxy
+from typing import Callable, Dict, Optional, Union
+
+import lincot
+
+try:
+    import termios
+except ImportError:  # pragma: no cover - not on this platform
+    termios = None
+
+KNOTS_TO_MPS: float = 0.514444
+KPH_TO_MPS: float = 1 / 3.6
+MAX_SENTENCE: int = 256  # NMEA allows 82; leave room for proprietary extensions.
+READ_SIZE: int = 4096
+
+_LOGGER = logging.getLogger(__name__)
+
+_BAUD_RATES: Dict[int, str] = {
+    4800: "B4800",
+    9600: "B9600",
+    19200: "B19200",
+    38400: "B38400",
+    57600: "B57600",
+    115200: "B115200",
+    230400: "B230400",
+    460800: "B460800",
+    921600: "B921600",
+}
+
+
+def checksum_ok(sentence, start: int = 0, end: Optional[int] = None) -> bool:
+    """Verify ``$...*hh`` in ``sentence[start:end]``; no checksum is rejected."""
+    end = len(sentence) if end is None else end
+    star = sentence.rfind(b"*", start, end)
+    if sentence[start: start + 1] != b"$" or star < 0 or end < star + 3:
+        return False
+    try:
+        expected = int(sentence[star + 1: star + 3], 16)
+    except ValueError:
+        return False
+    calculated = 0
+    view = memoryview(sentence)
+    try:
+        for byte in view[start + 1: star]:
+            calculated ^= byte
+    finally:
+        # A live export would stop the parser's bytearray from being resized.
+        view.release()
+    return calculated == expected
+
+
+def _float(field: bytes) -> Optional[float]:
+    try:
+        return float(field) if field else None
+    except ValueError:
+        return None
+
+
+def _coordinate(value: bytes, hemisphere: bytes) -> Optional[float]:
+    """Convert NMEA ``(d)ddmm.mmmm`` plus N/S/E/W to signed decimal degrees."""
+    raw = _float(value)
+    if raw is None:
+        return None
+    degrees = int(raw // 100)
+    result = degrees + (raw - degrees * 100) / 60
+    return -result if hemisphere in (b"S", b"W") else result
+
+
+class NmeaParser:
+    """Incremental, checksum-verified NMEA parser producing TPV dicts.
+
+    Bytes are accumulated in one reusable ``bytearray``; sentences are framed,
+    checksummed and identified where they lie in it, and only the fields of a
+    sentence that is applied are copied out. The fix state is one dict updated
+    in place, copied only when a caller asks for ``tpv()``.
+    """
+
+    def __init__(self, device: str = "") -> None:
+        self.buffer = bytearray()
+        self.fix: dict = {"class": "TPV", "device": device, "mode": 0}
+        self.sentences: int = 0
+        self.errors: int = 0
+        self.updated: bool = False
+        self._date: Optional[str] = None
+        self._snapshot: Optional[dict] = None
+        self._handlers = {
+            b"RMC": self._rmc,
+            b"GGA": self._gga,
+            b"GSA": self._gsa,
+            b"GST": self._gst,
+            b"VTG": self._vtg,
+        }
+
+    def feed(self, data: bytes) -> int:
+        """Consume raw bytes; return how many RMC/GGA positions were applied."""
+        buffer = self.buffer
+        buffer += data
+        applied = 0
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            if self._apply(buffer, start, end):
+                applied += 1
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > MAX_SENTENCE:
+            # No newline in sight: line noise or the wrong baud rate.
+            self.errors += 1
+            buffer.clear()
+        return applied
+
+    def handle_sentence(self, sentence: bytes) -> bool:
+        """Apply one sentence (without line ending); True if it set a position."""
+        return self._apply(sentence, 0, len(sentence))
+
+    def _apply(self, data, start: int, end: int) -> bool:
+        if end > start and data[end - 1] == 0x0D:  # CR
+            end -= 1
+        dollar = data.find(b"$", start, end)
+        if dollar < 0:
+            return False
+        if not checksum_ok(data, dollar, end):
+            self.errors += 1
+            return False
+        star = data.rfind(b"*", dollar, end)
+        comma = data.find(b",", dollar, star)
+        address = comma if comma >= 0 else star
+        kind = bytes(data[max(dollar + 1, address - 3): address])
+        handler = self._handlers.get(kind)
+        if handler is None:
+            return False
+        fields = data[dollar + 1: star].split(b",")
+        self.sentences += 1
+        # Only RMC and GGA carry a position; GSA, GST and VTG refine the
+        # same epoch and must not count as a new fix.
+        moved = bool(handler(fields))
+        self.updated = True
+        self._snapshot = None
+        return moved
+
+    def tpv(self) -> Optional[dict]:
+        """Current fix as a new TPV dict, or None before any position arrived."""
+        if "lat" not in self.fix:
+            return None
+        if self._snapshot is None:
+            self._snapshot = dict(self.fix)
+        return self._snapshot
+
+    def _set(self, key: str, value) -> None:
+        if value is None:
+            self.fix.pop(key, None)
+        else:
+            self.fix[key] = value
+
+    def _no_fix(self) -> None:
+        self.fix["mode"] = 1
+        for key in ("lat", "lon", "altHAE", "altMSL", "speed", "track"):
+            self.fix.pop(key, None)
+
+    def _time(self, hhmmss: bytes) -> None:
+        if self._date is None or len(hhmmss) < 6:
+            return
+        clock = hhmmss.decode("ascii", "replace")
+        fraction = clock[7:10] if len(clock) > 7 else ""
+        self.fix["time"] = (
+            f"{self._date}T{clock[0:2]}:{clock[2:4]}:{clock[4:6]}."
+            f"{fraction.ljust(3, '0')}Z"
+        )
+
+    def _position(self, lat: bytes, ns: bytes, lon: bytes, ew: bytes) -> bool:
+        latitude = _coordinate(lat, ns)
+        longitude = _coordinate(lon, ew)
+        if latitude is None or longitude is None:
+            return False
+        self.fix["lat"] = latitude
+        self.fix["lon"] = longitude
+        return True
+
+    def _rmc(self, fields) -> bool:
+        # $xxRMC,time,status,lat,N,lon,E,speed(kn),track,date,magvar,E[,mode]
+        if len(fields) < 10:
+            return False
+        date = fields[9]
+        if len(date) == 6 and date.isdigit():
+            text = date.decode("ascii")
+            century = "19" if int(text[4:6]) >= 80 else "20"
+            self._date = f"{century}{text[4:6]}-{text[2:4]}-{text[0:2]}"
+        if fields[2] != b"A":
+            self._no_fix()
+            return False
+        self.fix["mode"] = max(self.fix.get("mode", 0), 2)
+        self._time(fields[1])
+        moved = self._position(fields[3], fields[4], fields[5], fields[6])
+        speed = _float(fields[7])
+        self._set("speed", None if speed is None else speed * KNOTS_TO_MPS)
+        self._set("track", _float(fields[8]))
+        return moved
+
+    def _gga(self, fields) -> bool:
+        # $xxGGA,time,lat,N,lon,E,quality,sats,hdop,alt,M,sep,M,...
+        if len(fields) < 12:
+            return False
+        if fields[6] in (b"", b"0"):
+            self._no_fix()
+            return False
+        self._time(fields[1])
+        moved = self._position(fields[2], fields[3], fields[4], fields[5])
+        altitude = _float(fields[9])
+        separation = _float(fields[11])
+        self._set("altMSL", altitude)
+        self._set("geoidSep", separation)
+        self._set(
+            "altHAE",
+            None if altitude is None else altitude + (separation or 0.0),
+        )
+        if self.fix.get("mode", 0) < 2:
+            self.fix["mode"] = 3 if altitude is not None else 2
+        return moved
+
+    def _gsa(self, fields) -> None:
+        # $xxGSA,auto,mode(1-3),prn x12,pdop,hdop,vdop
+        if len(fields) < 3 or fields[2] not in (b"1", b"2", b"3"):
+            return
+        if fields[2] == b"1":
+            self._no_fix()
+        else:
+            self.fix["mode"] = int(fields[2])
+
+    def _gst(self, fields) -> None:
+        # $xxGST,time,rms,major,minor,orient,lat err,lon err,alt err (1-sigma, m)
+        if len(fields) < 9:
+            return
+        self._set("epy", _float(fields[6]))
+        self._set("epx", _float(fields[7]))
+        self._set("epv", _float(fields[8]))
+
+    def _vtg(self, fields) -> None:
+        # $xxVTG,track T,T,track M,M,speed kn,N,speed kph,K[,mode]
+        if len(fields) < 9:
+            return
+        track = _float(fields[1])
+        if track is not None:
+            self.fix["track"] = track
+        speed = _float(fields[7])
+        if speed is not None:
+            self.fix["speed"] = speed * KPH_TO_MPS
+        elif _float(fields[5]) is not None:
+            self.fix["speed"] = _float(fields[5]) * KNOTS_TO_MPS
+
+
+def configure_tty(fd: int, baud: int) -> None:
+    """Put a tty in raw mode at ``baud``; a no-op for non-tty files."""
+    if termios is None or not os.isatty(fd):
+        return
+    attrs = termios.tcgetattr(fd)
+    iflag, oflag, cflag, lflag = attrs[0:4]
+    iflag &= ~(
+        termios.IGNBRK | termios.BRKINT | termios.ICRNL | termios.INLCR | termios.IXON
+    )
+    oflag &= ~termios.OPOST
+    lflag &= ~(termios.ECHO | termios.ICANON | termios.ISIG | termios.IEXTEN)
+    cflag |= termios.CREAD | termios.CLOCAL
+    attrs[0:4] = [iflag, oflag, cflag, lflag]
+    speed = getattr(termios, _BAUD_RATES.get(baud, ""), None)
+    if speed is not None:
+        attrs[4] = attrs[5] = speed
+    termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+
+class NmeaReader:
+    """Read NMEA from a serial device and keep the newest TPV in memory.
+
+    Mirrors ``GpsdClient``: ``run()`` reopens the device with backoff when it
+    disappears, readers only ever look at ``latest()``, and the fix expires
+    ``max_age`` seconds after the last position sentence.
+    """
+
+    def __init__(
+        self,
+        device: str,
+        baud: int = lincot.DEFAULT_NMEA_BAUD,
+        backoff_initial: float = lincot.DEFAULT_GPSD_BACKOFF_INITIAL,
+        backoff_max: float = lincot.DEFAULT_GPSD_BACKOFF_MAX,
+        logger: Optional[logging.Logger] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.device = device
+        self.baud = baud
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_age = max_age
+        self.parser = NmeaParser(device)
+        self.tpv_received: Optional[float] = None
+        # Called with every updated TPV, e.g. to collect FIX_AGGREGATE samples.
+        self.on_tpv: Optional[Callable[[dict], None]] = None
+        self._logger = logger or _LOGGER
+        self._chunk = bytearray(READ_SIZE)
+        self._view = memoryview(self._chunk)
+        self._updated: Optional[asyncio.Event] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Union[dict, SectionProxy, None],
+        logger: Optional[logging.Logger] = None,
+    ) -> "NmeaReader":
+        """Build a reader from NMEA_DEVICE / NMEA_BAUD settings.
+
+        As with gpsd, the fix expires after two POLL_INTERVALs of silence.
+        """
+        config = config or {}
+        poll = float(config.get("POLL_INTERVAL") or lincot.DEFAULT_POLL_INTERVAL)
+        return cls(
+            device=str(config.get("NMEA_DEVICE") or "").strip(),
+            baud=int(config.get("NMEA_BAUD") or lincot.DEFAULT_NMEA_BAUD),
+            logger=logger,
+            max_age=2 * poll,
+        )
+
+    @property
+    def address(self) -> str:
+        """Device path for logging."""
+        return self.device
+
+    def _event(self) -> asyncio.Event:
+        if self._updated is None:
+            self._updated = asyncio.Event()
+        return self._updated
+
+    def latest(self) -> Optional[dict]:
+        """Return the newest TPV assembled from NMEA, or None once it is stale."""
+        if self.max_age is not None:
+            age = self.fix_age()
+            if age is None or age > self.max_age:
+                return None
+        return self.parser.tpv()
+
+    def fix_age(self) -> Optional[float]:
+        """Seconds since the last position sentence was parsed."""
+        if self.tpv_received is None:
+            return None
+        return time.monotonic() - self.tpv_received
+
+    async def wait(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Wait until a position has been parsed, then return it."""
+        if self.latest() is None:
+            try:
+                await asyncio.wait_for(self._event().wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.latest()
+
+    def _on_readable(self, fd: int, done: asyncio.Future) -> None:
+        try:
+            count = os.readv(fd, [self._chunk])
+        except BlockingIOError:
+            return
+        except OSError as exc:
+            if not done.done():
+                done.set_exception(exc)
+            return
+        if count == 0:
+            if not done.done():
+                done.set_result(None)
+            return
+        if self.parser.feed(self._view[:count]) and self.parser.tpv() is not None:
+            self.tpv_received = time.monotonic()
+            self._event().set()
+            if self.on_tpv is not None:
+                self.on_tpv(self.parser.tpv())
+
+    async def _read(self) -> None:
+        """Read until EOF or an I/O error on the device."""
+        fd = os.open(self.device, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        try:
+            configure_tty(fd, self.baud)
+            loop.add_reader(fd, self._on_readable, fd, done)
+            self._logger.info("Reading NMEA from %s", self.device)
+            await done
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+    async def run(self) -> None:
+        """Read the device forever, reopening it with backoff."""
+        delay = self.backoff_initial
+        while True:
+            received = self.parser.sentences
+            try:
+                await self._read()
+                self._logger.warning("NMEA device %s closed", self.device)
+            except OSError as exc:
+                self._logger.warning("NMEA device %s error: %s", self.device, exc)
+            if self.parser.sentences > received:
+                delay = self.backoff_initial
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.backoff_max)
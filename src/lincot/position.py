@@ -16,12 +16,27 @@
 
 """Position source helpers for LINCOT."""
 
+import asyncio
+import datetime
+import json
+import os
+import signal
+import time
 from configparser import SectionProxy
-from typing import Optional, Union
+from typing import List, Optional, Union
+
+import pytak
+
+import lincot
+from lincot.settings import Settings, as_settings
+
+_TPV_TIME_FORMATS = ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ")
 
 
 def static_position_configured(config: Union[dict, SectionProxy, None]) -> bool:
     """Return True when STATIC_LAT and STATIC_LON are both set."""
+    if isinstance(config, Settings):
+        return config.static is not None
     config = config or {}
     lat = config.get("STATIC_LAT")
     lon = config.get("STATIC_LON")
@@ -33,16 +48,138 @@ def static_position_configured(config: Union[dict, SectionProxy, None]) -> bool:
     )
 
 
+def nmea_configured(config: Union[dict, SectionProxy, None]) -> bool:
+    """Return True when NMEA_DEVICE is set (and no static position is)."""
+    config = config or {}
+    if static_position_configured(config):
+        return False
+    return bool(str(config.get("NMEA_DEVICE") or "").strip())
+
+
+def gpsd_stream_configured(config: Union[dict, SectionProxy, None]) -> bool:
+    """Return True when position should be streamed from gpsd directly.
+
+    This is the default: no static position and no custom GPS_INFO_CMD (the
+    stock gpspipe command is replaced by the persistent gpsd client).
+    """
+    if static_position_configured(config) or nmea_configured(config):
+        return False
+    config = config or {}
+    command = str(config.get("GPS_INFO_CMD") or "").strip()
+    return command in ("", lincot.DEFAULT_GPS_INFO_CMD)
+
+
+def is_valid_fix(report: dict) -> bool:
+    """Return True for a TPV with at least a 2D fix and a latitude/longitude."""
+    try:
+        mode = int(report.get("mode") or 0)
+    except (TypeError, ValueError):
+        return False
+    return mode >= 2 and report.get("lat") is not None and report.get("lon") is not None
+
+
+def fix_time(report: dict) -> Optional[float]:
+    """Return the TPV ``time`` as a POSIX timestamp, or None if absent/invalid."""
+    value = report.get("time")
+    if not isinstance(value, str):
+        return None
+    for fmt in _TPV_TIME_FORMATS:
+        try:
+            parsed = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return parsed.replace(tzinfo=datetime.timezone.utc).timestamp()
+    return None
+
+
+def fix_age(report: dict, now: Optional[float] = None) -> Optional[float]:
+    """Seconds between the TPV ``time`` and ``now`` (wall clock), if known."""
+    taken = fix_time(report)
+    if taken is None:
+        return None
+    return (time.time() if now is None else now) - taken
+
+
+def cot_time_at(timestamp: float, offset: int = 0) -> str:
+    """Format ``timestamp`` + ``offset`` seconds like ``pytak.cot_time``."""
+    moment = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    if offset:
+        moment += datetime.timedelta(seconds=int(offset))
+    return moment.strftime(pytak.W3C_XML_DATETIME)
+
+
+def _kill_process_group(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def tpvs_from_command(
+    command: str, timeout: float, fixes: int = 1
+) -> List[dict]:
+    """Run GPS_INFO_CMD asynchronously and return the TPV dicts it printed.
+
+    Stdout is parsed line by line; the command (and anything it spawned) is
+    killed as soon as ``fixes`` TPVs with a 2D/3D fix have arrived, or returns
+    what it printed when it exits first. Raises asyncio.TimeoutError when no
+    valid fix arrives within ``timeout`` seconds; after a valid fix, a timeout
+    just ends the burst.
+    """
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tpvs: List[dict] = []
+    valid = 0
+    try:
+        while True:
+            try:
+                line = await asyncio.wait_for(
+                    proc.stdout.readline(), max(deadline - loop.time(), 0)
+                )
+            except asyncio.TimeoutError:
+                if valid:
+                    return tpvs
+                raise
+            if not line:
+                return tpvs
+            if b"TPV" not in line:
+                continue
+            try:
+                report = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(report, dict) or report.get("class") != "TPV":
+                continue
+            tpvs.append(report)
+            if is_valid_fix(report):
+                valid += 1
+                if valid >= fixes:
+                    return tpvs
+    finally:
+        _kill_process_group(proc)
+        await proc.wait()
+
+
+async def gps_info_from_command(command: str, timeout: float) -> Optional[dict]:
+    """Run GPS_INFO_CMD asynchronously and return a TPV dict from its output.
+
+    The command is killed as soon as the first TPV with a 2D/3D fix arrives. If
+    the command exits first, the last TPV seen is returned. Raises
+    asyncio.TimeoutError when no valid fix arrives within ``timeout`` seconds.
+    """
+    tpvs = await tpvs_from_command(command, timeout)
+    return tpvs[-1] if tpvs else None
+
+
 def static_tpv(config: Union[dict, SectionProxy, None]) -> Optional[dict]:
     """Build a gpspipe-compatible TPV dict from static coordinates."""
-    if not static_position_configured(config):
-        return None
-    config = config or {}
-    return {
-        "class": "TPV",
-        "lat": float(config.get("STATIC_LAT")),
-        "lon": float(config.get("STATIC_LON")),
-        "altHAE": config.get("STATIC_HAE") or "9999999.0",
-        "track": config.get("STATIC_COURSE") or "0.0",
-        "speed": config.get("STATIC_SPEED") or "0.0",
-    }
+    static = as_settings(config).static
+    return dict(static) if static is not None else None
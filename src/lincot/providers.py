@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""In-process detail provider plugins.
+
+A provider is registered under the ``lincot.detail_providers`` entry-point group
+and is a callable taking the LINCOT config. It returns an XML ``Element`` (added
+to ``<detail>``), a ``str`` (added as a remarks line), an iterable of those, or
+None. Async callables are awaited; plain callables run in a worker thread.
+
+Providers are refreshed in the background every ``ttl`` seconds with their own
+``timeout``; events only ever read the cached results::
+
+    @lincot.detail_provider(ttl=30, timeout=2)
+    async def battery(config):
+        return f"Battery: {await read_battery()}%"
+"""
+
+import asyncio
+import logging
+import time
+from configparser import SectionProxy
+from typing import Any, Callable, List, Optional, Tuple, Union
+from xml.etree.ElementTree import Element
+
+import lincot
+
+ENTRY_POINT_GROUP: str = "lincot.detail_providers"
+
+_LOGGER = logging.getLogger(__name__)
+_ACTIVE: List["DetailProvider"] = []
+
+
+def detail_provider(
+    ttl: float = lincot.DEFAULT_DETAIL_PROVIDER_TTL,
+    timeout: float = lincot.DEFAULT_DETAIL_PROVIDER_TIMEOUT,
+) -> Callable:
+    """Decorator declaring a provider's refresh TTL and timeout (seconds)."""
+
+    def wrap(func: Callable) -> Callable:
+        func.ttl = ttl
+        func.timeout = timeout
+        return func
+
+    return wrap
+
+
+def _split_result(result: Any) -> Tuple[Tuple[Element, ...], Tuple[str, ...]]:
+    if result is None:
+        return (), ()
+    if isinstance(result, (Element, str)):
+        result = [result]
+    elements = tuple(item for item in result if isinstance(item, Element))
+    remarks = tuple(item.strip() for item in result if isinstance(item, str))
+    return elements, tuple(line for line in remarks if line)
+
+
+class DetailProvider:
+    """One provider with its cached output and refresh policy."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        ttl: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.name = name
+        self.func = func
+        self.ttl = float(
+            ttl if ttl is not None
+            else getattr(func, "ttl", lincot.DEFAULT_DETAIL_PROVIDER_TTL)
+        )
+        self.timeout = float(
+            timeout if timeout is not None
+            else getattr(func, "timeout", lincot.DEFAULT_DETAIL_PROVIDER_TIMEOUT)
+        )
+        self.elements: Tuple[Element, ...] = ()
+        self.remarks: Tuple[str, ...] = ()
+        self.refreshed: Optional[float] = None
+        self.failures: int = 0
+
+    async def _call(self, config: Union[dict, SectionProxy, None]) -> Any:
+        if asyncio.iscoroutinefunction(self.func):
+            return await self.func(config)
+        result = await asyncio.to_thread(self.func, config)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    async def refresh(self, config: Union[dict, SectionProxy, None]) -> None:
+        """Call the provider once; keep the previous output if it fails."""
+        try:
+            result = await asyncio.wait_for(self._call(config), self.timeout)
+            self.elements, self.remarks = _split_result(result)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            _LOGGER.warning(
+                "Detail provider %s timed out after %ss", self.name, self.timeout
+            )
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            self.failures += 1
+            _LOGGER.warning("Detail provider %s failed: %s", self.name, exc)
+        self.refreshed = time.monotonic()
+
+    async def run(self, config: Union[dict, SectionProxy, None]) -> None:
+        """Refresh forever, every ``ttl`` seconds."""
+        while True:
+            await self.refresh(config)
+            await asyncio.sleep(self.ttl)
+
+
+def _entry_points() -> list:
+    # Scanning installed distributions is slow on SD cards; only pay for it here.
+    from importlib import metadata  # pylint: disable=import-outside-toplevel
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return list(entry_points.select(group=ENTRY_POINT_GROUP))
+    return list(entry_points.get(ENTRY_POINT_GROUP, []))  # Python 3.9
+
+
+def load_providers(config: Union[dict, SectionProxy, None]) -> List[DetailProvider]:
+    """Load installed providers, optionally filtered by DETAIL_PROVIDERS.
+
+    DETAIL_PROVIDERS is a comma-separated list of entry-point names; unset loads
+    every installed provider and ``none`` disables them all.
+    """
+    config = config or {}
+    wanted = str(config.get("DETAIL_PROVIDERS") or "").strip()
+    if wanted.lower() == "none":
+        return []
+    names = {name.strip() for name in wanted.split(",") if name.strip()}
+
+    providers = []
+    for entry_point in _entry_points():
+        if names and entry_point.name not in names:
+            continue
+        try:
+            func = entry_point.load()
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            _LOGGER.warning("Cannot load detail provider %s: %s", entry_point.name, exc)
+            continue
+        providers.append(DetailProvider(entry_point.name, func))
+    return providers
+
+
+def set_active(providers: List[DetailProvider]) -> None:
+    """Make ``providers`` the ones whose cached output is added to events."""
+    _ACTIVE[:] = providers
+
+
+def cached_elements() -> List[Element]:
+    """Detail children from every active provider's last refresh."""
+    return [element for provider in _ACTIVE for element in provider.elements]
+
+
+def cached_remarks() -> List[str]:
+    """Remarks lines from every active provider's last refresh."""
+    return [line for provider in _ACTIVE for line in provider.remarks]
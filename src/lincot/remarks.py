@@ -17,19 +17,19 @@
 """Build CoT remarks and related URLs for edge nodes."""
 
 from configparser import SectionProxy
-import shlex
-import subprocess
-from typing import Union
-from urllib.parse import urlparse
-
-import pytak
+from typing import Optional, Union
 
 import lincot
+from lincot.coprocess import command_output
 from lincot.identity import get_hostname, get_machine_id
-from lincot.network import get_host_ip, is_localhost_host
+from lincot.network import get_host_ip
+from lincot.providers import cached_remarks
+from lincot.settings import Settings, as_settings
+
+DEFAULT_COCKPIT_PATTERN: str = f"http://{{}}:{lincot.DEFAULT_COCKPIT_PORT}/"
 
 
-def _cockpit_host(_config: Union[dict, SectionProxy, None]) -> str:
+def _cockpit_host(_settings: Settings) -> str:
     """Host for Cockpit URL; never localhost when an interface IP is available."""
     ip = get_host_ip()
     if ip:
@@ -42,63 +42,46 @@ def _cockpit_host(_config: Union[dict, SectionProxy, None]) -> str:
 
 def get_cockpit_url(config: Union[dict, SectionProxy, None]) -> str:
     """Cockpit web UI URL for this host."""
-    config = config or {}
-    override = config.get("COCKPIT_URL")
-    if override is not None and str(override).strip():
-        parsed = urlparse(str(override).strip())
-        if is_localhost_host(parsed.hostname):
-            host = _cockpit_host(config)
-            port = parsed.port or lincot.DEFAULT_COCKPIT_PORT
-            scheme = parsed.scheme or "http"
-            return f"{scheme}://{host}:{port}/"
-        return str(override).strip().rstrip("/") + "/"
-    host = _cockpit_host(config)
-    return f"http://{host}:{lincot.DEFAULT_COCKPIT_PORT}/"
+    settings = as_settings(config)
+    if settings.cockpit_url:
+        return settings.cockpit_url
+    pattern = settings.cockpit_pattern or DEFAULT_COCKPIT_PATTERN
+    return pattern.format(_cockpit_host(settings))
+
 
+def warm_host_info(config: Union[dict, SectionProxy, None]) -> None:
+    """Probe hostname, machine-id and host IP ahead of the first event."""
+    get_machine_id()
+    get_cockpit_url(config)
 
-def _extra_from_command(config: Union[dict, SectionProxy, None]) -> str:
+
+def _extra_from_command(settings: Settings) -> str:
     """Run an optional remarks command and return stdout for remarks."""
-    config = config or {}
-    command = str(config.get("REMARKS_EXTRA_CMD") or "").strip()
-    if not command:
-        return ""
-    try:
-        timeout = float(
-            config.get("REMARKS_EXTRA_CMD_TIMEOUT")
-            or lincot.DEFAULT_REMARKS_EXTRA_CMD_TIMEOUT
-        )
-    except (TypeError, ValueError):
-        timeout = lincot.DEFAULT_REMARKS_EXTRA_CMD_TIMEOUT
-    try:
-        run = subprocess.run(
-            shlex.split(command),
-            check=False,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-    except (OSError, ValueError, subprocess.TimeoutExpired):
-        return ""
-    if run.returncode != 0:
+    if not settings.remarks_cmd:
         return ""
-    return (run.stdout or "").strip()
+    return command_output(
+        settings.remarks_cmd,
+        settings.remarks_cmd_timeout,
+        settings.remarks_cmd_persistent,
+    )
 
 
 def build_remarks(
     config: Union[dict, SectionProxy, None],
     *,
     position_source: str,
+    cockpit_url: Optional[str] = None,
 ) -> str:
     """Multi-line remarks with host, connect, and TAK info."""
-    config = config or {}
+    settings = as_settings(config)
     hostname = get_hostname()
     machine_id = get_machine_id()
-    ssh_user = str(config.get("SSH_USER") or lincot.DEFAULT_SSH_USER).strip()
-    cockpit_url = get_cockpit_url(config)
-    cot_url = pytak.sanitize_url_credentials(str(config.get("COT_URL") or ""))
-    cot_host_id = str(config.get("COT_HOST_ID") or f"lincot@{hostname}")
-    extra = str(config.get("REMARKS_EXTRA") or "").strip()
-    command_extra = _extra_from_command(config)
+    ssh_user = settings.ssh_user
+    cockpit_url = cockpit_url or get_cockpit_url(settings)
+    cot_url = settings.cot_url_sanitized
+    cot_host_id = settings.cot_host_id or f"lincot@{hostname}"
+    extra = settings.remarks_extra
+    command_extra = _extra_from_command(settings)
 
     lines = [
         f"Host: {hostname}",
@@ -116,5 +99,6 @@ def build_remarks(
         lines.append(extra)
     if command_extra:
         lines.append(command_extra)
+    lines.extend(cached_remarks())
     lines.append(f"(via lincot@{hostname})")
     return "\n".join(lines)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Replay recorded gpspipe/gpsd JSON logs as CoT (``lincot replay``).
+
+Logs (plain or gzip'd, or ``-`` for stdin) are read line by line, converted with
+``position_to_cot`` in ordered batches across a process pool, and written to a
+file or sent to COT_URL at the recorded pace, a multiple of it, or as fast as
+possible.
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from configparser import ConfigParser, SectionProxy
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+import pytak
+
+import lincot
+from lincot.position import fix_time
+from lincot.settings import Settings, as_settings
+
+_LOGGER = logging.getLogger(__name__)
+
+GZIP_MAGIC: bytes = b"\x1f\x8b"
+DEFAULT_BATCH_SIZE: int = 256
+
+Converted = List[Tuple[Optional[float], bytes]]
+
+
+def open_log(path: str) -> BinaryIO:
+    """Open a plain or gzip'd log for binary line reading (``-`` is stdin)."""
+    if path == "-":
+        stream = sys.stdin.buffer
+        if stream.peek(2)[:2] == GZIP_MAGIC:
+            return gzip.GzipFile(fileobj=stream)
+        return stream
+    with open(path, "rb") as probe:
+        magic = probe.read(2)
+    if magic == GZIP_MAGIC:
+        return gzip.open(path, "rb")
+    return open(path, "rb")  # pylint: disable=consider-using-with
+
+
+def convert_lines(lines: List[bytes], config: dict) -> Converted:
+    """Convert a batch of JSON lines to ``(fix time, CoT event)`` pairs."""
+    settings = as_settings(config)
+    converted = []
+    for line in lines:
+        try:
+            report = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(report, dict) or report.get("class") != "TPV":
+            continue
+        event = lincot.position_to_cot(report, settings)
+        if event:
+            converted.append((fix_time(report), event))
+    return converted
+
+
+def _chunks(lines: Iterable[bytes], size: int) -> Iterator[List[bytes]]:
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_batches(
+    lines: Iterable[bytes],
+    config: dict,
+    jobs: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Converted]:
+    """Convert ``lines`` in batches, in input order, with at most 2 x jobs in flight."""
+    if jobs <= 1:
+        for chunk in _chunks(lines, batch_size):
+            yield convert_lines(chunk, config)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending: deque = deque()
+        for chunk in _chunks(lines, batch_size):
+            pending.append(pool.submit(convert_lines, chunk, config))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class Pacer:
+    """Reproduce the recorded spacing between fixes, scaled by ``speed``.
+
+    A speed of 0 disables pacing; 2 replays twice as fast as recorded.
+    """
+
+    def __init__(self, speed: float = 1.0) -> None:
+        self.speed = speed
+        self._origin: Optional[Tuple[float, float]] = None
+
+    def delay(self, taken: Optional[float], now: Optional[float] = None) -> float:
+        """Seconds to wait before sending an event for a fix taken at ``taken``."""
+        if self.speed <= 0 or taken is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        if self._origin is None:
+            self._origin = (taken, now)
+            return 0.0
+        first_fix, started = self._origin
+        return max(0.0, started + (taken - first_fix) / self.speed - now)
+
+
+async def replay(
+    batches: Iterator[Converted],
+    send,
+    speed: float = 1.0,
+) -> int:
+    """Pace converted events into the ``send`` coroutine; return the count sent."""
+    pacer = Pacer(speed)
+    count = 0
+    while True:
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            return count
+        for taken, event in batch:
+            delay = pacer.delay(taken)
+            if delay:
+                await asyncio.sleep(delay)
+            await send(event)
+            count += 1
+
+
+def load_config(config_file: str) -> SectionProxy:
+    """Read the ``[lincot]`` section like the daemon does (environment + file)."""
+    env_vars = {key: val for key, val in os.environ.items() if "%" not in val}
+    env_vars["COT_URL"] = env_vars.get("COT_URL", pytak.DEFAULT_COT_URL)
+    env_vars["TAK_PROTO"] = env_vars.get("TAK_PROTO", pytak.DEFAULT_TAK_PROTO)
+    parser = ConfigParser(env_vars)
+    if config_file and os.path.exists(config_file):
+        parser.read(config_file)
+    if not parser.has_section("lincot"):
+        parser.add_section("lincot")
+    return parser["lincot"]
+
+
+async def _replay_to_url(
+    batches: Iterator[Converted], config: SectionProxy, speed: float
+) -> int:
+    tx_worker = await pytak.txworker_factory(asyncio.Queue(), config)
+    try:
+        return await replay(batches, tx_worker.send_data, speed)
+    finally:
+        writer = tx_worker.writer
+        if hasattr(writer, "close"):
+            writer.close()
+        if hasattr(writer, "wait_closed"):
+            await writer.wait_closed()
+
+
+async def _replay_to_file(
+    batches: Iterator[Converted], output: str, speed: float
+) -> int:
+    if output == "-":
+        stream = sys.stdout.buffer
+    else:
+        stream = open(output, "wb")  # pylint: disable=consider-using-with
+
+    async def _write(event: bytes) -> None:
+        stream.write(event)
+
+    try:
+        return await replay(batches, _write, speed)
+    finally:
+        if stream is sys.stdout.buffer:
+            stream.flush()
+        else:
+            stream.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse ``lincot replay`` arguments."""
+    parser = argparse.ArgumentParser(
+        prog="lincot replay",
+        description="Replay a recorded gpspipe/gpsd JSON log as CoT.",
+    )
+    parser.add_argument("log", help="JSON log file, plain or gzip'd; - for stdin")
+    parser.add_argument(
+        "-c",
+        "--CONFIG_FILE",
+        dest="CONFIG_FILE",
+        default="config.ini",
+        help="Optional configuration file. Default: config.ini",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write CoT to this file (- for stdout) instead of sending to COT_URL",
+    )
+    parser.add_argument("--cot-url", help="Send to this URL instead of COT_URL")
+    parser.add_argument(
+        "-s",
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Multiple of the recorded pace; 0 sends as fast as possible. Default: 1",
+    )
+    parser.add_argument(
+        "--fast", action="store_true", help="Send as fast as possible (--speed 0)"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Conversion processes. Default: number of CPUs",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--fix-time",
+        action="store_true",
+        help="Stamp CoT time from each fix (COT_TIME_FROM_FIX)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run ``lincot replay``."""
+    args = parse_args(argv)
+    config = load_config(args.CONFIG_FILE)
+    if args.cot_url:
+        config["COT_URL"] = args.cot_url
+    if args.fix_time:
+        config["COT_TIME_FROM_FIX"] = "1"
+    speed = 0.0 if args.fast else args.speed
+    settings = Settings.from_config(config)
+
+    started = time.monotonic()
+    with open_log(args.log) as log:
+        batches = iter_batches(log, settings, args.jobs, args.batch_size)
+        try:
+            if args.output:
+                count = asyncio.run(_replay_to_file(batches, args.output, speed))
+            else:
+                count = asyncio.run(_replay_to_url(batches, config, speed))
+        finally:
+            batches.close()
+    elapsed = time.monotonic() - started
+    rate = count / max(elapsed, 1e-9)
+    print(f"Replayed {count} events in {elapsed:.1f}s ({rate:.0f}/s)", file=sys.stderr)
+    return 0
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Drift-free periodic scheduling for the LINCOT workers.
+
+``Schedule`` ticks on absolute deadlines of the monotonic clock (``first``,
+``first + period``, ...), so time spent acquiring a fix or building an event
+does not push every later report back. Work that overruns one or more
+deadlines is started at once and the missed deadlines are counted and logged,
+instead of silently stretching the period.
+
+SCHEDULE_PHASE spreads a fleet over the period: ``uid`` hashes the CoT uid to a
+fixed offset, a number is an offset in seconds. Phased deadlines are aligned to
+the wall clock, so nodes that boot together still report in their own slot.
+SCHEDULE_JITTER adds a random delay of up to that many seconds to each tick
+without moving the deadlines themselves.
+"""
+
+import asyncio
+import logging
+import random
+import time
+import zlib
+from configparser import SectionProxy
+from typing import Optional, Union
+
+from lincot.identity import get_uid
+from lincot.metrics import Counter
+from lincot.settings import number
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds between missed-deadline warnings of one schedule; the rest go to debug.
+WARN_INTERVAL: float = 60.0
+
+
+def uid_phase(uid: str, period: float) -> float:
+    """A stable offset in ``[0, period)`` derived from ``uid``."""
+    return zlib.crc32(uid.encode("utf-8")) / 2**32 * period
+
+
+def phase_from_config(
+    config: Union[dict, SectionProxy, None], period: float
+) -> Optional[float]:
+    """SCHEDULE_PHASE as seconds into the period, or None when unset."""
+    config = config or {}
+    value = str(config.get("SCHEDULE_PHASE") or "").strip().lower()
+    if value in ("", "none", "off"):
+        return None
+    if value == "uid":
+        return uid_phase(get_uid(config), period)
+    try:
+        phase = float(value)
+    except ValueError:
+        phase = -1.0
+    if phase < 0:
+        raise ValueError(
+            f"SCHEDULE_PHASE must be 'uid' or a number of seconds, got {value!r}"
+        )
+    return phase % period
+
+
+class Schedule:
+    """Periodic deadlines on the monotonic clock, with optional phase and jitter.
+
+    Callers do their work, then ``await wait()`` for the next deadline.
+    """
+
+    def __init__(
+        self,
+        period: float,
+        phase: Optional[float] = None,
+        jitter: float = 0.0,
+        missed_counter: Optional[Counter] = None,
+        name: str = "",
+    ) -> None:
+        self.period = float(period)
+        self.phase = phase
+        # Jitter is kept well inside the period so it cannot cause misses.
+        self.jitter = min(max(0.0, jitter), self.period / 2)
+        self.missed: int = 0
+        self.missed_counter = missed_counter
+        self.name = name
+        self.deadline: Optional[float] = None
+        # The grid deadline of the tick served last.
+        self.tick: Optional[float] = None
+        self._warned: Optional[float] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Union[dict, SectionProxy, None],
+        period: float,
+        missed_counter: Optional[Counter] = None,
+        name: str = "",
+    ) -> "Schedule":
+        """A schedule for ``period`` using SCHEDULE_PHASE and SCHEDULE_JITTER."""
+        return cls(
+            period,
+            phase_from_config(config, period) if period > 0 else None,
+            number(config or {}, "SCHEDULE_JITTER", 0.0, minimum=0),
+            missed_counter,
+            name,
+        )
+
+    def _first(self, now: float, wall: float) -> float:
+        if self.phase is None:
+            return now + self.period
+        offset = (self.phase - wall) % self.period
+        return now + (offset or self.period)
+
+    def delay(
+        self,
+        now: Optional[float] = None,
+        wall: Optional[float] = None,
+        jitter: Optional[float] = None,
+    ) -> float:
+        """Seconds to sleep until the next deadline (plus jitter); 0 when late.
+
+        Advances the schedule by one tick, or past every deadline already
+        missed.
+        """
+        now = time.monotonic() if now is None else now
+        if self.period <= 0:
+            return 0.0
+        if self.deadline is None:
+            self.deadline = self._first(now, time.time() if wall is None else wall)
+        deadline = self.deadline
+        if now > deadline:
+            missed = int((now - deadline) // self.period) + 1
+            self.tick = deadline + (missed - 1) * self.period
+            self.deadline = self.tick + self.period
+            self._missed(missed, now - deadline, now)
+            return 0.0
+        self.tick = deadline
+        self.deadline = deadline + self.period
+        if jitter is None:
+            jitter = random.uniform(0, self.jitter) if self.jitter else 0.0
+        return deadline - now + jitter
+
+    def set_period(self, period: float) -> None:
+        """Change the period; the next deadline follows the last tick by ``period``."""
+        period = float(period)
+        if period == self.period:
+            return
+        self.period = period
+        self.jitter = min(self.jitter, period / 2)
+        if self.tick is not None:
+            self.deadline = self.tick + period
+
+    def _missed(self, count: int, late: float, now: float) -> None:
+        self.missed += count
+        if self.missed_counter is not None:
+            self.missed_counter.inc(count)
+        level = logging.DEBUG
+        if self._warned is None or now - self._warned >= WARN_INTERVAL:
+            level = logging.WARNING
+            self._warned = now
+        _LOGGER.log(
+            level,
+            "%s missed %d deadline(s) of its %ss period (%.1fs late)",
+            self.name or "Schedule",
+            count,
+            self.period,
+            late,
+        )
+
+    async def wait(self) -> None:
+        """Sleep until the next deadline; return at once if it already passed."""
+        await asyncio.sleep(self.delay())
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Parsed, validated LINCOT settings.
+
+``Settings.from_config`` reads a config section (or dict) once, converts and
+range-checks every value the per-event code needs and raises ``ValueError``
+naming the offending key, so a typo fails at startup rather than at the first
+fix. The workers build one ``Settings`` and hand it to ``position_to_cot`` and
+friends, which then only read attributes. ``Settings.get`` serves the original
+values, so a ``Settings`` can still be passed anywhere a config is accepted, and
+the public functions keep accepting plain dicts and ``SectionProxy`` objects via
+``as_settings``.
+"""
+
+from configparser import SectionProxy
+from typing import Any, Mapping, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import pytak
+
+import lincot
+from lincot.coprocess import is_enabled
+from lincot.metrics import parse_listen
+from lincot.network import is_localhost_host
+from lincot.tak_proto import enabled as tak_proto_enabled, wire_format
+
+Config = Union[dict, SectionProxy, "Settings", None]
+
+# Keys only read once by the workers; checked here so mistakes surface at boot.
+_NUMERIC_KEYS = (
+    ("TAK_PROTO", int, 0, None),
+    ("POLL_INTERVAL", int, 0, None),
+    ("GPS_INFO_CMD_TIMEOUT", float, 0, None),
+    ("MAX_FIX_AGE", float, 0, None),
+    ("SENSOR_KEEPALIVE_PERIOD", int, 1, None),
+    ("SENSOR_LAT", float, -90, 90),
+    ("SENSOR_LON", float, -180, 180),
+    ("SENSOR_HAE", float, None, None),
+    ("GPSD_PORT", int, 1, 65535),
+    ("NMEA_BAUD", int, 1, None),
+    ("SUPPRESS_DISTANCE", float, 0, None),
+    ("SUPPRESS_HEADING", float, 0, 360),
+    ("SUPPRESS_MAX_SILENCE", float, 0, None),
+    ("SPOOL_SEGMENT_BYTES", int, 1, None),
+    ("SPOOL_MAX_BYTES", int, 1, None),
+    ("SPOOL_DRAIN_RATE", float, 0, None),
+    ("FANOUT_QUEUE_SIZE", int, 1, None),
+    ("FANOUT_SEND_TIMEOUT", float, 0, None),
+    ("FANOUT_BACKOFF_MAX", float, 1, None),
+    ("FIX_AGGREGATE_WINDOW", float, 0, None),
+    ("FIX_AGGREGATE_SAMPLES", int, 1, None),
+    ("FIX_AGGREGATE_OUTLIER", float, 0, None),
+    ("SCHEDULE_JITTER", float, 0, None),
+    ("MIN_POLL_INTERVAL", float, 0, None),
+    ("STATIC_HAE", float, None, None),
+    ("STATIC_COURSE", float, None, None),
+    ("STATIC_SPEED", float, 0, None),
+)
+
+
+def _text(config, key: str) -> str:
+    return str(config.get(key) or "").strip()
+
+
+def _override(config, key: str) -> Optional[str]:
+    value = config.get(key)
+    if value is None or not str(value).strip():
+        return None
+    return str(value).strip()
+
+
+def number(
+    config,
+    key: str,
+    default=None,
+    kind: type = float,
+    minimum: Optional[float] = None,
+    maximum: Optional[float] = None,
+):
+    """``config[key]`` as ``kind``, ``default`` when unset; ValueError if invalid."""
+    value = config.get(key)
+    if value is None or not str(value).strip():
+        return default
+    try:
+        parsed = kind(str(value).strip())
+    except ValueError:
+        noun = "an integer" if kind is int else "a number"
+        raise ValueError(f"{key} must be {noun}, got {value!r}") from None
+    if (minimum is not None and parsed < minimum) or (
+        maximum is not None and parsed > maximum
+    ):
+        bounds = f"between {minimum} and {maximum}" if maximum is not None else (
+            f"at least {minimum}"
+        )
+        raise ValueError(f"{key} must be {bounds}, got {value!r}")
+    return parsed
+
+
+def _cockpit(override: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    # A fixed URL, or for localhost overrides a "scheme://{}:port/" pattern whose
+    # host is filled in per event with the current host address.
+    if not override:
+        return None, None
+    parsed = urlparse(override)
+    if is_localhost_host(parsed.hostname):
+        port = parsed.port or lincot.DEFAULT_COCKPIT_PORT
+        return None, f"{parsed.scheme or 'http'}://{{}}:{port}/"
+    return override.rstrip("/") + "/", None
+
+
+def config_dict(config) -> dict:
+    """A plain, picklable copy of ``config`` with the upper-case keys LINCOT reads."""
+    if config is None:
+        return {}
+    return {str(key).upper(): value for key, value in config.items()}
+
+
+class Settings(NamedTuple):
+    """Every config value a CoT event needs, parsed once."""
+
+    raw: Mapping[str, Any]
+    cot_type: str
+    cot_stale: int
+    cot_access: Optional[str]
+    cot_uid: Optional[str]
+    callsign: Optional[str]
+    cot_url: str
+    cot_url_sanitized: str
+    cot_host_id: Optional[str]
+    cockpit_url: Optional[str]
+    cockpit_pattern: Optional[str]
+    ssh_user: str
+    remarks_extra: str
+    remarks_cmd: str
+    remarks_cmd_timeout: float
+    remarks_cmd_persistent: bool
+    detail_cmd: str
+    detail_cmd_timeout: float
+    detail_cmd_persistent: bool
+    time_from_fix: bool
+    position_source: str
+    static: Optional[Mapping[str, Any]]
+    sensor_id: str
+    sensor_cot_type: str
+    sensor_callsign: str
+    sensor_payload_type: str
+    tak_proto: bool
+    wire: str
+
+    def get(self, key: str, default=None):
+        """The original (string) value of ``key``, like ``SectionProxy.get``."""
+        return self.raw.get(key, default)
+
+    @classmethod
+    def from_config(cls, config: Config) -> "Settings":
+        """Parse and validate ``config``; raises ValueError naming a bad key."""
+        if isinstance(config, Settings):
+            return config
+        raw = config_dict(config)
+        for key, kind, minimum, maximum in _NUMERIC_KEYS:
+            number(raw, key, kind=kind, minimum=minimum, maximum=maximum)
+        if _text(raw, "METRICS_LISTEN"):
+            parse_listen(raw["METRICS_LISTEN"])
+
+        static = None
+        if _text(raw, "STATIC_LAT") and _text(raw, "STATIC_LON"):
+            static = {
+                "class": "TPV",
+                "lat": number(raw, "STATIC_LAT", minimum=-90, maximum=90),
+                "lon": number(raw, "STATIC_LON", minimum=-180, maximum=180),
+                "altHAE": raw.get("STATIC_HAE") or "9999999.0",
+                "track": raw.get("STATIC_COURSE") or "0.0",
+                "speed": raw.get("STATIC_SPEED") or "0.0",
+            }
+            position_source = "static"
+        elif _text(raw, "NMEA_DEVICE"):
+            position_source = "nmea"
+        else:
+            position_source = "gpsd"
+
+        cot_url = str(raw.get("COT_URL") or "")
+        cockpit_url, cockpit_pattern = _cockpit(_override(raw, "COCKPIT_URL"))
+        if "SENSOR_ID" in raw:
+            sensor_id = raw["SENSOR_ID"]
+        else:
+            sensor_id = lincot.DEFAULT_SENSOR_ID
+        return cls(
+            raw=raw,
+            cot_type=str(raw.get("COT_TYPE") or lincot.DEFAULT_COT_TYPE),
+            # pytak.cot_event treats a stale of 0 as unset; match it on every path.
+            cot_stale=number(
+                raw, "COT_STALE", int(lincot.DEFAULT_COT_STALE), int, minimum=0
+            )
+            or int(pytak.DEFAULT_COT_STALE),
+            cot_access=raw.get("COT_ACCESS", pytak.DEFAULT_COT_ACCESS),
+            cot_uid=_override(raw, "COT_UID"),
+            callsign=_override(raw, "CALLSIGN"),
+            cot_url=cot_url,
+            cot_url_sanitized=pytak.sanitize_url_credentials(cot_url),
+            cot_host_id=raw.get("COT_HOST_ID") or None,
+            cockpit_url=cockpit_url,
+            cockpit_pattern=cockpit_pattern,
+            ssh_user=str(raw.get("SSH_USER") or lincot.DEFAULT_SSH_USER).strip(),
+            remarks_extra=_text(raw, "REMARKS_EXTRA"),
+            remarks_cmd=_text(raw, "REMARKS_EXTRA_CMD"),
+            remarks_cmd_timeout=number(
+                raw,
+                "REMARKS_EXTRA_CMD_TIMEOUT",
+                lincot.DEFAULT_REMARKS_EXTRA_CMD_TIMEOUT,
+                minimum=0,
+            ),
+            remarks_cmd_persistent=is_enabled(raw.get("REMARKS_EXTRA_CMD_PERSISTENT")),
+            detail_cmd=_text(raw, "COT_DETAIL_XML_CMD"),
+            detail_cmd_timeout=number(
+                raw,
+                "COT_DETAIL_XML_CMD_TIMEOUT",
+                lincot.DEFAULT_COT_DETAIL_XML_CMD_TIMEOUT,
+                minimum=0,
+            ),
+            detail_cmd_persistent=is_enabled(raw.get("COT_DETAIL_XML_CMD_PERSISTENT")),
+            time_from_fix=is_enabled(raw.get("COT_TIME_FROM_FIX")),
+            position_source=position_source,
+            static=static,
+            sensor_id=sensor_id,
+            sensor_cot_type=raw.get("SENSOR_COT_TYPE", lincot.DEFAULT_SENSOR_COT_TYPE),
+            sensor_callsign=raw.get("SENSOR_CALLSIGN", sensor_id),
+            sensor_payload_type=raw.get(
+                "SENSOR_PAYLOAD_TYPE", lincot.DEFAULT_SENSOR_PAYLOAD_TYPE
+            ),
+            tak_proto=tak_proto_enabled(raw),
+            wire=wire_format(raw),
+        )
+
+
+def as_settings(config: Config) -> Settings:
+    """``config`` itself when it is already ``Settings``, else parse it."""
+    if isinstance(config, Settings):
+        return config
+    return Settings.from_config(config)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Simulate a fleet of LINCOT nodes for scale testing (``lincot simulate``).
+
+N virtual nodes run in one asyncio process, each with its own uid and callsign,
+moving along a seeded synthetic track. Every interval a node reports through
+``position_to_cot`` (and with ``--sensor`` also ``gen_sensor_cot``) to COT_URL or
+to a file. The summary gives events per second and CPU time per event, i.e. how
+many nodes one core can drive. Pair with ``lincot sink`` to see what arrives.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import random
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import Awaitable, Callable, List, Optional
+
+import pytak
+
+import lincot
+from lincot.replay import load_config
+from lincot.settings import Settings, config_dict
+from lincot.suppression import project
+from lincot.tak_proto import encode_event, enabled as tak_proto_enabled, wire_format
+
+DEFAULT_NODES: int = 10
+DEFAULT_INTERVAL: float = 1.0
+DEFAULT_RADIUS: float = 5000.0
+DEFAULT_PREFIX: str = "lincot-sim"
+
+Send = Callable[[bytes], Awaitable[None]]
+
+
+class SyntheticTrack:
+    """A node wandering at a steady speed with gentle, seeded turns."""
+
+    def __init__(
+        self, rng: random.Random, lat: float, lon: float, radius: float
+    ) -> None:
+        self.rng = rng
+        self.lat, self.lon = project(
+            lat, lon, rng.uniform(0.0, 360.0), radius * math.sqrt(rng.random())
+        )
+        self.hae = rng.uniform(0.0, 500.0)
+        self.course = rng.uniform(0.0, 360.0)
+        self.speed = rng.uniform(1.0, 25.0)
+        self.turn_rate = rng.uniform(-3.0, 3.0)
+
+    def advance(self, seconds: float) -> None:
+        """Move ``seconds`` along the track, occasionally reversing the turn."""
+        self.lat, self.lon = project(
+            self.lat, self.lon, self.course, self.speed * seconds
+        )
+        self.course = (self.course + self.turn_rate * seconds) % 360.0
+        if self.rng.random() < 0.05:
+            self.turn_rate = -self.turn_rate
+
+    def tpv(self, now: Optional[float] = None) -> dict:
+        """The current position as a gpsd TPV report."""
+        now = time.time() if now is None else now
+        stamp = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+        return {
+            "class": "TPV",
+            "mode": 3,
+            "time": stamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "lat": round(self.lat, 7),
+            "lon": round(self.lon, 7),
+            "altHAE": round(self.hae, 3),
+            "epx": 3.0,
+            "epy": 3.0,
+            "epv": 5.0,
+            "track": round(self.course, 4),
+            "speed": round(self.speed, 3),
+        }
+
+
+def node_config(base: dict, index: int, prefix: str = DEFAULT_PREFIX) -> dict:
+    """Configuration for virtual node ``index``: its own uid, callsign and link."""
+    callsign = f"{prefix}-{index:04d}"
+    # STATIC_LAT/LON only place the fleet; the nodes themselves are moving.
+    base = {key: value for key, value in base.items() if not key.startswith("STATIC_")}
+    return dict(
+        base,
+        COT_UID=callsign,
+        CALLSIGN=callsign,
+        COCKPIT_URL=f"http://{callsign}.local:9090/",
+        SENSOR_ID=callsign,
+    )
+
+
+class Fleet:
+    """N virtual nodes reporting every ``interval`` seconds through ``send``."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        config: dict,
+        nodes: int = DEFAULT_NODES,
+        interval: float = DEFAULT_INTERVAL,
+        sensor: bool = False,
+        seed: int = 0,
+        radius: float = DEFAULT_RADIUS,
+        prefix: str = DEFAULT_PREFIX,
+    ) -> None:
+        self.interval = interval
+        self.sensor = sensor
+        self.wire = wire_format(config) if tak_proto_enabled(config) else None
+        lat = float(config.get("STATIC_LAT") or 0.0)
+        lon = float(config.get("STATIC_LON") or 0.0)
+        rng = random.Random(seed)
+        self.configs: List[Settings] = [
+            Settings.from_config(node_config(config, index, prefix))
+            for index in range(nodes)
+        ]
+        self.tracks: List[SyntheticTrack] = [
+            SyntheticTrack(random.Random(rng.random()), lat, lon, radius)
+            for _ in range(nodes)
+        ]
+        self.events: int = 0
+        self.bytes: int = 0
+        self.failed: int = 0
+
+    def report(self, index: int, now: Optional[float] = None) -> List[bytes]:
+        """Advance node ``index`` one interval and build its events."""
+        track = self.tracks[index]
+        config = self.configs[index]
+        track.advance(self.interval)
+        if self.wire:
+            events = [lincot.position_to_proto(track.tpv(now), config, self.wire)]
+        else:
+            events = [lincot.position_to_cot(track.tpv(now), config)]
+        if self.sensor:
+            cot = lincot.gen_sensor_cot(config, track.lat, track.lon, track.hae)
+            if cot is None:
+                events.append(None)
+            elif self.wire:
+                events.append(encode_event(cot, self.wire))
+            else:
+                events.append(ET.tostring(cot))
+        return events
+
+    async def _node(self, index: int, send: Send, until: float) -> None:
+        # Spread the nodes evenly across the interval.
+        await asyncio.sleep(self.interval * index / len(self.tracks))
+        deadline = time.monotonic()
+        while deadline < until:
+            for event in self.report(index):
+                if not event:
+                    self.failed += 1
+                    continue
+                await send(event)
+                self.events += 1
+                self.bytes += len(event)
+            deadline += self.interval
+            await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+
+    async def run(self, send: Send, duration: float) -> dict:
+        """Run every node for ``duration`` seconds; return the run summary."""
+        started = time.monotonic()
+        cpu_started = time.process_time()
+        until = started + duration
+        await asyncio.gather(
+            *(self._node(index, send, until) for index in range(len(self.tracks)))
+        )
+        elapsed = time.monotonic() - started
+        cpu = time.process_time() - cpu_started
+        return {
+            "nodes": len(self.tracks),
+            "events": self.events,
+            "bytes": self.bytes,
+            "failed": self.failed,
+            "seconds": round(elapsed, 3),
+            "events_per_sec": round(self.events / max(elapsed, 1e-9), 1),
+            "cpu_seconds": round(cpu, 3),
+            "cpu_us_per_event": round(cpu * 1e6 / max(self.events, 1), 1),
+        }
+
+
+async def _simulate_to_url(fleet: Fleet, config, duration: float) -> dict:
+    tx_worker = await pytak.txworker_factory(asyncio.Queue(), config)
+    tx_worker.use_protobuf = False  # events are already encoded
+    try:
+        return await fleet.run(tx_worker.send_data, duration)
+    finally:
+        writer = tx_worker.writer
+        if hasattr(writer, "close"):
+            writer.close()
+        if hasattr(writer, "wait_closed"):
+            await writer.wait_closed()
+
+
+async def _simulate_to_file(fleet: Fleet, output: str, duration: float) -> dict:
+    if output == "-":
+        stream = sys.stdout.buffer
+    else:
+        stream = open(output, "wb")  # pylint: disable=consider-using-with
+
+    async def _write(event: bytes) -> None:
+        stream.write(event)
+
+    try:
+        return await fleet.run(_write, duration)
+    finally:
+        if stream is sys.stdout.buffer:
+            stream.flush()
+        else:
+            stream.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse ``lincot simulate`` arguments."""
+    parser = argparse.ArgumentParser(
+        prog="lincot simulate",
+        description="Drive N virtual LINCOT nodes from one process.",
+    )
+    parser.add_argument(
+        "-c",
+        "--CONFIG_FILE",
+        dest="CONFIG_FILE",
+        default="config.ini",
+        help="Optional configuration file. Default: config.ini",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write CoT to this file (- for stdout) instead of sending to COT_URL",
+    )
+    parser.add_argument("--cot-url", help="Send to this URL instead of COT_URL")
+    parser.add_argument(
+        "-n", "--nodes", type=int, default=DEFAULT_NODES, help="Virtual nodes"
+    )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="Seconds between reports from each node. Default: 1",
+    )
+    parser.add_argument(
+        "-d", "--duration", type=float, default=60.0, help="Seconds to run"
+    )
+    parser.add_argument(
+        "--sensor", action="store_true", help="Also send each node's sensor beacon"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Track random seed")
+    parser.add_argument(
+        "--radius",
+        type=float,
+        default=DEFAULT_RADIUS,
+        help="Meters around STATIC_LAT/STATIC_LON that nodes start within",
+    )
+    parser.add_argument("--prefix", default=DEFAULT_PREFIX, help="uid/callsign prefix")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run ``lincot simulate``."""
+    args = parse_args(argv)
+    config = load_config(args.CONFIG_FILE)
+    if args.cot_url:
+        config["COT_URL"] = args.cot_url
+    fleet = Fleet(
+        config_dict(config),
+        nodes=args.nodes,
+        interval=args.interval,
+        sensor=args.sensor,
+        seed=args.seed,
+        radius=args.radius,
+        prefix=args.prefix,
+    )
+    if args.output:
+        summary = asyncio.run(_simulate_to_file(fleet, args.output, args.duration))
+    else:
+        summary = asyncio.run(_simulate_to_url(fleet, config, args.duration))
+    if args.json:
+        print(json.dumps(summary), file=sys.stderr)
+    else:
+        print(
+            "Simulated {nodes} nodes: {events} events, {bytes} bytes in {seconds}s "
+            "({events_per_sec}/s, {cpu_us_per_event} us CPU/event)".format(**summary),
+            file=sys.stderr,
+        )
+    return 0
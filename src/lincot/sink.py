@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Minimal local CoT sink for scale testing (``lincot sink``).
+
+Listens on UDP and/or TCP, counts events and bytes, and measures inter-arrival
+jitter: the spread of the gaps between consecutive events from the same uid.
+XML and TAK protobuf (mesh datagrams or stream framing over TCP) are understood.
+Listening on a multicast UDP address joins the group.
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import math
+import signal
+import socket
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from lincot.coalesce import event_uid
+from lincot.tak_proto import STREAM_HEADER, read_varint
+
+DEFAULT_LISTEN: str = "udp://0.0.0.0:6969"
+DEFAULT_REPORT_INTERVAL: float = 5.0
+
+_XML_END = b"</event>"
+
+
+class SinkStats:
+    """Event, byte and per-uid inter-arrival statistics."""
+
+    def __init__(self) -> None:
+        self.events: int = 0
+        self.bytes: int = 0
+        self.started: Optional[float] = None
+        self.last: Optional[float] = None
+        self._arrivals: Dict[str, float] = {}
+        self._gaps: int = 0
+        self._gap_mean: float = 0.0
+        self._gap_m2: float = 0.0
+        self._gap_max: float = 0.0
+
+    def record(
+        self, event: bytes, now: Optional[float] = None, size: Optional[int] = None
+    ) -> None:
+        """Count one received event of ``size`` wire bytes (default: its length)."""
+        now = time.monotonic() if now is None else now
+        if self.started is None:
+            self.started = now
+        self.last = now
+        self.events += 1
+        self.bytes += len(event) if size is None else size
+        uid = event_uid(event)
+        if uid is None:
+            return
+        previous = self._arrivals.get(uid)
+        self._arrivals[uid] = now
+        if previous is None:
+            return
+        # Welford's running mean and variance of the per-uid gaps.
+        gap = now - previous
+        self._gaps += 1
+        delta = gap - self._gap_mean
+        self._gap_mean += delta / self._gaps
+        self._gap_m2 += delta * (gap - self._gap_mean)
+        self._gap_max = max(self._gap_max, gap)
+
+    def summary(self) -> dict:
+        """Totals, rates and gap statistics (milliseconds) so far."""
+        elapsed = (self.last - self.started) if self.started is not None else 0.0
+        jitter = math.sqrt(self._gap_m2 / self._gaps) if self._gaps else 0.0
+        return {
+            "events": self.events,
+            "bytes": self.bytes,
+            "uids": len(self._arrivals),
+            "seconds": round(elapsed, 3),
+            "events_per_sec": round(self.events / elapsed, 1) if elapsed else 0.0,
+            "bytes_per_sec": round(self.bytes / elapsed, 1) if elapsed else 0.0,
+            "gap_mean_ms": round(self._gap_mean * 1000, 3),
+            "jitter_ms": round(jitter * 1000, 3),
+            "gap_max_ms": round(self._gap_max * 1000, 3),
+        }
+
+
+class EventSplitter:
+    """Split a TCP byte stream into XML or stream-framed protobuf events."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add received bytes; return every event now complete."""
+        buffer = self._buffer
+        buffer += data
+        events = []
+        while True:
+            del buffer[: len(buffer) - len(buffer.lstrip())]
+            if not buffer:
+                break
+            if buffer.startswith(STREAM_HEADER):
+                try:
+                    length, start = read_varint(buffer, len(STREAM_HEADER))
+                except IndexError:
+                    break
+                end = start + length
+                if len(buffer) < end:
+                    break
+            else:
+                end = buffer.find(_XML_END)
+                if end < 0:
+                    break
+                end += len(_XML_END)
+            events.append(bytes(buffer[:end]))
+            del buffer[:end]
+        return events
+
+
+class _DatagramSink(asyncio.DatagramProtocol):
+    def __init__(self, stats: SinkStats) -> None:
+        self.stats = stats
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        self.stats.record(data)
+
+
+def _udp_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        multicast = ipaddress.ip_address(host).is_multicast
+    except ValueError:
+        multicast = False
+    if multicast:
+        sock.bind(("", port))
+        membership = struct.pack(
+            "4s4s", socket.inet_aton(host), socket.inet_aton("0.0.0.0")
+        )
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    else:
+        sock.bind((host, port))
+    return sock
+
+
+class Sink:
+    """UDP and TCP listeners feeding one ``SinkStats``."""
+
+    def __init__(self) -> None:
+        self.stats = SinkStats()
+        self.addresses: List[Tuple[str, str, int]] = []
+        self._closers: list = []
+
+    async def _handle_stream(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        splitter = EventSplitter()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for event in splitter.feed(data):
+                    self.stats.record(event, size=0)
+                self.stats.bytes += len(data)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def listen(self, url: str) -> Tuple[str, str, int]:
+        """Start listening on ``udp://host:port`` or ``tcp://host:port``."""
+        parsed = urlparse(url)
+        scheme = parsed.scheme.split("+", 1)[0]
+        host = parsed.hostname or "0.0.0.0"
+        port = parsed.port or 0
+        if scheme == "udp":
+            transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _DatagramSink(self.stats), sock=_udp_socket(host, port)
+            )
+            self._closers.append(transport.close)
+            address = ("udp",) + transport.get_extra_info("sockname")[:2]
+        elif scheme == "tcp":
+            server = await asyncio.start_server(self._handle_stream, host, port)
+            self._closers.append(server.close)
+            address = ("tcp",) + server.sockets[0].getsockname()[:2]
+        else:
+            raise ValueError(f"Unsupported sink URL {url!r}: use udp:// or tcp://")
+        self.addresses.append(address)
+        return address
+
+    def close(self) -> None:
+        """Stop every listener."""
+        for close in self._closers:
+            close()
+        self._closers.clear()
+
+
+async def run_sink(
+    urls: List[str], duration: float, report_interval: float
+) -> dict:
+    """Listen on ``urls`` for ``duration`` seconds (0: until interrupted)."""
+    task = asyncio.current_task()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGINT, task.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass
+    sink = Sink()
+    for url in urls:
+        kind, host, port = await sink.listen(url)
+        print(f"Listening on {kind}://{host}:{port}", file=sys.stderr)
+    deadline = time.monotonic() + duration if duration else None
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            waits = [report_interval] if report_interval > 0 else []
+            if deadline is not None:
+                waits.append(deadline - time.monotonic())
+            if not waits:
+                # No progress lines and no end: idle until interrupted.
+                await asyncio.Event().wait()
+            await asyncio.sleep(max(0.0, min(waits)))
+            if report_interval > 0:
+                print(json.dumps(sink.stats.summary()), file=sys.stderr)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        sink.close()
+    return sink.stats.summary()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse ``lincot sink`` arguments."""
+    parser = argparse.ArgumentParser(
+        prog="lincot sink",
+        description="Receive CoT locally and count events, bytes and jitter.",
+    )
+    parser.add_argument(
+        "-l",
+        "--listen",
+        action="append",
+        help=f"udp:// or tcp:// host:port, repeatable. Default: {DEFAULT_LISTEN}",
+    )
+    parser.add_argument(
+        "-d", "--duration", type=float, default=0.0, help="Seconds to run (0: forever)"
+    )
+    parser.add_argument(
+        "-r",
+        "--report",
+        type=float,
+        default=DEFAULT_REPORT_INTERVAL,
+        help="Seconds between progress lines (0: none). Default: 5",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run ``lincot sink``."""
+    args = parse_args(argv)
+    try:
+        summary = asyncio.run(
+            run_sink(args.listen or [DEFAULT_LISTEN], args.duration, args.report)
+        )
+    except KeyboardInterrupt:
+        return 130
+    print(json.dumps(summary))
+    return 0
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Several GNSS receivers and identities from one LINCOT process.
+
+``SOURCES`` lists source names, e.g. ``primary, backup, trailer``. Each source is
+configured with ``SOURCE_<NAME>_<KEY>`` keys (``SOURCE_TRAILER_NMEA_DEVICE``,
+``SOURCE_TRAILER_COT_UID``, ...) layered over the top-level config, and gets its
+own ``PositionService`` and ``PositionBus``; every reporting source gets a
+``LincotWorker``. All of them share the event loop, the host probes and the TX
+connection, so an extra source costs little more than its reader.
+
+``SOURCE_<NAME>_BACKUP = <other>`` makes ``<other>`` a standby for ``<name>``:
+a ``Failover`` relay reports the backup's fixes under ``<name>``'s identity
+while ``<name>`` has no fix newer than ``SOURCE_<NAME>_FAILOVER_AFTER`` seconds
+(default: twice its POLL_INTERVAL). A backup does not report on its own.
+"""
+
+import asyncio
+import logging
+import re
+from configparser import SectionProxy
+from typing import Dict, List, Tuple, Union
+
+import lincot
+from lincot.bus import Fix, PositionBus
+from lincot.identity import get_callsign, get_uid
+from lincot.metrics import source_failovers, source_fix_age
+from lincot.settings import Settings, config_dict, number
+
+_LOGGER = logging.getLogger(__name__)
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9]+$")
+
+# Top-level keys a source does not inherit: each one has its own receiver and
+# identity.
+PER_SOURCE_PREFIXES = ("STATIC_", "NMEA_", "GPSD_", "GPS_INFO_CMD", "SOURCE")
+PER_SOURCE_KEYS = ("COT_UID", "CALLSIGN")
+
+
+def source_names(config: Union[dict, SectionProxy, None]) -> List[str]:
+    """Names listed in SOURCES, validated; empty for single-source mode."""
+    config = config or {}
+    names = [name.strip() for name in str(config.get("SOURCES") or "").split(",")]
+    names = [name for name in names if name]
+    for name in names:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"SOURCES: {name!r} must be letters and digits only")
+    if len({name.upper() for name in names}) != len(names):
+        raise ValueError(f"SOURCES lists a name twice: {', '.join(names)}")
+    return names
+
+
+def source_config(config: Union[dict, SectionProxy, None], name: str) -> dict:
+    """The config for source ``name``: top-level keys plus its SOURCE_ keys."""
+    base = config_dict(config)
+    prefix = f"SOURCE_{name.upper()}_"
+    own = {
+        key[len(prefix):]: value
+        for key, value in base.items()
+        if key.startswith(prefix)
+    }
+    merged = {
+        key: value
+        for key, value in base.items()
+        if key not in PER_SOURCE_KEYS and not key.startswith(PER_SOURCE_PREFIXES)
+    }
+    merged.update(own)
+    merged.setdefault("COT_UID", f"{get_uid(None)}-{name}")
+    merged.setdefault("CALLSIGN", f"{get_callsign(None)}-{name}")
+    return merged
+
+
+def backups(config: Union[dict, SectionProxy, None]) -> Dict[str, str]:
+    """Primary name -> backup name, from SOURCE_<NAME>_BACKUP."""
+    names = source_names(config)
+    by_upper = {name.upper(): name for name in names}
+    pairs: Dict[str, str] = {}
+    for name in names:
+        wanted = str(
+            (config or {}).get(f"SOURCE_{name.upper()}_BACKUP") or ""
+        ).strip()
+        if not wanted:
+            continue
+        backup = by_upper.get(wanted.upper())
+        if backup is None or backup == name:
+            raise ValueError(
+                f"SOURCE_{name.upper()}_BACKUP: {wanted!r} is not another source "
+                f"in SOURCES"
+            )
+        if backup in pairs.values() or backup in pairs or name in pairs.values():
+            raise ValueError(
+                f"SOURCE_{name.upper()}_BACKUP: {backup!r} already takes part in "
+                "a failover pair"
+            )
+        pairs[name] = backup
+    return pairs
+
+
+class Failover:
+    """Relay a primary's fixes, or its backup's while the primary is stale."""
+
+    def __init__(
+        self,
+        name: str,
+        primary: PositionBus,
+        backup: PositionBus,
+        after: float,
+        backup_name: str = "backup",
+    ) -> None:
+        self.name = name
+        self.backup_name = backup_name
+        self.primary = primary
+        self.backup = backup
+        self.after = after
+        self.bus = PositionBus()
+        self.active: str = name
+        self.failovers = source_failovers(name)
+
+    def healthy(self, bus: PositionBus) -> bool:
+        """True when ``bus`` has a valid fix no older than ``after`` seconds."""
+        age = bus.valid_fix_age()
+        return age is not None and age <= self.after
+
+    def use_backup(self) -> bool:
+        """Report the backup's fixes: the primary is stale and the backup is not."""
+        return not self.healthy(self.primary) and self.healthy(self.backup)
+
+    def _switch(self, active: str) -> None:
+        if active == self.active:
+            return
+        if active == self.name:
+            _LOGGER.info("Source %s has a fix again; leaving backup", self.name)
+        else:
+            self.failovers.inc()
+            _LOGGER.warning(
+                "Source %s has no fix for %ss; reporting %s", self.name, self.after,
+                active,
+            )
+        self.active = active
+
+    async def relay(self, fix: Fix, from_backup: bool) -> None:
+        """Forward ``fix`` if it comes from the source currently in use."""
+        use_backup = self.use_backup()
+        if from_backup != use_backup:
+            return
+        self._switch(self.backup_name if use_backup else self.name)
+        await self.bus.publish(fix.tpv, fix.source)
+
+    async def run(self) -> None:
+        """Relay fixes from both buses forever."""
+        seqs = {self.primary: 0, self.backup: 0}
+        waits = {
+            asyncio.ensure_future(bus.wait(0)): bus
+            for bus in (self.primary, self.backup)
+        }
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    waits, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    bus = waits.pop(task)
+                    fix = task.result()
+                    seqs[bus] = fix.seq
+                    await self.relay(fix, bus is self.backup)
+                    waits[asyncio.ensure_future(bus.wait(seqs[bus]))] = bus
+        finally:
+            for task in waits:
+                task.cancel()
+
+
+def create_source_tasks(
+    config: Union[dict, SectionProxy], queue
+) -> Tuple[set, PositionBus]:
+    """One PositionService per source and one LincotWorker per reporting identity.
+
+    Also returns the first source's bus, which positions the sensor beacon.
+    """
+    names = source_names(config)
+    pairs = backups(config)
+    standby = set(pairs.values())
+    services: Dict[str, "lincot.PositionService"] = {}
+    settings: Dict[str, Settings] = {}
+    configs: Dict[str, dict] = {}
+    for name in names:
+        configs[name] = source_config(config, name)
+        try:
+            settings[name] = Settings.from_config(configs[name])
+        except ValueError as exc:
+            raise ValueError(f"SOURCE_{name.upper()}_{exc}") from None
+        services[name] = lincot.PositionService(
+            queue, configs[name], PositionBus(), settings[name]
+        )
+        source_fix_age(name).set_function(services[name].bus.fix_age)
+
+    tasks = set(services.values())
+    for name in names:
+        if name in standby:
+            continue
+        bus = services[name].bus
+        backup = pairs.get(name)
+        if backup is not None:
+            poll = number(
+                configs[name], "POLL_INTERVAL", lincot.DEFAULT_POLL_INTERVAL, int
+            )
+            after = number(
+                configs[name], "FAILOVER_AFTER", 2.0 * poll, minimum=0
+            )
+            failover = Failover(name, bus, services[backup].bus, after, backup)
+            tasks.add(lincot.FailoverWorker(queue, configs[name], failover))
+            bus = failover.bus
+        tasks.add(lincot.LincotWorker(queue, configs[name], bus, settings[name]))
+    return tasks, services[names[0]].bus
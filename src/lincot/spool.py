@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Disk-backed store-and-forward spool for positions recorded while offline.
+
+PyTAK tears every worker down when the TAK connection fails and rebuilds them
+after a backoff. Meanwhile an ``OfflineRecorder`` follows the position bus of
+the existing position service and appends each fix to a ``Spool``; once
+reconnected, ``SpoolWorker`` replays the missed track at SPOOL_DRAIN_RATE
+events per second.
+
+A spool is a directory of fixed-size, memory-mapped segment files. Each starts
+with a 16-byte header (magic, version, record size, records written, records
+drained) followed by 48-byte little-endian records::
+
+    time f64, lat f64, lon f64, hae f32, ce f32, le f32, course f32, speed f32,
+    crc32 u32
+
+Reopening a spool reads only the segment headers, so crash recovery is
+O(segments). Full segments rotate, drained ones are deleted, and the oldest is
+dropped when SPOOL_MAX_BYTES would be exceeded.
+
+A record handed out with ``take`` is only marked drained on disk once it is
+``acknowledge``-d, i.e. actually sent; ``rewind`` hands out every
+unacknowledged record again, so a connection lost mid-backfill loses nothing.
+"""
+
+import asyncio
+import datetime
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+import zlib
+from configparser import SectionProxy
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+import lincot
+from lincot.metrics import SPOOL_DRAINED, SPOOL_DROPPED, SPOOL_PENDING, SPOOL_RECORDED
+from lincot.position import fix_time
+from lincot.suppression import MovementFilter
+
+MAGIC: bytes = b"LCSP"
+VERSION: int = 1
+HEADER = struct.Struct("<4sHHII")
+RECORD = struct.Struct("<dddfffff")
+RECORD_SIZE: int = RECORD.size + 4  # CRC-32 of the packed fields
+SEGMENT_SUFFIX: str = ".seg"
+
+_COUNT_OFFSET = 8
+_DRAINED_OFFSET = 12
+_U32 = struct.Struct("<I")
+_NAN = float("nan")
+_LOGGER = logging.getLogger(__name__)
+
+_SPOOLS: Dict[str, "Spool"] = {}
+_RECORDERS: Dict[str, "OfflineRecorder"] = {}
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _NAN
+
+
+def _horizontal_error(tpv) -> float:
+    if tpv.get("eph") is not None:
+        return _number(tpv.get("eph"))
+    return math.hypot(_number(tpv.get("epx")), _number(tpv.get("epy")))
+
+
+def encode_record(tpv, now: Optional[float] = None) -> Optional[bytes]:
+    """Pack a TPV into one spool record; None without a position."""
+    lat = _number(tpv.get("lat"))
+    lon = _number(tpv.get("lon"))
+    if math.isnan(lat) or math.isnan(lon):
+        return None
+    taken = fix_time(tpv)
+    if taken is None:
+        taken = time.time() if now is None else now
+    payload = RECORD.pack(
+        taken,
+        lat,
+        lon,
+        _number(tpv.get("altHAE", tpv.get("alt"))),
+        _horizontal_error(tpv),
+        _number(tpv.get("epv")),
+        _number(tpv.get("track")),
+        _number(tpv.get("speed")),
+    )
+    return payload + _U32.pack(zlib.crc32(payload))
+
+
+def decode_record(data: bytes) -> Optional[dict]:
+    """Unpack a spool record into a TPV; None if its checksum does not match."""
+    payload = data[: RECORD.size]
+    if _U32.unpack_from(data, RECORD.size)[0] != zlib.crc32(payload):
+        return None
+    taken, lat, lon, hae, ce, le, course, speed = RECORD.unpack(payload)
+    stamp = datetime.datetime.fromtimestamp(taken, datetime.timezone.utc)
+    tpv = {
+        "class": "TPV",
+        "mode": 2 if math.isnan(hae) else 3,
+        "time": stamp.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "lat": lat,
+        "lon": lon,
+    }
+    for key, value in (
+        ("altHAE", hae),
+        ("eph", ce),
+        ("epv", le),
+        ("track", course),
+        ("speed", speed),
+    ):
+        if not math.isnan(value):
+            # Stored as float32: drop the digits float32 does not carry.
+            tpv[key] = float(f"{value:.7g}")
+    return tpv
+
+
+class Segment:
+    """One memory-mapped spool segment file."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self, path: str, mm: mmap.mmap, capacity: int, count: int, drained: int
+    ) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.count = count
+        self.drained = drained
+        self._mm = mm
+
+    @classmethod
+    def create(cls, path: str, capacity: int) -> "Segment":
+        """Create and map a new, empty segment holding ``capacity`` records."""
+        size = HEADER.size + capacity * RECORD_SIZE
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(mm, 0, MAGIC, VERSION, RECORD_SIZE, 0, 0)
+        return cls(path, mm, capacity, 0, 0)
+
+    @classmethod
+    def open(cls, path: str) -> Optional["Segment"]:
+        """Map an existing segment from its header; None if it is not valid."""
+        fd = os.open(path, os.O_RDWR)
+        try:
+            size = os.fstat(fd).st_size
+            if size < HEADER.size:
+                return None
+            mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, version, record_size, count, drained = HEADER.unpack_from(mm, 0)
+        capacity = (size - HEADER.size) // RECORD_SIZE
+        if (
+            (magic, version, record_size) != (MAGIC, VERSION, RECORD_SIZE)
+            or count > capacity
+            or drained > count
+        ):
+            mm.close()
+            return None
+        return cls(path, mm, capacity, count, drained)
+
+    @property
+    def full(self) -> bool:
+        """True when no more records fit."""
+        return self.count >= self.capacity
+
+    @property
+    def pending(self) -> int:
+        """Records written but not yet drained."""
+        return self.count - self.drained
+
+    def append(self, record: bytes) -> None:
+        """Write a record, then publish it by bumping the header count."""
+        offset = HEADER.size + self.count * RECORD_SIZE
+        self._mm[offset:offset + RECORD_SIZE] = record
+        self.count += 1
+        _U32.pack_into(self._mm, _COUNT_OFFSET, self.count)
+
+    def read(self, index: int) -> Optional[dict]:
+        """Decode record ``index``; None if it is corrupt."""
+        offset = HEADER.size + index * RECORD_SIZE
+        return decode_record(self._mm[offset:offset + RECORD_SIZE])
+
+    def advance(self) -> None:
+        """Mark the oldest pending record as drained."""
+        self.drained += 1
+        _U32.pack_into(self._mm, _DRAINED_OFFSET, self.drained)
+
+    def close(self) -> None:
+        """Flush and unmap the segment."""
+        if not self._mm.closed:
+            self._mm.flush()
+            self._mm.close()
+
+    def remove(self) -> None:
+        """Unmap and delete the segment file."""
+        self.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class Spool:
+    """Append-only store of position records in rotating segment files."""
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = lincot.DEFAULT_SPOOL_SEGMENT_BYTES,
+        max_bytes: int = lincot.DEFAULT_SPOOL_MAX_BYTES,
+    ) -> None:
+        self.directory = directory
+        self.capacity = max(1, (segment_bytes - HEADER.size) // RECORD_SIZE)
+        segment_size = HEADER.size + self.capacity * RECORD_SIZE
+        self.max_segments = max(2, max_bytes // segment_size)
+        self.segments: List[Segment] = []
+        self._next_sequence = 0
+        # Records handed out past the on-disk cursor, True once acknowledged.
+        self._inflight: Deque[bool] = deque()
+        self._base: int = 0  # ticket number of the first in-flight record
+        self._generation: int = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._recover()
+
+    @classmethod
+    def from_config(
+        cls, config: Union[dict, SectionProxy, None]
+    ) -> Optional["Spool"]:
+        """Open the spool in SPOOL_DIR, or None when spooling is disabled."""
+        config = config or {}
+        directory = str(config.get("SPOOL_DIR") or "").strip()
+        if not directory:
+            return None
+        return cls(
+            directory,
+            segment_bytes=int(
+                config.get("SPOOL_SEGMENT_BYTES") or lincot.DEFAULT_SPOOL_SEGMENT_BYTES
+            ),
+            max_bytes=int(
+                config.get("SPOOL_MAX_BYTES") or lincot.DEFAULT_SPOOL_MAX_BYTES
+            ),
+        )
+
+    def _recover(self) -> None:
+        names = sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+            and name[: -len(SEGMENT_SUFFIX)].isdigit()
+        )
+        for name in names:
+            path = os.path.join(self.directory, name)
+            self._next_sequence = int(name[: -len(SEGMENT_SUFFIX)]) + 1
+            try:
+                segment = Segment.open(path)
+            except (OSError, ValueError):
+                segment = None
+            if segment is None:
+                _LOGGER.warning("Discarding unreadable spool segment %s", path)
+                os.unlink(path)
+                continue
+            if segment.pending:
+                self.segments.append(segment)
+            else:
+                segment.remove()
+
+    @property
+    def pending(self) -> int:
+        """Records waiting to be drained."""
+        return sum(segment.pending for segment in self.segments)
+
+    def _rotate(self) -> None:
+        while len(self.segments) >= self.max_segments:
+            self.rewind()
+            oldest = self.segments.pop(0)
+            SPOOL_DROPPED.inc(oldest.pending)
+            _LOGGER.warning(
+                "Spool %s full, dropping %d oldest records",
+                self.directory,
+                oldest.pending,
+            )
+            oldest.remove()
+        name = f"{self._next_sequence:010d}{SEGMENT_SUFFIX}"
+        self._next_sequence += 1
+        self.segments.append(
+            Segment.create(os.path.join(self.directory, name), self.capacity)
+        )
+
+    def append(self, tpv) -> bool:
+        """Record a fix; False if it has no position."""
+        record = encode_record(tpv)
+        if record is None:
+            return False
+        if not self.segments or self.segments[-1].full:
+            self._rotate()
+        self.segments[-1].append(record)
+        SPOOL_RECORDED.inc()
+        return True
+
+    def _retire_head(self) -> bool:
+        head = self.segments[0]
+        if head.pending or (len(self.segments) == 1 and not head.full):
+            return False
+        self.segments.pop(0).remove()
+        return True
+
+    def _locate(self, offset: int) -> Optional[Tuple[Segment, int]]:
+        for segment in self.segments:
+            if offset < segment.pending:
+                return segment, segment.drained + offset
+            offset -= segment.pending
+        return None
+
+    def _flush(self) -> None:
+        # Move the on-disk cursor over every leading acknowledged record.
+        while self._inflight and self._inflight[0]:
+            self._inflight.popleft()
+            self._base += 1
+            self.segments[0].advance()
+            self._retire_head()
+
+    def peek(self) -> Optional[dict]:
+        """The oldest fix not handed out yet, skipping corrupt records."""
+        while True:
+            found = self._locate(len(self._inflight))
+            if found is None:
+                while self.segments and self._retire_head():
+                    pass
+                return None
+            segment, index = found
+            tpv = segment.read(index)
+            if tpv is not None:
+                return tpv
+            _LOGGER.warning("Skipping corrupt record in %s", segment.path)
+            self._inflight.append(True)
+            self._flush()
+
+    def take(self) -> Optional[Tuple[dict, Tuple[int, int]]]:
+        """Hand out the fix ``peek`` returns, with the ticket to acknowledge it."""
+        tpv = self.peek()
+        if tpv is None:
+            return None
+        ticket = (self._generation, self._base + len(self._inflight))
+        self._inflight.append(False)
+        return tpv, ticket
+
+    def acknowledge(self, ticket: Tuple[int, int]) -> None:
+        """Mark a handed-out fix as sent; drained on disk once all before it are."""
+        generation, number = ticket
+        position = number - self._base
+        if generation != self._generation or not 0 <= position < len(self._inflight):
+            return  # handed out before a rewind; it will be handed out again
+        self._inflight[position] = True
+        SPOOL_DRAINED.inc()
+        self._flush()
+
+    def rewind(self) -> None:
+        """Forget unacknowledged hand-outs so ``peek`` returns them again."""
+        self._inflight.clear()
+        self._base = 0
+        self._generation += 1
+
+    def advance(self) -> None:
+        """Mark the fix returned by ``peek`` as sent."""
+        taken = self.take()
+        if taken is not None:
+            self.acknowledge(taken[1])
+
+    def close(self) -> None:
+        """Unmap every segment."""
+        for segment in self.segments:
+            segment.close()
+        self.segments.clear()
+
+
+def transport_failed(tasks) -> bool:
+    """True when one of the finished connection ``tasks`` failed on the network.
+
+    PyTAK closes its workers both after a transport error and on a normal
+    shutdown; only the former is an outage worth spooling through.
+    """
+    for task in tasks:
+        if task.done() and not task.cancelled():
+            if isinstance(task.exception(), OSError):
+                return True
+    return False
+
+
+class OfflineRecorder:
+    """Keep recording position into a spool while the TAK workers are down.
+
+    The recorder never opens a receiver of its own: it follows the bus of the
+    process's position service. A service that outlives the connection (with
+    FANOUT_URLS) just keeps publishing; one torn down with the connection is run
+    again by the recorder until the connection returns.
+    """
+
+    def __init__(self, spool: Spool, config: Union[dict, SectionProxy]) -> None:
+        self.spool = spool
+        self.config = config
+        self.service: Optional["lincot.PositionService"] = None
+        self._task: Optional[asyncio.Future] = None
+
+    @property
+    def running(self) -> bool:
+        """True while recording."""
+        return self._task is not None and not self._task.done()
+
+    def follow(self, service: "lincot.PositionService") -> None:
+        """Record the fixes ``service`` publishes on its bus."""
+        self.service = service
+
+    async def record(self) -> None:
+        """Append every fix published on the followed bus after the outage began."""
+        service = self.service
+        if service is None:
+            _LOGGER.warning("No position service to record from yet")
+            return
+        movement_filter = MovementFilter.from_config(self.config)
+        acquiring: Optional[asyncio.Future] = None
+        latest = service.bus.latest()
+        seq = latest.seq if latest else 0
+        try:
+            while True:
+                if acquiring is None and not service.running:
+                    # Gone with the connection: keep the same receiver reading.
+                    acquiring = asyncio.ensure_future(service.run())
+                fix = await service.bus.wait(seq, service.poll_interval)
+                if fix is None:
+                    continue
+                seq = fix.seq
+                now = time.monotonic()
+                if movement_filter and not movement_filter.should_send(fix.tpv, now):
+                    continue
+                self.spool.append(fix.tpv)
+                if movement_filter:
+                    movement_filter.mark_sent(fix.tpv, now)
+        finally:
+            if acquiring is not None:
+                acquiring.cancel()
+
+    def start(self) -> None:
+        """Start recording in the background, if not already."""
+        if not self.running:
+            _LOGGER.info(
+                "TAK connection down, spooling positions to %s", self.spool.directory
+            )
+            self._task = asyncio.ensure_future(self.record())
+
+    def stop(self) -> None:
+        """Stop recording."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def get_spool(config: Union[dict, SectionProxy, None]) -> Optional[Spool]:
+    """Return the process-wide spool for SPOOL_DIR, opening it on first use."""
+    config = config or {}
+    directory = str(config.get("SPOOL_DIR") or "").strip()
+    if not directory:
+        return None
+    spool = _SPOOLS.get(directory)
+    if spool is None:
+        spool = _SPOOLS[directory] = Spool.from_config(config)
+        SPOOL_PENDING.set_function(lambda: spool.pending)
+    return spool
+
+
+def get_recorder(spool: Spool, config: Union[dict, SectionProxy]) -> OfflineRecorder:
+    """Return the process-wide offline recorder for ``spool``."""
+    recorder = _RECORDERS.get(spool.directory)
+    if recorder is None:
+        recorder = _RECORDERS[spool.directory] = OfflineRecorder(spool, config)
+    recorder.config = config
+    return recorder
+
+
+def close_spools() -> None:
+    """Stop offline recording and unmap every open spool."""
+    for recorder in _RECORDERS.values():
+        recorder.stop()
+    _RECORDERS.clear()
+    for spool in _SPOOLS.values():
+        spool.close()
+    _SPOOLS.clear()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Dead-reckoning event suppression for LINCOT."""
+
+import math
+import time
+from configparser import SectionProxy
+from typing import NamedTuple, Optional, Tuple, Union
+
+import lincot
+
+EARTH_RADIUS_M: float = 6371008.8
+
+# Below this speed (m/s) gpsd's track is mostly noise, so heading is ignored.
+HEADING_MIN_SPEED: float = 1.0
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance in meters."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    hav = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(
+        dlmb / 2
+    ) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(hav)))
+
+
+def project(
+    lat: float, lon: float, course: float, distance: float
+) -> Tuple[float, float]:
+    """Position reached from lat/lon after ``distance`` meters on ``course`` deg."""
+    if distance <= 0:
+        return lat, lon
+    delta = distance / EARTH_RADIUS_M
+    theta = math.radians(course)
+    phi1 = math.radians(lat)
+    lmb1 = math.radians(lon)
+    phi2 = math.asin(
+        math.sin(phi1) * math.cos(delta)
+        + math.cos(phi1) * math.sin(delta) * math.cos(theta)
+    )
+    lmb2 = lmb1 + math.atan2(
+        math.sin(theta) * math.sin(delta) * math.cos(phi1),
+        math.cos(delta) - math.sin(phi1) * math.sin(phi2),
+    )
+    return math.degrees(phi2), (math.degrees(lmb2) + 540) % 360 - 180
+
+
+def heading_delta(first: float, second: float) -> float:
+    """Smallest absolute difference between two headings, in degrees."""
+    delta = abs(first - second) % 360
+    return 360 - delta if delta > 180 else delta
+
+
+def _float(value, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class _Sent(NamedTuple):
+    lat: float
+    lon: float
+    course: float
+    speed: float
+    at: float
+
+
+class MovementFilter:
+    """Suppress reports that a receiver could already dead-reckon.
+
+    The last sent position is projected forward along its course and speed; a
+    new fix is sent only when it strays from that projection by more than
+    ``distance`` meters, when its heading changes by more than ``heading``
+    degrees, or when nothing has been sent for ``max_silence`` seconds.
+    """
+
+    def __init__(
+        self,
+        distance: float = 0.0,
+        heading: float = 0.0,
+        max_silence: float = lincot.DEFAULT_SUPPRESS_MAX_SILENCE,
+    ) -> None:
+        self.distance = distance
+        self.heading = heading
+        self.max_silence = max_silence
+        self.sent: int = 0
+        self.suppressed: int = 0
+        self._last: Optional[_Sent] = None
+
+    @classmethod
+    def from_config(
+        cls, config: Union[dict, SectionProxy, None]
+    ) -> Optional["MovementFilter"]:
+        """Build a filter from SUPPRESS_* settings, or None when disabled."""
+        config = config or {}
+        distance = _float(config.get("SUPPRESS_DISTANCE"))
+        heading = _float(config.get("SUPPRESS_HEADING"))
+        if distance <= 0 and heading <= 0:
+            return None
+        max_silence = _float(
+            config.get("SUPPRESS_MAX_SILENCE"), lincot.DEFAULT_SUPPRESS_MAX_SILENCE
+        )
+        return cls(distance, heading, max_silence)
+
+    def _moved(self, last: _Sent, lat: float, lon: float, now: float) -> bool:
+        if self.distance <= 0:
+            return False
+        expected = project(
+            last.lat, last.lon, last.course, last.speed * (now - last.at)
+        )
+        return distance_m(expected[0], expected[1], lat, lon) > self.distance
+
+    def _turned(self, last: _Sent, course: float, speed: float) -> bool:
+        if self.heading <= 0 or max(speed, last.speed) < HEADING_MIN_SPEED:
+            return False
+        return heading_delta(last.course, course) > self.heading
+
+    @staticmethod
+    def _position(tpv: dict) -> Optional[Tuple[float, float, float, float]]:
+        lat = tpv.get("lat")
+        lon = tpv.get("lon")
+        if lat is None or lon is None:
+            return None
+        return (
+            float(lat),
+            float(lon),
+            _float(tpv.get("track")),
+            _float(tpv.get("speed")),
+        )
+
+    def should_send(self, tpv: dict, now: Optional[float] = None) -> bool:
+        """Decide whether ``tpv`` must be reported.
+
+        Nothing is recorded here; call :meth:`mark_sent` once the report has
+        actually been queued, so a failed encode or enqueue is retried.
+        """
+        position = self._position(tpv)
+        if position is None:
+            return True
+        now = time.monotonic() if now is None else now
+        lat, lon, course, speed = position
+
+        last = self._last
+        if (
+            last is None
+            or now - last.at >= self.max_silence
+            or self._moved(last, lat, lon, now)
+            or self._turned(last, course, speed)
+        ):
+            return True
+        self.suppressed += 1
+        return False
+
+    def mark_sent(self, tpv: dict, now: Optional[float] = None) -> None:
+        """Record ``tpv`` as the last report a receiver has seen."""
+        position = self._position(tpv)
+        if position is None:
+            return
+        now = time.monotonic() if now is None else now
+        self._last = _Sent(*position, now)
+        self.sent += 1
+
+    def stats(self) -> dict:
+        """Counters of sent and suppressed reports."""
+        return {"sent": self.sent, "suppressed": self.suppressed}
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Native TAK Protocol Version 1 (protobuf) encoder.
+
+Writes ``TakMessage``/``CotEvent`` protobufs directly instead of serializing
+XML and converting it with takproto. The field mapping follows
+``takproto.xml2message``: contact, track, status, takv, __group and
+precisionlocation are typed fields; every other detail child (remarks, link,
+_flow-tags_, ...) is concatenated into ``xmlDetail``.
+"""
+
+import datetime
+import ipaddress
+import struct
+import xml.etree.ElementTree as ET
+from configparser import SectionProxy
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from xml.etree.ElementTree import Element
+
+import pytak
+
+from lincot.template import escape_attrib, escape_text
+
+MESH: str = "mesh"
+STREAM: str = "stream"
+MESH_HEADER: bytes = b"\xbf\x01\xbf"
+STREAM_HEADER: bytes = b"\xbf"
+
+KNOWN_DETAIL = ("contact", "__group", "precisionlocation", "status", "takv", "track")
+
+_VARINT, _FIXED64, _LENGTH = 0, 1, 2
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def enabled(config: Union[dict, SectionProxy, None]) -> bool:
+    """Return True when TAK_PROTO asks for protobuf output."""
+    config = config or {}
+    try:
+        return int(config.get("TAK_PROTO") or 0) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def wire_format(config: Union[dict, SectionProxy, None]) -> str:
+    """Mesh framing for multicast COT_URLs, stream framing otherwise (as PyTAK)."""
+    config = config or {}
+    try:
+        host, _ = pytak.parse_url(config.get("COT_URL") or pytak.DEFAULT_COT_URL)
+        return MESH if ipaddress.ip_address(host).is_multicast else STREAM
+    except ValueError:
+        return STREAM
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+@lru_cache(maxsize=64)
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _string(field: int, value: Optional[str]) -> bytes:
+    if not value:
+        return b""
+    data = value.encode("utf-8")
+    return _key(field, _LENGTH) + _varint(len(data)) + data
+
+
+def _double(field: int, value: Optional[float]) -> bytes:
+    if not value:
+        return b""
+    return _key(field, _FIXED64) + struct.pack("<d", value)
+
+
+def _uint(field: int, value: Optional[int]) -> bytes:
+    # Unsigned fields: a negative battery or pre-1970 time is sent as unset (0).
+    if not value or value < 0:
+        return b""
+    return _key(field, _VARINT) + _varint(value)
+
+
+def _message(field: int, payload: bytes) -> bytes:
+    if not payload:
+        return b""
+    return _key(field, _LENGTH) + _varint(len(payload)) + payload
+
+
+def _number(value) -> Optional[float]:
+    """takproto's ``float(attr) if attr`` without failing on junk."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _millis(moment: datetime.datetime) -> int:
+    return int(moment.timestamp() * 1000)
+
+
+def _parse_time(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    for fmt in (pytak.W3C_XML_DATETIME, "%Y-%m-%dT%H:%M:%SZ"):
+        try:
+            moment = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return _millis(moment.replace(tzinfo=datetime.timezone.utc))
+    return None
+
+
+def frame(message: bytes, wire: str = STREAM) -> bytes:
+    """Prefix a serialized TakMessage with the mesh or stream header."""
+    if wire == MESH:
+        return MESH_HEADER + message
+    return STREAM_HEADER + _varint(len(message)) + message
+
+
+def ensure_framed(data: bytes, wire: str = STREAM) -> Optional[bytes]:
+    """``data`` as a framed TakMessage; XML CoT (e.g. PyTAK's hello) is encoded.
+
+    Returns None for anything that is neither, so it never reaches a protobuf
+    stream unframed.
+    """
+    if data.startswith(STREAM_HEADER):
+        return data
+    try:
+        return encode_event(ET.fromstring(data), wire)
+    except ET.ParseError:
+        return None
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Decode the varint at ``pos``; return it and the position after it."""
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(data: bytes) -> Iterator[Tuple[int, int, object]]:
+    """Yield ``(field, wire type, value)`` for each field of a serialized message."""
+    pos = 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        wire_type = key & 7
+        if wire_type == _VARINT:
+            value, pos = read_varint(data, pos)
+        elif wire_type == _FIXED64:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == _LENGTH:
+            length, pos = read_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        elif wire_type == 5:  # fixed32
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield key >> 3, wire_type, value
+
+
+def unframe(data: bytes) -> bytes:
+    """Strip the mesh or stream header from a framed TakMessage."""
+    if data.startswith(MESH_HEADER):
+        return data[len(MESH_HEADER):]
+    if data.startswith(STREAM_HEADER):
+        length, pos = read_varint(data, len(STREAM_HEADER))
+        return data[pos:pos + length]
+    raise ValueError("Not a TAK Protocol Version 1 message")
+
+
+def event_uid(data: bytes) -> Optional[str]:
+    """Return the CotEvent uid of a framed TakMessage, or None."""
+    try:
+        for field, wire_type, value in _fields(unframe(data)):
+            if field != 2 or wire_type != _LENGTH:
+                continue
+            for event_field, event_wire_type, uid in _fields(value):
+                if event_field == 5 and event_wire_type == _LENGTH:
+                    return uid.decode("utf-8")
+    except (IndexError, ValueError):
+        return None
+    return None
+
+
+def _typed_detail(elements: Iterable[Element]) -> List[bytes]:
+    """Detail fields 2-7 from the first element of each known tag."""
+    first = {}
+    for element in elements:
+        if element.tag in KNOWN_DETAIL and element.tag not in first:
+            first[element.tag] = element
+    fields = [b""] * 8
+    contact = first.get("contact")
+    if contact is not None:
+        fields[2] = _message(
+            2,
+            _string(1, contact.get("endpoint")) + _string(2, contact.get("callsign")),
+        )
+    group = first.get("__group")
+    if group is not None:
+        fields[3] = _message(
+            3, _string(1, group.get("name")) + _string(2, group.get("role"))
+        )
+    location = first.get("precisionlocation")
+    if location is not None:
+        source = _string(1, location.get("geopointsrc"))
+        fields[4] = _message(4, source + _string(2, location.get("altsrc")))
+    status = first.get("status")
+    if status is not None:
+        try:
+            battery = int(status.get("battery") or 0)
+        except ValueError:
+            battery = 0
+        fields[5] = _message(5, _uint(1, battery))
+    takv = first.get("takv")
+    if takv is not None:
+        names = ("device", "platform", "os", "version")
+        fields[6] = _message(
+            6,
+            b"".join(
+                _string(number, takv.get(name))
+                for number, name in enumerate(names, 1)
+            ),
+        )
+    track = first.get("track")
+    if track is not None:
+        fields[7] = _message(
+            7,
+            _double(1, _number(track.get("speed")))
+            + _double(2, _number(track.get("course"))),
+        )
+    return fields
+
+
+def _unknown_xml(elements: Iterable[Element]) -> str:
+    return "".join(
+        ET.tostring(element).strip().decode()
+        for element in elements
+        if element.tag not in KNOWN_DETAIL
+    )
+
+
+def _cot_event(  # pylint: disable=too-many-arguments
+    *,
+    cot_type: str,
+    access: Optional[str],
+    uid: str,
+    send: Optional[int],
+    start: Optional[int],
+    stale: Optional[int],
+    how: str,
+    point: Iterable[Optional[float]],
+    detail: bytes,
+) -> bytes:
+    lat, lon, hae, ce, le = point
+    event = b"".join(
+        (
+            _string(1, cot_type),
+            _string(2, access),
+            _string(5, uid),
+            _uint(6, send),
+            _uint(7, start),
+            _uint(8, stale),
+            _string(9, how),
+            _double(10, lat),
+            _double(11, lon),
+            _double(12, hae),
+            _double(13, ce),
+            _double(14, le),
+            _message(15, detail),
+        )
+    )
+    return _message(2, event)
+
+
+def encode_event(event: Element, wire: str = STREAM) -> bytes:
+    """Encode a CoT ``event`` Element as a framed TAK Protocol v1 message."""
+    point = event.find("point")
+    detail = event.find("detail")
+    detail_bytes = b""
+    if detail is not None:
+        children = list(detail)
+        typed = _typed_detail(children)
+        detail_bytes = _string(1, _unknown_xml(children)) + b"".join(typed[2:])
+    return frame(
+        _cot_event(
+            cot_type=event.get("type"),
+            access=event.get("access"),
+            uid=event.get("uid"),
+            send=_parse_time(event.get("time")),
+            start=_parse_time(event.get("start")),
+            stale=_parse_time(event.get("stale")),
+            how=event.get("how"),
+            point=(
+                [_number(point.get(name)) for name in ("lat", "lon", "hae", "ce", "le")]
+                if point is not None
+                else [None] * 5
+            ),
+            detail=detail_bytes,
+        ),
+        wire,
+    )
+
+
+@lru_cache(maxsize=1)
+def _flow_tag_key() -> str:
+    return next(iter(pytak.cot_flow_tags().attrib))
+
+
+def encode_position(
+    parts: dict,
+    wire: str = STREAM,
+    now: Optional[datetime.datetime] = None,
+) -> bytes:
+    """Encode resolved position values (see ``functions._position_parts``).
+
+    Produces the same message as ``encode_event(position_to_cot_xml(...))``
+    without building or serializing an XML tree.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    if parts.get("fix_time") is not None:
+        taken = _EPOCH + datetime.timedelta(seconds=parts["fix_time"])
+    else:
+        taken = now
+    flow_time = now.strftime(pytak.W3C_XML_DATETIME)
+    stale = taken + datetime.timedelta(seconds=int(parts["stale"]))
+    children = parts["children"]
+    typed = _typed_detail(children)
+    xml_detail = b"".join(
+        (
+            b"<_flow-tags_ ",
+            escape_attrib(_flow_tag_key()),
+            b'="',
+            flow_time.encode("ascii"),
+            b'" /><remarks>',
+            escape_text(parts["remarks"]),
+            b"</remarks>",
+            _unknown_xml(children).encode("utf-8"),
+            b'<link url="',
+            escape_attrib(parts["link_url"]),
+            b'" relation="r-u" type="',
+            escape_attrib(parts["cot_type"]),
+            b'" />',
+        )
+    ).decode("utf-8")
+    # Our own contact and track come first in <detail>, so they win.
+    contact = _message(2, _string(2, parts["callsign"]))
+    track = _message(
+        7, _double(1, _number(parts["speed"])) + _double(2, _number(parts["course"]))
+    )
+    detail = (
+        _string(1, xml_detail) + contact + typed[3] + typed[4] + typed[5] + typed[6]
+        + track
+    )
+    send = _millis(taken)
+    return frame(
+        _cot_event(
+            cot_type=parts["cot_type"],
+            access=parts["access"],
+            uid=parts["uid"],
+            send=send,
+            start=send,
+            stale=_millis(stale),
+            how="m-g",
+            point=(
+                _number(pytak.truncate_float(parts["lat"], 4)),
+                _number(pytak.truncate_float(parts["lon"], 4)),
+                _number(str(parts["hae"])),
+                _number(str(parts["ce"])),
+                _number(str(parts["le"])),
+            ),
+            detail=detail,
+        ),
+        wire,
+    )
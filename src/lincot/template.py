@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Position event assembly and pre-compiled CoT event templates.
+
+A template is built once per static identity (uid, type, callsign, link...) by
+serializing a real event whose per-fix values are sentinels, then splitting the
+bytes around them. Rendering only splices the per-fix values back in, giving the
+same bytes as ``pytak.serialize_cot(..., trailing_newline=True)``.
+"""
+
+import functools
+import re
+import xml.etree.ElementTree as ET
+from typing import Iterable, List, Mapping, Optional, Sequence, Tuple
+from xml.etree.ElementTree import Element
+
+import pytak
+
+POINT_FIELDS: Tuple[str, ...] = ("lat", "lon", "hae", "ce", "le")
+
+_SENTINEL_RE = re.compile(rb"\x00(\w+)\x00")
+_ATTRIB_SPECIALS = re.compile(r"[&<>\"\r\n\t]")
+_CDATA_SPECIALS = re.compile(r"[&<>]")
+
+
+def _sentinel(name: str) -> str:
+    return f"\x00{name}\x00"
+
+
+def position_event(  # pylint: disable=too-many-arguments
+    *,
+    uid: str,
+    cot_type: str,
+    stale: int,
+    access: Optional[str],
+    point: Element,
+    course: str,
+    speed: str,
+    callsign: str,
+    remarks: str,
+    children: Iterable[Element],
+    link_url: str,
+) -> Element:
+    """Assemble a LINCOT position event from resolved values."""
+    track = Element("track")
+    track.set("course", course)
+    track.set("speed", speed)
+
+    contact = Element("contact")
+    contact.set("callsign", callsign)
+
+    link = Element("link")
+    link.set("url", link_url)
+    link.set("relation", "r-u")
+    link.set("type", cot_type)
+
+    detail = pytak.cot_detail(track, contact)
+    pytak.add_remarks(detail, [remarks])
+    for child in children:
+        detail.append(child)
+    detail.append(link)
+
+    return pytak.cot_event(
+        uid=uid,
+        cot_type=cot_type,
+        stale=stale,
+        point=point,
+        detail=detail,
+        access=access,
+    )
+
+
+def escape_attrib(value: str) -> bytes:
+    """Escape and encode an attribute value exactly as ElementTree does."""
+    if _ATTRIB_SPECIALS.search(value):
+        # Rare: let ElementTree escape it, so every Python version matches.
+        element = Element("x")
+        element.set("v", value)
+        return ET.tostring(element)[6:-4]
+    return value.encode("ascii", "xmlcharrefreplace")
+
+
+def escape_text(value: str) -> bytes:
+    """Escape and encode element text exactly as ElementTree does."""
+    if _CDATA_SPECIALS.search(value):
+        element = Element("x")
+        element.text = value
+        return ET.tostring(element)[3:-4]
+    return value.encode("ascii", "xmlcharrefreplace")
+
+
+def is_template_safe(children: Sequence[Element]) -> bool:
+    """Namespaced detail children change the root element, so can't be spliced."""
+    for child in children:
+        for node in child.iter():
+            if not isinstance(node.tag, str) or node.tag.startswith("{"):
+                return False
+            if any(key.startswith("{") for key in node.attrib):
+                return False
+    return True
+
+
+class CotTemplate:
+    """Pre-serialized static byte segments of a position event."""
+
+    __slots__ = ("segments", "fields")
+
+    def __init__(self, segments: Sequence[bytes], fields: Sequence[str]) -> None:
+        self.segments = tuple(segments)
+        self.fields = tuple(fields)
+
+    @classmethod
+    def from_event(cls, event: Element) -> "CotTemplate":
+        """Split a serialized sentinel event into static segments and fields."""
+        parts = _SENTINEL_RE.split(pytak.serialize_cot(event, trailing_newline=True))
+        segments = parts[0::2]
+        fields = [name.decode() for name in parts[1::2]]
+        return cls(segments, fields)
+
+    def render(self, values: Mapping[str, bytes]) -> bytes:
+        """Splice encoded per-fix values into the static segments."""
+        segments = self.segments
+        out: List[bytes] = [segments[0]]
+        for index, name in enumerate(self.fields, 1):
+            out.append(values[name])
+            out.append(segments[index])
+        return b"".join(out)
+
+
+@functools.lru_cache(maxsize=1024)  # one per uid; fleet simulations render many
+def compile_position_template(  # pylint: disable=too-many-arguments
+    uid: str,
+    cot_type: str,
+    stale: int,
+    access: Optional[str],
+    callsign: str,
+    link_url: str,
+) -> CotTemplate:
+    """Build (once per static identity) the template for position events."""
+    point = pytak.cot_point(lat=0.0, lon=0.0, hae=0.0, ce=0.0, le=0.0)
+    for name in POINT_FIELDS:
+        point.set(name, _sentinel(name))
+
+    event = position_event(
+        uid=uid,
+        cot_type=cot_type,
+        stale=stale,
+        access=access,
+        point=point,
+        course=_sentinel("course"),
+        speed=_sentinel("speed"),
+        callsign=callsign,
+        remarks=_sentinel("remarks"),
+        children=[],
+        link_url=link_url,
+    )
+    for name in ("time", "start", "stale"):
+        event.set(name, _sentinel(name))
+    flow_tags = event.find("detail/_flow-tags_")
+    if flow_tags is not None:
+        for key in list(flow_tags.attrib):
+            flow_tags.set(key, _sentinel("flow_time"))
+    remarks = event.find("detail/remarks")
+    if remarks is not None:
+        remarks.tail = _sentinel("children")
+    return CotTemplate.from_event(event)
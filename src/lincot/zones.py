@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Adaptive reporting rates from geofence zones and speed bands.
+
+ZONES_FILE is a GeoJSON ``FeatureCollection`` of ``Polygon``/``MultiPolygon``
+features, each with an ``interval`` property (seconds between reports inside
+it)::
+
+    {"type": "Feature",
+     "properties": {"name": "depot", "interval": 600},
+     "geometry": {"type": "Polygon", "coordinates": [[[lon, lat], ...]]}}
+
+Zones are loaded once into a ``ZoneIndex``: a sparse uniform grid whose cells
+list the zones whose bounding box overlaps them, so a lookup only ray-casts the
+few polygons registered in the fix's cell. Where zones overlap, the shortest
+interval wins; outside every zone POLL_INTERVAL applies.
+
+SPEED_BANDS then scales the interval by speed (TPV ``speed``, m/s), e.g.
+``2:0.5, 15:0.2`` halves it from 2 m/s and divides it by five from 15 m/s. The
+result is never below MIN_POLL_INTERVAL.
+"""
+
+import json
+import math
+from configparser import SectionProxy
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import lincot
+from lincot.settings import number
+
+Ring = Tuple[Tuple[float, float], ...]
+
+# Zones spanning more grid cells than this are kept in one list that every
+# lookup checks by bounding box, instead of being registered cell by cell.
+MAX_CELLS_PER_ZONE: int = 1024
+
+_INDEXES: Dict[str, "ZoneIndex"] = {}
+
+
+class Zone(NamedTuple):
+    """One polygon (outer ring plus holes) with its reporting interval."""
+
+    name: str
+    interval: float
+    outer: Ring
+    holes: Tuple[Ring, ...]
+    bbox: Tuple[float, float, float, float]  # min lon, min lat, max lon, max lat
+
+
+def _in_ring(lon: float, lat: float, ring: Ring) -> bool:
+    """Even-odd ray casting; ``ring`` is a sequence of (lon, lat) vertices."""
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y2 > lat) != (y1 > lat) and lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def contains(zone: Zone, lat: float, lon: float) -> bool:
+    """True when lat/lon lies inside ``zone`` and outside its holes."""
+    min_lon, min_lat, max_lon, max_lat = zone.bbox
+    if not (min_lon <= lon <= max_lon and min_lat <= lat <= max_lat):
+        return False
+    if not _in_ring(lon, lat, zone.outer):
+        return False
+    return not any(_in_ring(lon, lat, hole) for hole in zone.holes)
+
+
+def _ring(coordinates, where: str) -> Ring:
+    try:
+        ring = tuple((float(point[0]), float(point[1])) for point in coordinates)
+    except (TypeError, ValueError, IndexError):
+        raise ValueError(f"{where}: invalid coordinates") from None
+    if len(ring) < 3:
+        raise ValueError(f"{where}: a ring needs at least 3 points")
+    return ring
+
+
+def zones_from_geojson(data: dict, where: str = "ZONES_FILE") -> List[Zone]:
+    """Zones from a GeoJSON FeatureCollection (or a single Feature)."""
+    if data.get("type") == "FeatureCollection":
+        features = data.get("features") or []
+    else:
+        features = [data]
+    zones = []
+    for ordinal, feature in enumerate(features):
+        properties = feature.get("properties") or {}
+        name = str(properties.get("name") or f"zone {ordinal}")
+        label = f"{where}: {name}"
+        try:
+            interval = float(properties["interval"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"{label}: needs a numeric 'interval'") from None
+        if interval <= 0:
+            raise ValueError(f"{label}: 'interval' must be positive")
+        geometry = feature.get("geometry") or {}
+        kind = geometry.get("type")
+        if kind == "Polygon":
+            polygons = [geometry.get("coordinates")]
+        elif kind == "MultiPolygon":
+            polygons = geometry.get("coordinates")
+        else:
+            raise ValueError(f"{label}: only Polygon and MultiPolygon are supported")
+        for polygon in polygons or []:
+            if not polygon:
+                raise ValueError(f"{label}: empty polygon")
+            outer = _ring(polygon[0], label)
+            lons = [lon for lon, _ in outer]
+            lats = [lat for _, lat in outer]
+            zones.append(
+                Zone(
+                    name,
+                    interval,
+                    outer,
+                    tuple(_ring(hole, label) for hole in polygon[1:]),
+                    (min(lons), min(lats), max(lons), max(lats)),
+                )
+            )
+    return zones
+
+
+class ZoneIndex:
+    """A uniform grid over zone bounding boxes for cheap point lookups."""
+
+    def __init__(self, zones: Sequence[Zone], cell: Optional[float] = None) -> None:
+        self.zones = list(zones)
+        self.cell = cell or self._cell_size(self.zones)
+        self.cells: Dict[Tuple[int, int], List[Zone]] = {}
+        self.large: List[Zone] = []
+        for zone in self.zones:
+            min_lon, min_lat, max_lon, max_lat = zone.bbox
+            x0, y0 = self._key(min_lon, min_lat)
+            x1, y1 = self._key(max_lon, max_lat)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_CELLS_PER_ZONE:
+                self.large.append(zone)
+                continue
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    self.cells.setdefault((x, y), []).append(zone)
+
+    @staticmethod
+    def _cell_size(zones: Sequence[Zone]) -> float:
+        # About the size of a typical zone, so most span only a few cells.
+        if not zones:
+            return 1.0
+        extents = sorted(
+            max(zone.bbox[2] - zone.bbox[0], zone.bbox[3] - zone.bbox[1])
+            for zone in zones
+        )
+        return max(extents[len(extents) // 2], 1e-5)
+
+    def _key(self, lon: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lon / self.cell), math.floor(lat / self.cell)
+
+    def lookup(self, lat: float, lon: float) -> List[Zone]:
+        """Every zone containing lat/lon."""
+        candidates = self.cells.get(self._key(lon, lat), []) + self.large
+        return [zone for zone in candidates if contains(zone, lat, lon)]
+
+    def interval(self, lat: float, lon: float) -> Optional[float]:
+        """The shortest interval of the zones containing lat/lon, or None."""
+        intervals = [zone.interval for zone in self.lookup(lat, lon)]
+        return min(intervals) if intervals else None
+
+
+def load_zones(path: str) -> ZoneIndex:
+    """Read a GeoJSON zones file into a ZoneIndex."""
+    try:
+        with open(path, encoding="utf-8") as handle:
+            data = json.load(handle)
+    except OSError as exc:
+        raise ValueError(f"ZONES_FILE: cannot read {path}: {exc}") from None
+    except ValueError as exc:
+        raise ValueError(f"ZONES_FILE: {path} is not valid JSON: {exc}") from None
+    if not isinstance(data, dict):
+        raise ValueError(f"ZONES_FILE: {path} is not a GeoJSON object")
+    return ZoneIndex(zones_from_geojson(data))
+
+
+def get_zone_index(path: str) -> ZoneIndex:
+    """Return the process-wide index for ``path``, loading it on first use."""
+    index = _INDEXES.get(path)
+    if index is None:
+        index = _INDEXES[path] = load_zones(path)
+    return index
+
+
+def speed_bands(value) -> Tuple[Tuple[float, float], ...]:
+    """Parse SPEED_BANDS ``speed:factor, ...`` into ascending (speed, factor)."""
+    bands = []
+    for item in str(value or "").split(","):
+        if not item.strip():
+            continue
+        try:
+            speed, factor = (float(part) for part in item.split(":"))
+        except ValueError:
+            raise ValueError(
+                f"SPEED_BANDS: {item.strip()!r} is not 'speed:factor'"
+            ) from None
+        if speed < 0 or factor <= 0:
+            raise ValueError(f"SPEED_BANDS: {item.strip()!r} must be >= 0 and > 0")
+        bands.append((speed, factor))
+    return tuple(sorted(bands))
+
+
+class RatePolicy:
+    """The reporting interval for a fix, from its zone and speed."""
+
+    def __init__(
+        self,
+        base: float,
+        index: Optional[ZoneIndex] = None,
+        bands: Sequence[Tuple[float, float]] = (),
+        minimum: float = lincot.DEFAULT_MIN_POLL_INTERVAL,
+    ) -> None:
+        self.base = base
+        self.index = index
+        self.bands = tuple(sorted(bands))
+        self.minimum = minimum
+
+    @classmethod
+    def from_config(
+        cls, config: Union[dict, SectionProxy, None], base: float
+    ) -> Optional["RatePolicy"]:
+        """A policy from ZONES_FILE / SPEED_BANDS, or None when neither is set."""
+        config = config or {}
+        path = str(config.get("ZONES_FILE") or "").strip()
+        bands = speed_bands(config.get("SPEED_BANDS"))
+        if not path and not bands:
+            return None
+        return cls(
+            base,
+            get_zone_index(path) if path else None,
+            bands,
+            number(
+                config, "MIN_POLL_INTERVAL", lincot.DEFAULT_MIN_POLL_INTERVAL,
+                minimum=0,
+            ),
+        )
+
+    def speed_factor(self, speed) -> float:
+        """The factor of the highest band ``speed`` reaches; 1 below them all."""
+        try:
+            speed = float(speed)
+        except (TypeError, ValueError):
+            return 1.0
+        factor = 1.0
+        for threshold, band_factor in self.bands:
+            if speed < threshold:
+                break
+            factor = band_factor
+        return factor
+
+    def interval(self, tpv: dict) -> float:
+        """Seconds until the report after ``tpv``."""
+        interval = self.base
+        lat, lon = tpv.get("lat"), tpv.get("lon")
+        if self.index is not None and lat is not None and lon is not None:
+            zoned = self.index.interval(float(lat), float(lon))
+            if zoned is not None:
+                interval = zoned
+        return max(self.minimum, interval * self.speed_factor(tpv.get("speed")))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Multi-sample fix aggregation tests."""
+
+import asyncio
+import json
+import math
+
+import pytest
+
+import lincot
+from lincot.aggregate import FixWindow, fuse
+from lincot.gpsd_client import GpsdClient
+from lincot.suppression import distance_m, project
+
+
+def _tpv(lat, lon, second=0, **extra) -> dict:
+    tpv = {
+        "class": "TPV",
+        "mode": 3,
+        "lat": lat,
+        "lon": lon,
+        "time": f"2023-06-14T10:00:{second:02d}.000Z",
+    }
+    tpv.update(extra)
+    return tpv
+
+
+def test_fuse_rejects_no_fix_and_outliers():
+    """A multipath jump and a no-fix report do not move the fused position."""
+    base = (45.0, -122.0)
+    samples = [
+        _tpv(*project(*base, course, 1.5), second, eph=5.0, altHAE=100 + second)
+        for second, course in enumerate((0, 90, 180, 270))
+    ]
+    samples.append(_tpv(*project(*base, 45, 300.0), 4, eph=5.0, altHAE=100.0))
+    samples.append({"class": "TPV", "mode": 1, "time": "2023-06-14T10:00:05.000Z"})
+    fused = fuse(samples)
+    assert distance_m(fused["lat"], fused["lon"], *base) < 0.5
+    assert fused["samples"] == 4
+    assert fused["rejected"] == 1
+    assert fused["time"] == "2023-06-14T10:00:03.000Z"
+    assert fused["altHAE"] == pytest.approx(101.5)
+    # Spread (1.5 m) is below the receiver's own estimate, which is kept.
+    assert fused["eph"] == 5.0
+    assert fused["epv"] == pytest.approx(math.sqrt(1.25))
+
+
+def test_fuse_error_from_spread():
+    """Without receiver estimates, eph is the RMS spread of the samples."""
+    samples = [
+        _tpv(*project(45.0, -122.0, course, 3.0), second)
+        for second, course in enumerate((0, 90, 180, 270))
+    ]
+    assert fuse(samples)["eph"] == pytest.approx(3.0, rel=1e-3)
+    assert "epx" not in fuse(samples + [_tpv(45.0, -122.0, 5, epx=1.0, epy=1.0)])
+
+
+def test_fuse_dead_reckons_moving_receiver():
+    """Samples along a track are projected to the newest epoch, not averaged back."""
+    samples = []
+    position = (45.0, -122.0)
+    for second in range(5):
+        samples.append(_tpv(*position, second, speed=10.0, track=90.0))
+        position = project(*position, 90.0, 10.0)
+    fused = fuse(samples)
+    newest = samples[-1]
+    assert distance_m(fused["lat"], fused["lon"], newest["lat"], newest["lon"]) < 0.1
+    assert fused["rejected"] == 0
+
+
+def test_fuse_across_antimeridian():
+    """Longitudes either side of 180 are averaged across it, not through 0."""
+    samples = [_tpv(0.0, 179.99999, 0), _tpv(0.0, -179.99999, 1)]
+    fused = fuse(samples)
+    assert abs(abs(fused["lon"]) - 180.0) < 1e-5
+
+
+def test_fuse_without_fix_keeps_newest():
+    """A lost fix is still reported as such."""
+    samples = [{"class": "TPV", "mode": 1}, {"class": "TPV", "mode": 0}]
+    assert fuse(samples) is samples[-1]
+    assert fuse([]) is None
+
+
+def test_window_one_sample_per_epoch_and_expiry():
+    """Updates to the same epoch replace each other; old samples age out."""
+    window = FixWindow(10.0, max_samples=3)
+    window.add(_tpv(45.0, -122.0, 0), now=0.0)
+    window.add(_tpv(45.1, -122.0, 0), now=0.1)
+    window.add(_tpv(45.2, -122.0, 1), now=1.0)
+    assert [tpv["lat"] for tpv in window.samples(now=1.0)] == [45.1, 45.2]
+    for second in range(2, 5):
+        window.add(_tpv(45.0, -122.0, second), now=float(second))
+    assert len(window.samples(now=4.0)) == 3
+    assert window.samples(now=13.5)[0]["time"].endswith(":04.000Z")
+
+
+def test_window_disabled_by_default():
+    """FIX_AGGREGATE is opt-in; the window defaults to POLL_INTERVAL."""
+    assert FixWindow.from_config({}, 61) is None
+    window = FixWindow.from_config({"FIX_AGGREGATE": "on"}, 61)
+    assert window.window == 61
+    assert window.max_samples == lincot.DEFAULT_FIX_AGGREGATE_SAMPLES
+
+
+@pytest.mark.asyncio
+async def test_command_burst_is_fused(tmp_path):
+    """With FIX_AGGREGATE, the whole GPS_INFO_CMD burst feeds one fix."""
+    lines = [
+        json.dumps(_tpv(45.0 + lat * 1e-6, -122.0, second, eph=4.0))
+        for second, lat in enumerate((-10, 0, 10, 5000, -5))
+    ]
+    script = tmp_path / "gps.sh"
+    script.write_text(
+        "#!/bin/sh\n" + "".join(f"echo '{line}'\n" for line in lines),
+        encoding="utf-8",
+    )
+    script.chmod(0o755)
+    config = {"GPS_INFO_CMD": str(script), "FIX_AGGREGATE": "true"}
+    service = lincot.PositionService(asyncio.Queue(), config)
+    tpv = await service.acquire()
+    assert tpv["samples"] == 4
+    assert tpv["rejected"] == 1
+    assert tpv["lat"] == pytest.approx(45.0 - 1.25e-6)
+
+
+def test_gpsd_stream_feeds_window():
+    """Every gpsd TPV is offered to the window, not just the newest."""
+    window = FixWindow(60.0)
+    client = GpsdClient()
+    client.on_tpv = window.add
+    for second in range(3):
+        client.handle_line(json.dumps(_tpv(45.0, -122.0, second)).encode() + b"\n")
+    assert len(window.samples()) == 3
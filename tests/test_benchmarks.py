@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Benchmark suite smoke and regression-gate tests."""
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+BENCH = Path(__file__).resolve().parent.parent / "benchmarks" / "bench_cot.py"
+
+
+@pytest.fixture(scope="module")
+def bench():
+    spec = importlib.util.spec_from_file_location("bench_cot", BENCH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_bench_runs_every_case(bench):
+    """Every hot-path case reports every metric without touching the host."""
+    result = bench.run(iterations=20)
+    assert set(result["cases"]) == set(bench.cases())
+    for metrics in result["cases"].values():
+        assert set(metrics) == set(bench.METRICS)
+        assert metrics["events_per_sec"] > 0
+
+
+def test_bench_compare_flags_regressions(bench):
+    """Throughput drops, latency/allocation growth and new I/O audit events regress."""
+    baseline = {
+        "cases": {
+            "x": {"events_per_sec": 1000, "p99_us": 10, "audit_events_per_call": 0}
+        }
+    }
+    same = {"events_per_sec": 950, "p99_us": 11, "audit_events_per_call": 0}
+    assert not bench.compare(baseline, {"cases": {"x": same}}, threshold=20)
+    worse = {"events_per_sec": 500, "p99_us": 20, "audit_events_per_call": 1}
+    assert len(bench.compare(baseline, {"cases": {"x": worse}}, threshold=20)) == 3
+
+
+def test_bench_main_exit_code(bench, tmp_path):
+    """``--save`` writes the baseline; a later comparison passes against it."""
+    baseline = tmp_path / "baseline.json"
+    args = ["--iterations", "20", "--baseline", str(baseline)]
+    assert bench.main(args + ["--save"]) == 0
+    assert baseline.exists()
+    assert bench.main(args + ["--threshold", "100000"]) == 0
+
+
+def test_bench_main_fails_without_baseline(bench, tmp_path):
+    """Without a baseline there is nothing to gate on, so the run fails."""
+    missing = tmp_path / "baseline.json"
+    assert bench.main(["--iterations", "20", "--baseline", str(missing)]) == 2
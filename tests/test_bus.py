@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Shared position bus tests."""
+
+import asyncio
+
+import pytest
+
+import lincot
+from lincot.bus import PositionBus
+
+CONFIG = {
+    "COT_URL": "udp://239.2.3.1:6969",
+    "COT_UID": "bus-node",
+    "COCKPIT_URL": "http://bus.local:9090/",
+}
+
+
+def _tpv(lat: float = 45.0, lon: float = -122.0) -> dict:
+    return {"class": "TPV", "mode": 3, "lat": lat, "lon": lon, "altHAE": 12.5}
+
+
+@pytest.mark.asyncio
+async def test_published_fix_is_an_immutable_snapshot():
+    """Subscribers get a read-only copy that later edits cannot change."""
+    bus = PositionBus()
+    tpv = _tpv()
+    fix = await bus.publish(tpv, "gpsd")
+    tpv["lat"] = 0.0
+    assert bus.latest() is fix
+    assert (fix.seq, fix.source, fix.tpv["lat"]) == (1, "gpsd", 45.0)
+    with pytest.raises(TypeError):
+        fix.tpv["lat"] = 1.0
+    assert bus.fix_age() >= 0
+
+
+@pytest.mark.asyncio
+async def test_every_subscriber_sees_the_same_fix():
+    """Waiting subscribers are all woken with the one published snapshot."""
+    bus = PositionBus()
+    waiters = [asyncio.ensure_future(bus.wait()) for _ in range(3)]
+    await asyncio.sleep(0)
+    fix = await bus.publish(_tpv(), "nmea")
+    assert await asyncio.gather(*waiters) == [fix, fix, fix]
+    assert await bus.wait(after=fix.seq, timeout=0.01) is None
+    newer = await bus.publish(_tpv(46.0), "nmea")
+    assert await bus.wait(after=fix.seq) is newer
+
+
+@pytest.mark.asyncio
+async def test_service_publishes_static_position():
+    """The position service acquires from static config and publishes it."""
+    bus = PositionBus()
+    config = dict(CONFIG, STATIC_LAT="10.5", STATIC_LON="20.25", POLL_INTERVAL="60")
+    service = lincot.PositionService(asyncio.Queue(), config, bus)
+    assert service.source == "static"
+    task = asyncio.ensure_future(service.run())
+    try:
+        fix = await bus.wait(timeout=5)
+    finally:
+        task.cancel()
+    assert (fix.source, fix.tpv["lat"], fix.tpv["lon"]) == ("static", 10.5, 20.25)
+
+
+@pytest.mark.asyncio
+async def test_workers_read_from_the_bus():
+    """Position and sensor workers use the published fix with no I/O of their own."""
+    bus = PositionBus()
+    queue = asyncio.Queue()
+    worker = lincot.LincotWorker(queue, CONFIG, bus)
+    sensor = lincot.SensorWorker(queue, CONFIG, bus)
+    assert sensor._get_position()[:2] == (0.0, 0.0)
+
+    task = asyncio.ensure_future(worker.run())
+    try:
+        await bus.publish(dict(_tpv(), epx=3.0, epv=6.5), "gpsd")
+        event = await asyncio.wait_for(queue.get(), 5)
+    finally:
+        task.cancel()
+    assert b'uid="bus-node"' in event
+    assert sensor._get_position() == (45.0, -122.0, 12.5, "3.0", "6.5")
+
+    await bus.publish({"class": "TPV", "mode": 1}, "gpsd")
+    assert sensor._get_position()[:2] == (0.0, 0.0)
+
+
+def test_create_tasks_shares_one_bus():
+    """create_tasks wires one position service to both workers."""
+
+    class _CLITool:
+        tx_queue = asyncio.Queue()
+
+    tasks = {type(task).__name__: task for task in lincot.create_tasks({}, _CLITool)}
+    bus = tasks["PositionService"].bus
+    assert tasks["LincotWorker"].bus is bus
+    assert tasks["SensorWorker"].bus is bus
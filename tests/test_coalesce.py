@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""TX queue coalescing tests."""
+
+import asyncio
+
+import pytak
+import pytest
+
+import lincot
+from lincot import metrics
+from lincot.coalesce import CoalescingQueue, coalesce_enabled, event_uid
+from lincot.functions import position_to_cot_xml
+from lincot.tak_proto import MESH, STREAM, encode_event
+
+CONFIG = {"COT_UID": "tx-node", "COCKPIT_URL": "http://tx.local:9090/"}
+
+
+def _event(uid: str, lat: float = 1.0) -> bytes:
+    gps_info = {"class": "TPV", "lat": lat, "lon": 2.0}
+    return pytak.serialize_cot(position_to_cot_xml(gps_info, dict(CONFIG, COT_UID=uid)))
+
+
+def test_event_uid():
+    """The uid is read from XML and from both protobuf framings."""
+    event = position_to_cot_xml({"class": "TPV", "lat": 1.0, "lon": 2.0}, CONFIG)
+    assert event_uid(pytak.serialize_cot(event)) == "tx-node"
+    assert event_uid(encode_event(event, MESH)) == "tx-node"
+    assert event_uid(encode_event(event, STREAM)) == "tx-node"
+    assert event_uid(b"<event version='2.0' />") is None
+    assert event_uid(b"\xbf\x01\xbf\xff") is None
+
+
+@pytest.mark.asyncio
+async def test_newest_event_per_uid_keeps_its_place():
+    """Later events for a queued uid replace it; other events are untouched."""
+    queue = CoalescingQueue()
+    superseded = metrics.EVENTS_SUPERSEDED.value
+    for lat in (1.0, 2.0, 3.0):
+        queue.put_nowait(_event("alpha", lat))
+        queue.put_nowait(_event("bravo", lat))
+    queue.put_nowait(b"no uid")
+    queue.put_nowait(b"no uid")
+    assert queue.qsize() == 4
+    assert queue.superseded == 4
+    assert metrics.EVENTS_SUPERSEDED.value == superseded + 4
+    drained = [queue.get_nowait() for _ in range(4)]
+    assert [event_uid(event) for event in drained] == ["alpha", "bravo", None, None]
+    assert b'lat="3.0"' in drained[0]
+    for _ in drained:
+        queue.task_done()
+    await asyncio.wait_for(queue.join(), 1)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_supersedes_before_dropping():
+    """On a full queue a newer event for a queued uid replaces it; nothing is lost."""
+    queue = CoalescingQueue(2)
+    queue.put_nowait(_event("alpha", 1.0))
+    queue.put_nowait(_event("bravo", 1.0))
+    queue.put_nowait(_event("alpha", 2.0))
+    await asyncio.wait_for(queue.put(_event("bravo", 2.0)), 1)
+    worker = lincot.SensorWorker(queue, CONFIG)
+    await worker.put_queue(_event("alpha", 3.0))
+    assert queue.qsize() == 2
+    drained = [queue.get_nowait(), queue.get_nowait()]
+    assert [event_uid(event) for event in drained] == ["alpha", "bravo"]
+    assert b'lat="3.0"' in drained[0] and b'lat="2.0"' in drained[1]
+    with pytest.raises(asyncio.QueueEmpty):
+        queue.get_nowait()
+    for _ in drained:
+        queue.task_done()
+    await asyncio.wait_for(queue.join(), 1)
+
+    queue.put_nowait(_event("alpha"))
+    queue.put_nowait(_event("bravo"))
+    await worker.put_queue(_event("charlie"))  # a new uid still drops the oldest
+    assert [event_uid(queue.get_nowait()) for _ in range(2)] == ["bravo", "charlie"]
+
+
+@pytest.mark.asyncio
+async def test_outage_keeps_memory_flat():
+    """A long outage leaves one pending event per uid, however many were built."""
+    queue = CoalescingQueue(100)
+    worker = lincot.LincotWorker(queue, CONFIG)
+    sensor = lincot.SensorWorker(queue, CONFIG)
+    for step in range(500):
+        await worker.handle_data({"class": "TPV", "lat": step / 1000, "lon": 2.0})
+        await sensor.put_queue(_event("sensor-node", step))
+    assert queue.qsize() == 2
+    assert b'lat="0.499"' in queue.get_nowait()
+
+
+def test_create_tasks_installs_coalescing_queue():
+    """TX workers and LINCOT workers share the coalescing tx_queue."""
+
+    def _clitool():
+        queue = asyncio.Queue(100)
+
+        class _CLITool:
+            tx_queue = queue
+            tasks = {pytak.TXWorker(queue, {}, writer=None)}
+            queues = {"lincot": {"tx_queue": queue}}
+
+        return _CLITool
+
+    clitool = _clitool()
+    tasks = lincot.create_tasks({}, clitool)
+    assert isinstance(clitool.tx_queue, CoalescingQueue)
+    assert clitool.tx_queue.maxsize == 100
+    assert next(iter(clitool.tasks)).queue is clitool.tx_queue
+    assert clitool.queues["lincot"]["tx_queue"] is clitool.tx_queue
+    assert all(task.queue is clitool.tx_queue for task in tasks)
+
+    clitool = _clitool()
+    lincot.create_tasks({"TX_COALESCE": "false"}, clitool)
+    assert not isinstance(clitool.tx_queue, CoalescingQueue)
+    assert coalesce_enabled({}) and not coalesce_enabled({"TX_COALESCE": "0"})
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Persistent remarks/detail co-process tests."""
+
+import time
+
+import pytest
+
+from lincot.coprocess import CoProcess, close_coprocesses
+from lincot.functions import position_to_cot_xml
+
+COUNTER = 'n=0\nwhile read _; do n=$((n+1)); {body}echo "count=$n"; echo; done\n'
+
+
+def _helper(tmp_path, body: str = "", name: str = "helper.sh") -> str:
+    script = tmp_path / name
+    script.write_text("#!/bin/sh\n" + COUNTER.format(body=body), encoding="utf-8")
+    script.chmod(0o755)
+    return str(script)
+
+
+@pytest.fixture(autouse=True)
+def stop_helpers():
+    yield
+    close_coprocesses()
+
+
+def test_coprocess_is_started_once(tmp_path):
+    """Every request is answered by the same long-running helper."""
+    helper = CoProcess(_helper(tmp_path), timeout=5)
+    try:
+        assert [helper.query() for _ in range(3)] == ["count=1", "count=2", "count=3"]
+        assert helper.starts == 1
+    finally:
+        helper.close()
+
+
+def test_coprocess_restarts_after_exit(tmp_path):
+    """A helper that dies is restarted on the next request."""
+    helper = CoProcess(_helper(tmp_path, body='[ $n -eq 2 ] && exit 1; '), timeout=5)
+    try:
+        assert helper.query() == "count=1"
+        assert helper.query() == "count=1"  # died: last good answer
+        assert helper.query() == "count=1"  # fresh process
+        assert helper.starts == 2
+    finally:
+        helper.close()
+
+
+def test_coprocess_timeout_uses_last_good(tmp_path):
+    """A slow answer falls back to the previous one and is discarded later."""
+    helper = CoProcess(_helper(tmp_path, body="[ $n -eq 2 ] && sleep 0.5; "), 0.2)
+    try:
+        assert helper.query() == "count=1"
+        assert helper.query() == "count=1"
+        assert helper.timeouts == 1
+        time.sleep(0.6)
+        assert helper.query() == "count=3"
+    finally:
+        helper.close()
+
+
+def test_persistent_commands_in_cot(tmp_path):
+    """Remarks and detail commands can both run as co-processes."""
+    detail = tmp_path / "detail.sh"
+    detail.write_text(
+        "#!/bin/sh\nwhile read _; do echo '<status battery=\"90\" />'; echo; done\n",
+        encoding="utf-8",
+    )
+    detail.chmod(0o755)
+    config = {
+        "COT_UID": "helper-node",
+        "COCKPIT_URL": "http://helper.local:9090/",
+        "REMARKS_EXTRA_CMD": _helper(tmp_path),
+        "REMARKS_EXTRA_CMD_PERSISTENT": "true",
+        "COT_DETAIL_XML_CMD": str(detail),
+        "COT_DETAIL_XML_CMD_PERSISTENT": "1",
+    }
+    gps_info = {"class": "TPV", "lat": 1.0, "lon": 2.0}
+    position_to_cot_xml(gps_info, config)
+    cot = position_to_cot_xml(gps_info, config)
+    assert "count=2" in cot.find("detail/remarks").text
+    assert cot.find("detail/status").attrib["battery"] == "90"
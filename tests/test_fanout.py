@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Multi-destination fan-out tests."""
+
+import asyncio
+
+import pytest
+
+import lincot
+from lincot.coalesce import CoalescingQueue
+from lincot.fanout import (
+    CoalescingTeeQueue,
+    Destination,
+    Fanout,
+    close_fanouts,
+    install,
+    reframe,
+)
+from lincot.tak_proto import MESH, MESH_HEADER, STREAM, STREAM_HEADER, frame
+
+EVENT = b'<event version="2.0" uid="fan-node" type="a-f-G-E-S"/>\n'
+
+
+@pytest.fixture(autouse=True)
+def stop_fanouts():
+    yield
+    close_fanouts()
+
+
+class _CLITool:
+    def __init__(self, queue=None) -> None:
+        self.tx_queue = queue or asyncio.Queue()
+        self.tasks = set()
+
+
+def test_reframe_only_changes_protobuf_framing():
+    """Stream and mesh framing are swapped without re-encoding; XML passes."""
+    message = b"\x0a\x03abc"
+    stream = frame(message, STREAM)
+    mesh = frame(message, MESH)
+    assert reframe(stream, MESH) == mesh
+    assert reframe(mesh, STREAM) == stream
+    assert reframe(mesh, MESH) is mesh
+    assert reframe(EVENT, MESH) is EVENT
+    assert mesh.startswith(MESH_HEADER)
+
+
+@pytest.mark.asyncio
+async def test_protobuf_destination_encodes_xml(tmp_path):
+    """With TAK_PROTO, XML on tx_queue (PyTAK's hello) is framed, not sent raw."""
+    log = tmp_path / "cot.log"
+    destination = Destination(f"file://{log}", {"TAK_PROTO": "1"})
+    await destination.connect()
+    await destination.send(EVENT)
+    destination.disconnect()
+    assert log.read_bytes().startswith(STREAM_HEADER)
+
+
+def test_tee_shares_serialized_bytes(tmp_path):
+    """Every destination gets the very same bytes object put on tx_queue."""
+    fanout = Fanout(
+        [
+            Destination("udp://239.2.3.1:6969"),
+            Destination(f"file://{tmp_path}/cot.log"),
+        ]
+    )
+    clitool = _CLITool(CoalescingQueue())
+    queue = install(clitool, fanout)
+    assert isinstance(queue, CoalescingTeeQueue)
+    queue.put_nowait(EVENT)
+    assert clitool.tx_queue.get_nowait() is EVENT
+    for destination in fanout.destinations:
+        assert destination.queue.get_nowait() is EVENT
+
+
+def test_full_destination_drops_oldest():
+    """A destination that cannot keep up loses its oldest events, not new ones."""
+    destination = Destination("tcp://127.0.0.1:9", queue_size=2, policy="drop-oldest")
+    for index in range(4):
+        destination.offer(b"%d" % index)
+    assert [destination.queue.get_nowait() for _ in range(2)] == [b"2", b"3"]
+    assert destination.dropped.value == 2
+
+
+def test_invalid_fanout_config():
+    """Unknown policies and bare host:port values fail at startup."""
+    with pytest.raises(ValueError):
+        Fanout.from_config(
+            {"FANOUT_URLS": "udp://239.2.3.1:6969", "FANOUT_POLICY": "x"}
+        )
+    with pytest.raises(ValueError):
+        Fanout.from_config({"FANOUT_URLS": "239.2.3.1:6969"})
+
+
+@pytest.mark.asyncio
+async def test_failed_destination_does_not_stall_others(tmp_path):
+    """A refused TCP destination keeps queueing while TCP and file:// deliver."""
+    received = asyncio.Queue()
+
+    async def _handle(reader, writer):
+        received.put_nowait(await reader.readline())
+        writer.close()
+
+    server = await asyncio.start_server(_handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    log = tmp_path / "log" / "cot.log"
+    log.parent.mkdir()
+    log.write_bytes(b"earlier\n")
+    fanout = Fanout.from_config(
+        {
+            "FANOUT_URLS": (
+                f"tcp://127.0.0.1:1, tcp://127.0.0.1:{port}, file://{log}"
+            ),
+        }
+    )
+    dead, live, logfile = fanout.destinations
+    fanout.start()
+    try:
+        fanout.offer(EVENT)
+        assert await asyncio.wait_for(received.get(), 5) == EVENT
+        for _ in range(50):
+            if logfile.sent.value:
+                break
+            await asyncio.sleep(0.02)
+        assert log.read_bytes() == b"earlier\n" + EVENT
+        assert live.sent.value == 1
+        assert dead.sent.value == 0
+        assert dead.queue.qsize() == 1
+    finally:
+        fanout.stop()
+        server.close()
+        await server.wait_closed()
+
+
+def test_create_tasks_adds_fanout(tmp_path):
+    """FANOUT_URLS adds the fan-out worker and a teeing tx_queue."""
+    clitool = _CLITool()
+    tasks = lincot.create_tasks(
+        {"FANOUT_URLS": f"file://{tmp_path}/cot.log"}, clitool
+    )
+    assert any(isinstance(task, lincot.FanoutWorker) for task in tasks)
+    assert clitool.tx_queue.fanout.destinations[0].name.startswith("file://")
+
+
+@pytest.mark.asyncio
+async def test_destinations_keep_receiving_while_cot_url_is_down(tmp_path):
+    """A COT_URL teardown stops neither the event producers nor the fan-out."""
+    log = tmp_path / "cot.log"
+    config = {
+        "COT_URL": "tcp://127.0.0.1:1",
+        "COT_UID": "fan-node",
+        "STATIC_LAT": "1.0",
+        "STATIC_LON": "2.0",
+        "POLL_INTERVAL": "1",
+        "FANOUT_URLS": f"file://{log}",
+        "DETAIL_PROVIDERS": "none",
+    }
+
+    def _events() -> int:
+        return log.read_bytes().count(b'uid="fan-node"') if log.exists() else 0
+
+    async def _wait_for_events(count: int) -> None:
+        for _ in range(300):
+            if _events() >= count:
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError(f"{_events()} event(s) logged, expected {count}")
+
+    first = _CLITool()
+    tasks = lincot.create_tasks(config, first)
+    assert [type(task) for task in tasks] == [lincot.FanoutWorker]
+    worker = asyncio.ensure_future(tasks.pop().run())
+    await _wait_for_events(1)
+
+    # PyTAK tears the connection's tasks down; events keep flowing.
+    worker.cancel()
+    await _wait_for_events(2)
+
+    second = _CLITool()
+    tasks = lincot.create_tasks(config, second)
+    assert [type(task) for task in tasks] == [lincot.FanoutWorker]
+    assert second.tx_queue is first.tx_queue
+    assert not second.tx_queue.empty()
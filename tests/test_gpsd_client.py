@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Persistent gpsd client tests against a local fake gpsd."""
+
+import asyncio
+import json
+
+import pytest
+
+from lincot.gpsd_client import WATCH_COMMAND, GpsdClient
+from lincot.position import gpsd_stream_configured
+
+VERSION = {"class": "VERSION", "release": "3.25", "proto_major": 3, "proto_minor": 15}
+SKY = {"class": "SKY", "device": "/dev/ttyACM0", "satellites": []}
+
+
+def _tpv(lat: float, lon: float) -> dict:
+    return {"class": "TPV", "mode": 3, "lat": lat, "lon": lon, "altHAE": 20.6}
+
+
+class FakeGpsd:
+    """Minimal gpsd: greets, waits for ?WATCH, then writes scripted reports."""
+
+    def __init__(self, reports):
+        self.reports = reports
+        self.watch_requests = []
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(json.dumps(VERSION).encode() + b"\n")
+        self.watch_requests.append(await reader.readline())
+        for report in self.reports:
+            writer.write(json.dumps(report).encode() + b"\n")
+        await writer.drain()
+        writer.close()
+
+
+async def _run_until_tpv(client: GpsdClient, timeout: float = 5.0):
+    task = asyncio.ensure_future(client.run())
+    try:
+        return await client.wait(timeout)
+    finally:
+        task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_gpsd_client_caches_newest_tpv():
+    """The client sends ?WATCH and keeps only the newest TPV report."""
+    fake = FakeGpsd([_tpv(1.0, 2.0), SKY, _tpv(3.0, 4.0)])
+    server = await asyncio.start_server(fake.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    client = GpsdClient(host="127.0.0.1", port=port, backoff_initial=0.05)
+    task = asyncio.ensure_future(client.run())
+    try:
+        await client.wait(5)
+        for _ in range(100):
+            if client.latest()["lat"] == 3.0:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+        server.close()
+    assert fake.watch_requests[0] == WATCH_COMMAND
+    assert client.latest()["lat"] == 3.0
+    assert client.latest()["lon"] == 4.0
+    assert client.fix_age() is not None
+
+
+@pytest.mark.asyncio
+async def test_gpsd_client_unix_socket(tmp_path):
+    """gpsd can be reached over its Unix control socket."""
+    fake = FakeGpsd([_tpv(45.0, -122.0)])
+    path = str(tmp_path / "gpsd.sock")
+    server = await asyncio.start_unix_server(fake.handle, path)
+    try:
+        tpv = await _run_until_tpv(GpsdClient(path=path, backoff_initial=0.05))
+    finally:
+        server.close()
+    assert tpv["lat"] == 45.0
+
+
+@pytest.mark.asyncio
+async def test_gpsd_client_reconnects_with_backoff(unused_tcp_port):
+    """The client keeps retrying until gpsd starts listening."""
+    client = GpsdClient(
+        host="127.0.0.1", port=unused_tcp_port, backoff_initial=0.05, backoff_max=0.1
+    )
+    task = asyncio.ensure_future(client.run())
+    await asyncio.sleep(0.2)
+    assert client.latest() is None
+    fake = FakeGpsd([_tpv(10.0, 20.0)])
+    server = await asyncio.start_server(fake.handle, "127.0.0.1", unused_tcp_port)
+    try:
+        tpv = await client.wait(5)
+    finally:
+        task.cancel()
+        server.close()
+    assert tpv["lat"] == 10.0
+
+
+@pytest.mark.asyncio
+async def test_gpsd_client_expires_fix_when_gpsd_goes_away(unused_tcp_port):
+    """Once gpsd is gone the cached TPV expires instead of being reported forever."""
+    fake = FakeGpsd([_tpv(10.0, 20.0)])
+    server = await asyncio.start_server(fake.handle, "127.0.0.1", unused_tcp_port)
+    client = GpsdClient(
+        host="127.0.0.1", port=unused_tcp_port, backoff_initial=0.05, max_age=0.3
+    )
+    task = asyncio.ensure_future(client.run())
+    try:
+        assert (await client.wait(5))["lat"] == 10.0
+        server.close()
+        await server.wait_closed()
+        await asyncio.sleep(0.5)
+        assert client.latest() is None
+    finally:
+        task.cancel()
+
+
+def test_gpsd_client_max_age_from_poll_interval():
+    """The cached TPV outlives two polls at most."""
+    assert GpsdClient.from_config({"POLL_INTERVAL": "5"}).max_age == 10
+    assert GpsdClient().max_age is None
+
+
+def test_handle_line_ignores_other_reports():
+    """Non-TPV reports and broken JSON leave the cache untouched."""
+    client = GpsdClient()
+    assert client.handle_line(json.dumps(SKY).encode()) is None
+    assert client.handle_line(b'{"class":"TPV",') is None
+    assert client.latest() is None
+
+
+def test_gpsd_stream_configured():
+    """Streaming replaces only the stock gpspipe command."""
+    assert gpsd_stream_configured({})
+    assert gpsd_stream_configured({"GPS_INFO_CMD": "gpspipe --json -n 5"})
+    assert not gpsd_stream_configured({"GPS_INFO_CMD": "cat /tmp/tpv.json"})
+    assert not gpsd_stream_configured({"STATIC_LAT": "1", "STATIC_LON": "2"})
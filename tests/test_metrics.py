@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Metrics registry and endpoint tests."""
+
+import asyncio
+
+import pytak
+import pytest
+
+import lincot
+from lincot.metrics import Counter, Gauge, Histogram, Registry, parse_listen
+from lincot import metrics
+from lincot.settings import Settings
+
+
+@pytest.fixture
+def fix_clock(monkeypatch):
+    """Turn on per-event latency bookkeeping, as a MetricsWorker does."""
+    monkeypatch.setattr(metrics.FIX_CLOCK, "enabled", True)
+    return metrics.FIX_CLOCK
+
+
+def test_label_values_are_escaped():
+    """Backslashes, quotes and newlines in label values are escaped."""
+    counter = Counter("escaped_total", "Escaped.", {"path": 'C:\\tmp\n"x"'})
+    assert counter.samples() == ['escaped_total{path="C:\\\\tmp\\n\\"x\\""} 0']
+
+
+def test_histogram_buckets_are_cumulative():
+    """Observations land in preallocated buckets rendered cumulatively."""
+    histogram = Histogram("stage_seconds", "Stage.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1]
+    assert histogram.samples() == [
+        'stage_seconds_bucket{le="0.1"} 1',
+        'stage_seconds_bucket{le="1"} 3',
+        'stage_seconds_bucket{le="+Inf"} 4',
+        "stage_seconds_sum 6.25",
+        "stage_seconds_count 4",
+    ]
+
+
+def test_registry_groups_labelled_metrics():
+    """One HELP/TYPE header per metric name, followed by every label set."""
+    registry = Registry()
+    registry.register(Counter("events_total", "Events.", {"worker": "a"})).inc()
+    registry.register(Counter("events_total", "Events.", {"worker": "b"}))
+    gauge = registry.register(Gauge("depth", "Depth."))
+    gauge.set_function(lambda: 3)
+    assert registry.render() == (
+        "# HELP events_total Events.\n"
+        "# TYPE events_total counter\n"
+        'events_total{worker="a"} 1\n'
+        'events_total{worker="b"} 0\n'
+        "# HELP depth Depth.\n"
+        "# TYPE depth gauge\n"
+        "depth 3\n"
+    )
+
+
+def test_parse_listen():
+    """METRICS_LISTEN accepts host:port, :port and unix:/path."""
+    assert parse_listen("0.0.0.0:9108") == ("tcp", "0.0.0.0", 9108)
+    assert parse_listen(":9108") == ("tcp", "127.0.0.1", 9108)
+    assert parse_listen("[::1]:9108") == ("tcp", "::1", 9108)
+    assert parse_listen("unix:/run/lincot.sock") == ("unix", "/run/lincot.sock", None)
+
+
+@pytest.mark.parametrize("value", ["9108x", "localhost", ":70000", "unix:"])
+def test_invalid_metrics_listen_fails_at_startup(value):
+    """A bad METRICS_LISTEN is rejected with the other boot-time checks."""
+    with pytest.raises(ValueError, match="METRICS_LISTEN"):
+        parse_listen(value)
+    with pytest.raises(ValueError, match="METRICS_LISTEN"):
+        Settings.from_config({"METRICS_LISTEN": value})
+
+
+@pytest.mark.asyncio
+async def test_metrics_server_outlives_worker():
+    """The endpoint keeps serving across COT_URL reconnects."""
+    config = {"METRICS_LISTEN": "127.0.0.1:0"}
+    try:
+        worker = lincot.MetricsWorker(asyncio.Queue(), config)
+        await asyncio.wait_for(worker.run(), 5)
+        server = metrics.get_server("127.0.0.1:0")
+        await worker.close()  # PyTAK tears the connection's workers down
+        assert server.is_serving()
+        await asyncio.wait_for(lincot.MetricsWorker(asyncio.Queue(), config).run(), 5)
+        assert metrics.get_server("127.0.0.1:0") is server
+    finally:
+        metrics.close_servers()
+
+
+async def _scrape(reader, writer, path="/metrics") -> bytes:
+    writer.write(f"GET {path} HTTP/1.0\r\nHost: lincot\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+@pytest.mark.asyncio
+async def test_metrics_worker_tcp():
+    """The endpoint serves the registry and reports tx_queue depth."""
+    queue = asyncio.Queue()
+    queue.put_nowait(b"<event/>")
+    worker = lincot.MetricsWorker(queue, {"METRICS_LISTEN": "127.0.0.1:0"})
+    metrics.TX_QUEUE_DEPTH.set_function(queue.qsize)
+    server = await worker.start_server()
+    async with server:
+        port = server.sockets[0].getsockname()[1]
+        response = await _scrape(*await asyncio.open_connection("127.0.0.1", port))
+        assert response.startswith(b"HTTP/1.0 200 OK")
+        assert b"\nlincot_tx_queue_depth 1\n" in response
+        assert b"# TYPE lincot_cot_build_seconds histogram" in response
+        missing = await _scrape(
+            *await asyncio.open_connection("127.0.0.1", port), path="/nope"
+        )
+        assert missing.startswith(b"HTTP/1.0 404")
+
+
+@pytest.mark.asyncio
+async def test_metrics_worker_unix(tmp_path):
+    """The endpoint can listen on a Unix socket."""
+    path = str(tmp_path / "metrics.sock")
+    worker = lincot.MetricsWorker(asyncio.Queue(), {"METRICS_LISTEN": f"unix:{path}"})
+    server = await worker.start_server()
+    async with server:
+        response = await _scrape(*await asyncio.open_unix_connection(path))
+        assert b"lincot_events_emitted_total" in response
+
+
+@pytest.mark.asyncio
+async def test_position_worker_records_stages(fix_clock):
+    """Emitting a position updates build and emitted metrics; sending, queue-wait."""
+    queue = asyncio.Queue()
+    worker = lincot.LincotWorker(
+        queue, {"COT_UID": "metrics-node", "COCKPIT_URL": "http://m.local:9090/"}
+    )
+    emitted = metrics.EVENTS_EMITTED["position"].value
+    failed = metrics.EVENTS_FAILED["position"].value
+    builds = metrics.COT_BUILD["position"].count
+    waits = metrics.QUEUE_WAIT["position"].count
+    await worker.handle_data({"class": "TPV", "lat": 1.0, "lon": 2.0})
+    await worker.handle_data({"class": "TPV"})
+    assert queue.qsize() == 1
+    assert metrics.EVENTS_EMITTED["position"].value == emitted + 1
+    assert metrics.EVENTS_FAILED["position"].value == failed + 1
+    assert metrics.COT_BUILD["position"].count == builds + 1
+    assert metrics.QUEUE_WAIT["position"].count == waits
+    fix_clock.sent(queue.get_nowait())
+    assert metrics.QUEUE_WAIT["position"].count == waits + 1
+
+
+def test_create_tasks_adds_metrics_worker():
+    """The metrics worker only runs when METRICS_LISTEN is set."""
+
+    class _CLITool:
+        tx_queue = asyncio.Queue()
+
+    def _names(config):
+        return {type(task).__name__ for task in lincot.create_tasks(config, _CLITool)}
+
+    assert "MetricsWorker" not in _names({})
+    assert "MetricsWorker" in _names({"METRICS_LISTEN": ":9108"})
+
+
+@pytest.mark.asyncio
+async def test_max_fix_age_rejects_old_fixes():
+    """Fixes older than MAX_FIX_AGE are dropped and counted."""
+    queue = asyncio.Queue()
+    config = {"COT_UID": "age-node", "COCKPIT_URL": "http://a.local:9090/"}
+    worker = lincot.LincotWorker(queue, dict(config, MAX_FIX_AGE="30"))
+    stale = metrics.FIXES_STALE.value
+    await worker.handle_data(
+        {"class": "TPV", "lat": 1.0, "lon": 2.0, "time": "2020-01-01T00:00:00.000Z"}
+    )
+    assert queue.empty()
+    assert metrics.FIXES_STALE.value == stale + 1
+    assert worker.fix_age() > 30
+
+
+@pytest.mark.asyncio
+async def test_fix_to_send_latency(monkeypatch, fix_clock):
+    """Fix-to-enqueue and fix-to-send are measured from the TPV time."""
+    sent = []
+
+    class _TXWorker(pytak.TXWorker):
+        async def send_data(self, data):
+            sent.append(data)
+
+    queue = asyncio.Queue()
+    tx_worker = _TXWorker(queue, {}, writer=None)
+
+    class _CLITool:
+        tx_queue = queue
+        tasks = {tx_worker}
+
+    lincot.create_tasks({}, _CLITool)
+    monkeypatch.setattr(metrics.time, "time", lambda: 1686763925.0)
+    worker = lincot.LincotWorker(
+        queue, {"COT_UID": "lat-node", "COCKPIT_URL": "http://l.local:9090/"}
+    )
+    enqueued = metrics.FIX_TO_ENQUEUE.count
+    sends = metrics.FIX_TO_SEND.count
+    await worker.handle_data(
+        {"class": "TPV", "lat": 1.0, "lon": 2.0, "time": "2023-06-14T17:32:03.000Z"}
+    )
+    await tx_worker.send_data(queue.get_nowait())
+    assert len(sent) == 1
+    assert metrics.FIX_TO_ENQUEUE.count == enqueued + 1
+    assert metrics.FIX_TO_SEND.count == sends + 1
+    assert metrics.FIX_TO_SEND.counts[metrics.LATENCY_BUCKETS.index(2.5)] >= 1
+
+
+def test_queue_wait_measured_when_sent(fix_clock):
+    """Events without a fix time still report how long they sat in tx_queue."""
+    waits = metrics.QUEUE_WAIT["sensor"].count
+    sends = metrics.FIX_TO_SEND.count
+    fix_clock.enqueued(b"<event uid='sensor'/>", None, "sensor")
+    assert metrics.QUEUE_WAIT["sensor"].count == waits
+    fix_clock.sent(b"<event uid='sensor'/>")
+    assert metrics.QUEUE_WAIT["sensor"].count == waits + 1
+    assert metrics.FIX_TO_SEND.count == sends
+
+
+def test_fix_clock_is_off_without_metrics(monkeypatch):
+    """Without a metrics endpoint nothing is stored or observed per event."""
+    monkeypatch.setattr(metrics.FIX_CLOCK, "enabled", False)
+    enqueued = metrics.FIX_TO_ENQUEUE.count
+    metrics.FIX_CLOCK.enqueued(b"<event uid='off'/>", 1686763923.0)
+    assert b"<event uid='off'/>" not in metrics.FIX_CLOCK._pending
+    assert metrics.FIX_TO_ENQUEUE.count == enqueued
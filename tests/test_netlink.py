@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""rtnetlink address/route tracking tests."""
+
+import socket
+import struct
+
+import pytest
+
+import lincot.cache
+from lincot import netlink, network
+from lincot.netlink import NetlinkMonitor
+
+
+@pytest.fixture(autouse=True)
+def clear_host_caches():
+    lincot.cache.clear_all()
+    yield
+    network.set_monitor(None)
+    lincot.cache.clear_all()
+
+
+def _attr(attr_type: int, value: bytes) -> bytes:
+    length = netlink.RTATTR.size + len(value)
+    padding = b"\0" * (-length % 4)
+    return netlink.RTATTR.pack(length, attr_type) + value + padding
+
+
+def _message(msg_type: int, body: bytes) -> bytes:
+    header = netlink.NLMSGHDR.pack(netlink.NLMSGHDR.size + len(body), msg_type, 0, 0, 0)
+    return header + body
+
+
+def _address(index: int, address: str, label: str, new: bool = True) -> bytes:
+    body = netlink.IFADDRMSG.pack(socket.AF_INET, 24, 0, 0, index)
+    body += _attr(netlink.IFA_LOCAL, socket.inet_aton(address))
+    body += _attr(netlink.IFA_LABEL, label.encode() + b"\0")
+    return _message(netlink.RTM_NEWADDR if new else netlink.RTM_DELADDR, body)
+
+
+def _rtmsg(dst_len: int) -> bytes:
+    return netlink.RTMSG.pack(
+        socket.AF_INET, dst_len, 0, 0, netlink.RT_TABLE_MAIN, 0, 0, 1, 0
+    )
+
+
+def _default_route(index: int, metric: int, new: bool = True) -> bytes:
+    body = _rtmsg(0)
+    body += _attr(netlink.RTA_OIF, struct.pack("=I", index))
+    body += _attr(netlink.RTA_PRIORITY, struct.pack("=I", metric))
+    return _message(netlink.RTM_NEWROUTE if new else netlink.RTM_DELROUTE, body)
+
+
+def test_default_route_interface_address():
+    """The lowest-metric default route's interface address wins."""
+    monitor = NetlinkMonitor()
+    monitor.apply(
+        _address(1, "127.0.0.1", "lo")
+        + _address(2, "192.168.1.10", "eth0")
+        + _address(3, "10.20.0.7", "wwan0")
+        + _default_route(2, 100)
+        + _default_route(3, 700)
+    )
+    assert monitor.host_ip() == "192.168.1.10"
+
+
+def test_roaming_updates_immediately():
+    """Route and address notifications move the host address without probing."""
+    monitor = NetlinkMonitor()
+    monitor.apply(_address(2, "192.168.1.10", "wlan0") + _default_route(2, 600))
+    monitor.ready = True
+    assert monitor.host_ip() == "192.168.1.10"
+
+    # WiFi drops, LTE comes up.
+    monitor.apply(
+        _default_route(2, 600, new=False)
+        + _address(2, "192.168.1.10", "wlan0", new=False)
+    )
+    assert monitor.host_ip() is None
+    monitor.apply(_address(3, "10.20.0.7", "wwan0") + _default_route(3, 700))
+    assert monitor.host_ip() == "10.20.0.7"
+    assert monitor.changes == 2
+
+    # Back in WiFi range with a better metric.
+    monitor.apply(_address(2, "192.168.1.11", "wlan0") + _default_route(2, 600))
+    assert monitor.host_ip() == "192.168.1.11"
+    assert monitor.changes == 3
+
+
+def test_wifi_fallback_without_default_route():
+    """Without a default route, a WiFi interface address is used, like probing."""
+    monitor = NetlinkMonitor()
+    monitor.apply(
+        _address(2, "172.16.0.4", "eth1") + _address(5, "192.168.4.2", "wlan0")
+    )
+    assert monitor.host_ip() == "192.168.4.2"
+
+
+def test_non_default_routes_ignored():
+    """Only main-table IPv4 default routes are tracked."""
+    monitor = NetlinkMonitor()
+    body = _rtmsg(24) + _attr(netlink.RTA_OIF, struct.pack("=I", 2))
+    monitor.apply(_message(netlink.RTM_NEWROUTE, body))
+    assert not monitor.default_routes
+
+
+def test_get_host_ip_reads_monitor(monkeypatch):
+    """get_host_ip() answers from a ready monitor and falls back once it closes."""
+    monkeypatch.setattr("lincot.network._lookup_host_ip", lambda: "203.0.113.9")
+    monitor = NetlinkMonitor()
+    monitor.apply(_address(2, "192.168.1.10", "eth0") + _default_route(2, 0))
+    monitor.ready = True
+    network.set_monitor(monitor)
+    assert network.get_host_ip() == "192.168.1.10"
+    monitor.close()
+    assert network.get_host_ip() == "203.0.113.9"
+
+
+def test_get_host_ip_probes_when_monitor_has_no_address(monkeypatch):
+    """A ready monitor without an address defers to the cached probe."""
+    monkeypatch.setattr("lincot.network._lookup_host_ip", lambda: "203.0.113.9")
+    monitor = NetlinkMonitor()
+    monitor.ready = True
+    network.set_monitor(monitor)
+    assert monitor.host_ip() is None
+    assert network.get_host_ip() == "203.0.113.9"
+
+
+@pytest.mark.asyncio
+async def test_start_monitor_on_loop():
+    """On Linux the monitor seeds itself from kernel dumps and serves lookups."""
+    monitor = netlink.start_monitor()
+    if monitor is None:
+        pytest.skip("rtnetlink unavailable")
+    try:
+        assert monitor.ready
+        if monitor.host_ip() is not None:
+            assert network.get_host_ip() == monitor.host_ip()
+    finally:
+        monitor.close()
+    assert network._MONITOR is None  # pylint: disable=protected-access
+
+
+@pytest.mark.asyncio
+async def test_start_monitor_is_shared():
+    """Workers for several SOURCES share one monitor; the last close() stops it."""
+    first = netlink.start_monitor()
+    if first is None:
+        pytest.skip("rtnetlink unavailable")
+    second = netlink.start_monitor()
+    try:
+        assert second is first
+        assert first.users == 2
+        second.close()
+        assert first.ready
+    finally:
+        first.close()
+    assert not first.ready
+    assert network._MONITOR is None  # pylint: disable=protected-access
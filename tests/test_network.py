@@ -18,10 +18,22 @@
 
 """Network helper tests."""
 
-from lincot.network import get_host_ip, is_localhost_host
+import pytest
+
+import lincot.cache
+from lincot.functions import position_to_cot_xml
+from lincot.network import get_host_ip, invalidate_host_ip, is_localhost_host
 from lincot.remarks import get_cockpit_url
 
 
+@pytest.fixture(autouse=True)
+def clear_host_caches():
+    """Each test probes the (mocked) host from scratch."""
+    lincot.cache.clear_all()
+    yield
+    lincot.cache.clear_all()
+
+
 def test_is_localhost_host():
     """Loopback hostnames are detected."""
     assert is_localhost_host("localhost")
@@ -76,3 +88,38 @@ def test_get_host_ip_falls_back_to_wifi0(monkeypatch):
     )
     monkeypatch.setattr("lincot.network._outbound_ipv4", lambda: None)
     assert get_host_ip() == "10.0.0.2"
+
+
+def test_get_host_ip_is_cached(monkeypatch):
+    """Routes and interfaces are probed once until the cache is invalidated."""
+    calls = []
+
+    def _route():
+        calls.append(1)
+        return "eth0"
+
+    monkeypatch.setattr("lincot.network._default_route_interface", _route)
+    monkeypatch.setattr("lincot.network._interface_ipv4", lambda name: "192.168.1.10")
+    assert get_host_ip() == "192.168.1.10"
+    assert get_host_ip() == "192.168.1.10"
+    assert len(calls) == 1
+
+    monkeypatch.setattr("lincot.network._interface_ipv4", lambda name: "10.1.1.1")
+    invalidate_host_ip()
+    assert get_host_ip() == "10.1.1.1"
+    assert len(calls) == 2
+
+
+def test_position_to_cot_xml_probes_cockpit_url_once(monkeypatch):
+    """The Cockpit URL is resolved once per event, shared with remarks."""
+    calls = []
+
+    def _cockpit_url(config):
+        calls.append(config)
+        return "http://10.0.0.5:9090/"
+
+    monkeypatch.setattr("lincot.functions.get_cockpit_url", _cockpit_url)
+    monkeypatch.setattr("lincot.remarks.get_cockpit_url", _cockpit_url)
+    cot = position_to_cot_xml({"class": "TPV", "lat": 1.0, "lon": 2.0}, {})
+    assert len(calls) == 1
+    assert "Cockpit: http://10.0.0.5:9090/" in cot.find("detail/remarks").text
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""NMEA serial position source tests."""
+
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from lincot.functions import position_to_cot_xml
+from lincot.nmea import NmeaParser, NmeaReader, checksum_ok
+from lincot.position import gpsd_stream_configured, nmea_configured
+
+RECORDING = Path(__file__).with_name("test_nmea").read_bytes()
+GSA = b"$GNGSA,A,3,02,05,13,15,18,20,23,29,,,,,1.32,0.71,1.11*1B\r\n"
+
+
+def test_checksum():
+    """Sentences are accepted only with a matching checksum."""
+    assert checksum_ok(b"$GNGSA,A,3,02,05,13,15,18,20,23,29,,,,,1.32,0.71,1.11*1B")
+    assert not checksum_ok(b"$GNGSA,A,3,02,05,13,15,18,20,23,29,,,,,1.32,0.71,1.11*1C")
+    assert not checksum_ok(b"$GNGSA,A,3")
+    assert not checksum_ok(b"GNGSA,A,3*00")
+
+
+def test_parser_builds_tpv_incrementally():
+    """Byte-at-a-time input yields the same TPV gpsd would report."""
+    parser = NmeaParser("/dev/ttyACM0")
+    for index in range(len(RECORDING)):
+        parser.feed(RECORDING[index:index + 1])
+    tpv = parser.tpv()
+    assert parser.errors == 1  # the corrupted GGA
+    assert parser.buffer == bytearray()
+    assert tpv["class"] == "TPV"
+    assert tpv["device"] == "/dev/ttyACM0"
+    assert tpv["mode"] == 3
+    assert tpv["time"] == "2023-06-14T17:32:05.000Z"
+    assert tpv["lat"] == pytest.approx(37.7600541667)
+    assert tpv["lon"] == pytest.approx(-122.4977028333)
+    assert tpv["altMSL"] == 53.4
+    assert tpv["altHAE"] == pytest.approx(20.6)
+    assert tpv["track"] == 359.46
+    assert tpv["speed"] == pytest.approx(0.096 / 3.6)
+    assert (tpv["epx"], tpv["epy"], tpv["epv"]) == (3.0, 4.0, 6.5)
+
+
+def test_parser_snapshot_is_stable():
+    """A returned TPV is not mutated by later sentences."""
+    parser = NmeaParser()
+    parser.feed(RECORDING)
+    first = parser.tpv()
+    assert parser.tpv() is first
+    parser.feed(b"$GNGSA,A,1,,,,,,,,,,,,,99.99,99.99,99.99*2E\r\n")
+    assert parser.tpv() is None
+    assert "lat" in first
+
+
+def test_parser_counts_only_position_sentences():
+    """GSA, GST and VTG refine the fix but are not counted as positions."""
+    parser = NmeaParser()
+    assert parser.feed(RECORDING) == 6  # three RMC, three GGA
+    sentences = parser.sentences
+    assert parser.feed(GSA) == 0
+    assert not parser.handle_sentence(
+        b"$GNGST,173205.00,12,3.0,2.0,84.2,4.0,3.0,6.5*5D"
+    )
+    assert not parser.handle_sentence(b"$GNVTG,359.46,T,,M,0.052,N,0.096,K,A*26")
+    assert parser.sentences == sentences + 3
+    assert parser.handle_sentence(
+        b"$GNRMC,173205.00,A,3745.60325,N,12229.86217,W,0.052,359.46,140623,,,A*6F"
+    )
+
+
+def test_parser_discards_runaway_lines():
+    """Noise without line endings does not grow the buffer."""
+    parser = NmeaParser()
+    parser.feed(b"\xff" * 1000)
+    assert parser.buffer == bytearray()
+    parser.feed(RECORDING)
+    assert parser.tpv() is not None
+
+
+def test_nmea_tpv_to_cot():
+    """The NMEA TPV feeds the existing CoT conversion."""
+    parser = NmeaParser("/dev/ttyACM0")
+    parser.feed(RECORDING)
+    event = position_to_cot_xml(
+        parser.tpv(), {"COT_UID": "nmea", "COCKPIT_URL": "http://n.local:9090/"}
+    )
+    assert event.find("point").get("lat") == "37.76"
+    assert event.find("point").get("hae") == "20.6"
+
+
+def test_nmea_configured():
+    """NMEA_DEVICE selects the NMEA source unless a static position is set."""
+    assert nmea_configured({"NMEA_DEVICE": "/dev/ttyACM0"})
+    assert not gpsd_stream_configured({"NMEA_DEVICE": "/dev/ttyACM0"})
+    assert not nmea_configured(
+        {"NMEA_DEVICE": "/dev/ttyACM0", "STATIC_LAT": "1", "STATIC_LON": "2"}
+    )
+    assert not nmea_configured({})
+
+
+@pytest.mark.asyncio
+async def test_reader_over_pty():
+    """The reader parses recorded NMEA written to the other end of a pty."""
+    master, slave = os.openpty()
+    reader = NmeaReader(os.ttyname(slave), baud=115200, backoff_initial=0.05)
+    task = asyncio.ensure_future(reader.run())
+    try:
+        await asyncio.sleep(0.05)
+        for start in range(0, len(RECORDING), 64):
+            os.write(master, RECORDING[start:start + 64])
+        tpv = await reader.wait(timeout=5)
+        for _ in range(50):
+            if reader.latest()["time"].endswith("05.000Z"):
+                break
+            await asyncio.sleep(0.02)
+        assert tpv is not None
+        assert reader.latest()["time"] == "2023-06-14T17:32:05.000Z"
+        assert reader.fix_age() < 5
+    finally:
+        task.cancel()
+        os.close(master)
+        os.close(slave)
+
+
+@pytest.mark.asyncio
+async def test_reader_fix_expires_when_device_goes_quiet():
+    """A fix is not reported forever after the receiver stops talking."""
+    master, slave = os.openpty()
+    reader = NmeaReader(os.ttyname(slave), backoff_initial=0.05, max_age=0.3)
+    task = asyncio.ensure_future(reader.run())
+    try:
+        await asyncio.sleep(0.05)
+        os.write(master, RECORDING)
+        assert await reader.wait(timeout=5) is not None
+        await asyncio.sleep(0.5)
+        assert reader.latest() is None
+        assert reader.parser.tpv() is not None
+    finally:
+        task.cancel()
+        os.close(master)
+        os.close(slave)
+
+
+@pytest.mark.asyncio
+async def test_reader_ignores_sentences_without_position():
+    """Only RMC/GGA refresh the fix age and reach ``on_tpv``."""
+    master, slave = os.openpty()
+    reader = NmeaReader(os.ttyname(slave), backoff_initial=0.05, max_age=0.3)
+    samples = []
+    reader.on_tpv = samples.append
+    task = asyncio.ensure_future(reader.run())
+    try:
+        await asyncio.sleep(0.05)
+        os.write(master, RECORDING)
+        assert await reader.wait(timeout=5) is not None
+        received, count = reader.tpv_received, len(samples)
+        for _ in range(8):
+            os.write(master, GSA)
+            os.write(master, b"$GNGST,173205.00,12,3.0,2.0,84.2,4.0,3.0,6.5*5D\r\n")
+            await asyncio.sleep(0.05)
+        assert reader.tpv_received == received
+        assert len(samples) == count
+        assert reader.latest() is None
+    finally:
+        task.cancel()
+        os.close(master)
+        os.close(slave)
+
+
+def test_max_age_from_poll_interval():
+    """The NMEA fix outlives two polls at most."""
+    assert NmeaReader.from_config({"POLL_INTERVAL": "3"}).max_age == 6
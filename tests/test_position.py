@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Position source tests."""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from lincot.position import fix_age, fix_time, gps_info_from_command, is_valid_fix
+
+NO_FIX = '{"class":"TPV","mode":1}'
+FIX = '{"class":"TPV","mode":3,"lat":45.0,"lon":-122.0}'
+
+
+def _script(tmp_path, body: str) -> str:
+    script = tmp_path / "gps.sh"
+    script.write_text("#!/bin/sh\n" + body, encoding="utf-8")
+    script.chmod(0o755)
+    return str(script)
+
+
+@pytest.mark.asyncio
+async def test_gps_command_stops_at_first_fix(tmp_path):
+    """The command is killed as soon as a TPV with a fix is read."""
+    command = _script(
+        tmp_path,
+        f"echo '{{\"class\":\"VERSION\"}}'\necho '{NO_FIX}'\necho '{FIX}'\nsleep 30\n",
+    )
+    started = time.monotonic()
+    tpv = await gps_info_from_command(command, 10)
+    assert time.monotonic() - started < 5
+    assert tpv["lat"] == 45.0
+
+
+@pytest.mark.asyncio
+async def test_gps_command_timeout(tmp_path):
+    """A hung command is killed at the deadline instead of stalling the loop."""
+    command = _script(tmp_path, f"echo '{NO_FIX}'\nsleep 30\n")
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        await gps_info_from_command(command, 0.3)
+    assert time.monotonic() - started < 5
+
+
+@pytest.mark.asyncio
+async def test_gps_command_reads_gpspipe_fixture():
+    """Recorded gpspipe output is parsed into a TPV dict."""
+    command = f"{sys.executable} {Path(__file__).parent / 'test_gpspipe'}"
+    tpv = await gps_info_from_command(command, 10)
+    assert tpv["class"] == "TPV"
+    assert tpv["lat"] == 37.760050100
+
+
+@pytest.mark.asyncio
+async def test_gps_command_returns_last_tpv_at_exit(tmp_path):
+    """Without a valid fix, the last TPV printed before exit is returned."""
+    command = _script(tmp_path, f"echo '{NO_FIX}'\necho '{{\"class\":\"TPV\"}}'\n")
+    tpv = await gps_info_from_command(command, 10)
+    assert tpv == {"class": "TPV"}
+
+
+def test_is_valid_fix():
+    """Only 2D/3D fixes with coordinates are valid."""
+    assert is_valid_fix({"class": "TPV", "mode": 2, "lat": 1.0, "lon": 2.0})
+    assert not is_valid_fix({"class": "TPV", "mode": 1, "lat": 1.0, "lon": 2.0})
+    assert not is_valid_fix({"class": "TPV", "mode": 3})
+
+
+def test_fix_time_parses_gpsd_timestamps():
+    """TPV times with and without fractions parse as UTC; junk is ignored."""
+    assert fix_time({"time": "2023-06-14T17:32:03.000Z"}) == 1686763923.0
+    assert fix_time({"time": "2023-06-14T17:32:03Z"}) == 1686763923.0
+    assert fix_time({"time": "2023-06-14T17:32:03.25Z"}) == 1686763923.25
+    assert fix_time({"time": "yesterday"}) is None
+    assert fix_time({}) is None
+    assert fix_age({"time": "2023-06-14T17:32:03Z"}, now=1686763933.0) == 10.0
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Detail provider plugin tests."""
+
+import asyncio
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import lincot
+from lincot import providers
+from lincot.functions import position_to_cot, position_to_cot_xml
+from lincot.providers import DetailProvider, load_providers, set_active
+
+GPS_INFO = {"class": "TPV", "lat": 1.0, "lon": 2.0}
+CONFIG = {"COT_UID": "provider-node", "COCKPIT_URL": "http://provider.local:9090/"}
+
+
+@pytest.fixture(autouse=True)
+def no_active_providers():
+    set_active([])
+    yield
+    set_active([])
+
+
+@lincot.detail_provider(ttl=30, timeout=1)
+async def battery(_config):
+    status = ET.Element("status")
+    status.set("battery", "87")
+    return [status, "Battery: 87%"]
+
+
+def temperature(_config):
+    return "Temp: 41C"
+
+
+@pytest.mark.asyncio
+async def test_provider_output_is_added_to_events():
+    """Cached elements go into <detail>, strings into remarks."""
+    active = [DetailProvider("battery", battery), DetailProvider("temp", temperature)]
+    await asyncio.gather(*(provider.refresh(CONFIG) for provider in active))
+    set_active(active)
+    assert active[0].ttl == 30 and active[0].timeout == 1
+
+    cot = position_to_cot_xml(GPS_INFO, CONFIG)
+    assert cot.find("detail/status").attrib["battery"] == "87"
+    remarks = cot.find("detail/remarks").text
+    assert "Battery: 87%" in remarks and "Temp: 41C" in remarks
+    assert b'<status battery="87" />' in position_to_cot(GPS_INFO, CONFIG)
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_keeps_previous_output():
+    """A provider that times out keeps its last good result."""
+    calls = []
+
+    async def flaky(_config):
+        calls.append(1)
+        if len(calls) > 1:
+            await asyncio.sleep(10)
+        return "Modem: LTE"
+
+    provider = DetailProvider("modem", flaky, ttl=60, timeout=0.1)
+    await provider.refresh(CONFIG)
+    started = time.monotonic()
+    await provider.refresh(CONFIG)
+    assert time.monotonic() - started < 1
+    assert provider.remarks == ("Modem: LTE",)
+    assert provider.failures == 1
+
+
+@pytest.mark.asyncio
+async def test_provider_refreshes_on_ttl():
+    """Providers are called once per TTL, not once per event."""
+    calls = []
+
+    async def counter(_config):
+        calls.append(1)
+        return f"Calls: {len(calls)}"
+
+    provider = DetailProvider("counter", counter, ttl=0.2, timeout=1)
+    set_active([provider])
+    task = asyncio.ensure_future(provider.run(CONFIG))
+    await asyncio.sleep(0.05)
+    for _ in range(5):
+        position_to_cot(GPS_INFO, CONFIG)
+    assert len(calls) == 1
+    await asyncio.sleep(0.25)
+    task.cancel()
+    assert len(calls) == 2
+
+
+def test_load_providers_from_entry_points(monkeypatch):
+    """DETAIL_PROVIDERS selects installed entry points by name."""
+
+    class _EntryPoint:
+        def __init__(self, name, func):
+            self.name = name
+            self._func = func
+
+        def load(self):
+            return self._func
+
+    monkeypatch.setattr(
+        providers,
+        "_entry_points",
+        lambda: [_EntryPoint("battery", battery), _EntryPoint("temp", temperature)],
+    )
+    assert [p.name for p in load_providers({})] == ["battery", "temp"]
+    assert [p.name for p in load_providers({"DETAIL_PROVIDERS": "temp"})] == ["temp"]
+    assert load_providers({"DETAIL_PROVIDERS": "none"}) == []
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Offline replay tests."""
+
+import asyncio
+import gzip
+import json
+import sys
+
+import pytest
+
+from lincot import commands, replay
+
+CONFIG = {"COT_UID": "replay-node", "COCKPIT_URL": "http://replay.local:9090/"}
+
+
+def _log(path, count=20, compress=False):
+    lines = []
+    for index in range(count):
+        lines.append(
+            json.dumps(
+                {
+                    "class": "TPV",
+                    "mode": 3,
+                    "lat": 45.0 + index / 1000,
+                    "lon": -122.0,
+                    "time": f"2023-06-14T17:32:{index:02d}.000Z",
+                }
+            )
+        )
+        lines.append('{"class":"SKY","satellites":[]}')
+    lines.append("not json")
+    data = ("\n".join(lines) + "\n").encode()
+    path.write_bytes(gzip.compress(data) if compress else data)
+    return str(path)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_open_log_detects_gzip(tmp_path, compress):
+    """gzip'd logs are recognized by content, not by file name."""
+    with replay.open_log(_log(tmp_path / "log", 3, compress)) as log:
+        assert sum(1 for _ in log) == 7
+
+
+def test_iter_batches_preserves_order(tmp_path):
+    """Batches converted across processes come back in input order."""
+    with replay.open_log(_log(tmp_path / "log.json", 20)) as log:
+        batches = list(replay.iter_batches(log, CONFIG, jobs=2, batch_size=3))
+    events = [event for batch in batches for _, event in batch]
+    assert len(events) == 20
+    lats = [float(event.split(b'lat="', 1)[1].split(b'"', 1)[0]) for event in events]
+    assert lats == [round(45.0 + index / 1000, 3) for index in range(20)]
+
+
+def test_pacer_scales_recorded_spacing():
+    """Delays follow the fix times divided by the speed factor."""
+    pacer = replay.Pacer(speed=2.0)
+    assert pacer.delay(100.0, now=10.0) == 0.0
+    assert pacer.delay(104.0, now=10.5) == 1.5
+    assert pacer.delay(None, now=10.5) == 0.0
+    assert replay.Pacer(speed=0).delay(200.0, now=0.0) == 0.0
+
+
+def test_replay_to_file(tmp_path, monkeypatch):
+    """``lincot replay`` writes every converted fix to the output file."""
+    output = tmp_path / "out.xml"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "lincot",
+            "replay",
+            _log(tmp_path / "log.gz", 5, True),
+            "--fast",
+            "-j",
+            "1",
+            "-o",
+            str(output),
+            "-c",
+            str(tmp_path / "missing.ini"),
+        ],
+    )
+    for key, val in CONFIG.items():
+        monkeypatch.setenv(key, val)
+    with pytest.raises(SystemExit) as exit_info:
+        commands.main()
+    assert exit_info.value.code == 0
+    assert output.read_bytes().count(b"<event ") == 5
+    assert output.read_bytes().count(b'uid="replay-node"') == 5
+
+
+@pytest.mark.asyncio
+async def test_replay_to_cot_url(tmp_path):
+    """Events can be sent to a TCP COT_URL."""
+    received = bytearray()
+
+    async def _handle(reader, _writer):
+        received.extend(await reader.read())
+
+    server = await asyncio.start_server(_handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    config = replay.load_config("")
+    config["COT_URL"] = f"tcp://127.0.0.1:{port}"
+    config["TAK_PROTO"] = "0"
+    with replay.open_log(_log(tmp_path / "log.json", 4)) as log:
+        batches = replay.iter_batches(log, CONFIG)
+        assert await replay._replay_to_url(batches, config, 0) == 4
+    async with server:
+        for _ in range(50):
+            if received.count(b"<event ") == 4:
+                break
+            await asyncio.sleep(0.02)
+    assert received.count(b"<event ") == 4
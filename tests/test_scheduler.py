@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Drift-free scheduler tests."""
+
+import asyncio
+import time
+
+import pytest
+
+from lincot.metrics import Counter
+from lincot.scheduler import Schedule, phase_from_config, uid_phase
+
+
+def test_deadlines_do_not_drift():
+    """Time spent working is taken out of the sleep, not added to the period."""
+    schedule = Schedule(10)
+    assert schedule.delay(now=0.0) == 10.0
+    assert schedule.delay(now=13.0) == 7.0  # 3 s of work after the 10 s tick
+    assert schedule.delay(now=29.5) == 0.5
+    assert schedule.missed == 0
+
+
+def test_missed_deadlines_are_counted_not_stretched():
+    """Overrunning work starts the next tick at once and skips to the grid."""
+    counter = Counter("test_missed_total", "")
+    schedule = Schedule(10, missed_counter=counter)
+    schedule.delay(now=0.0)  # first tick at 10, the one after at 20
+    assert schedule.delay(now=35.0) == 0.0  # 20 and 30 both passed
+    assert schedule.missed == counter.value == 2
+    assert schedule.deadline == 40.0
+    assert schedule.delay(now=36.0) == 4.0
+
+
+def test_phase_aligns_to_wall_clock():
+    """A phased schedule ticks at phase seconds past each wall-clock period."""
+    schedule = Schedule(60, phase=15)
+    delay = schedule.delay(now=100.0, wall=1000.0)
+    assert (1000.0 + delay) % 60 == 15
+    assert schedule.delay(now=100.0 + delay) == 60.0
+
+
+def test_jitter_does_not_move_deadlines():
+    """Jitter delays a tick but the following deadline stays on the grid."""
+    schedule = Schedule(10, jitter=100)
+    assert schedule.jitter == 5.0  # at most half the period
+    assert schedule.delay(now=0.0, jitter=4.0) == 14.0
+    assert schedule.delay(now=15.0, jitter=0.0) == 5.0
+
+
+def test_uid_phase_is_stable_and_spread():
+    """The uid hash gives each node its own, repeatable slot."""
+    phases = {uid_phase(f"node-{index}", 60) for index in range(50)}
+    assert all(0 <= phase < 60 for phase in phases)
+    assert len(phases) == 50
+    assert uid_phase("node-1", 60) == uid_phase("node-1", 60)
+    config = {"COT_UID": "node-1", "SCHEDULE_PHASE": "uid"}
+    assert phase_from_config(config, 60) == uid_phase("node-1", 60)
+
+
+@pytest.mark.parametrize("value", ["later", "-5"])
+def test_invalid_phase(value):
+    """SCHEDULE_PHASE is 'uid' or a non-negative number of seconds."""
+    with pytest.raises(ValueError):
+        phase_from_config({"SCHEDULE_PHASE": value}, 60)
+
+
+def test_default_is_unphased():
+    """Without SCHEDULE_PHASE the first tick is one period after start."""
+    assert phase_from_config({}, 60) is None
+    assert phase_from_config({"SCHEDULE_PHASE": "75"}, 60) == 15.0
+
+
+@pytest.mark.asyncio
+async def test_wait_returns_at_once_when_late():
+    """A late tick does not sleep a full period."""
+    schedule = Schedule(0.05)
+    await schedule.wait()
+    await asyncio.sleep(0.12)
+    started = time.monotonic()
+    await schedule.wait()
+    assert time.monotonic() - started < 0.04
+    assert schedule.missed == 2
+
+
+def test_set_period_rebases_on_last_tick():
+    """A new period applies from the tick just served."""
+    schedule = Schedule(60)
+    assert schedule.delay(now=0.0) == 60.0
+    schedule.set_period(5)
+    assert schedule.delay(now=61.0) == 4.0
+    schedule.set_period(600)
+    assert schedule.delay(now=66.0) == 599.0
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Fleet simulator tests."""
+
+import asyncio
+import sys
+
+import pytest
+
+from lincot import commands
+from lincot.coalesce import event_uid
+from lincot.sink import Sink
+from lincot.simulate import Fleet, _simulate_to_url
+from lincot.tak_proto import STREAM
+
+BASE = {"STATIC_LAT": "45.0", "STATIC_LON": "-122.0"}
+
+
+def test_fleet_is_reproducible():
+    """The same seed gives the same tracks; each node has its own identity."""
+    fleets = [Fleet(BASE, nodes=3, seed=seed) for seed in (7, 7, 8)]
+    tpvs = []
+    for fleet in fleets:
+        events = fleet.report(2)
+        tpvs.append(fleet.tracks[2].tpv(now=1686763923.0))
+    assert tpvs[0] == tpvs[1] != tpvs[2]
+    assert event_uid(events[0]) == "lincot-sim-0002"
+    assert b'callsign="lincot-sim-0002"' in events[0]
+    assert b"Position: gpsd" in events[0]
+
+
+@pytest.mark.asyncio
+async def test_fleet_runs_every_node():
+    """Every node reports position and sensor events on its interval."""
+    sent = []
+
+    async def _send(event):
+        sent.append(event)
+
+    fleet = Fleet(BASE, nodes=5, interval=0.05, sensor=True)
+    summary = await fleet.run(_send, duration=0.2)
+    uids = {event_uid(event) for event in sent}
+    assert len(uids) == 10
+    assert "SENSOR.lincot-sim-0004" in uids
+    assert summary["events"] == len(sent) >= 30
+    assert summary["bytes"] == sum(map(len, sent))
+    assert summary["cpu_us_per_event"] > 0
+
+
+def test_tak_proto_fleet():
+    """With TAK_PROTO set, nodes emit protobuf."""
+    fleet = Fleet(dict(BASE, TAK_PROTO="1", COT_URL="tcp://127.0.0.1:1"), nodes=1)
+    assert fleet.wire == STREAM
+    assert fleet.report(0)[0].startswith(b"\xbf")
+
+
+@pytest.mark.asyncio
+async def test_fleet_into_sink():
+    """A simulated fleet sent over TCP is counted by the sink, per uid."""
+    sink = Sink()
+    _, host, port = await sink.listen("tcp://127.0.0.1:0")
+    try:
+        fleet = Fleet(BASE, nodes=4, interval=0.05)
+        summary = await _simulate_to_url(
+            fleet, dict(BASE, COT_URL=f"tcp://{host}:{port}"), 0.2
+        )
+        for _ in range(100):
+            if sink.stats.events >= summary["events"]:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        sink.close()
+    stats = sink.stats.summary()
+    assert stats["events"] == summary["events"]
+    assert stats["bytes"] == summary["bytes"]
+    assert stats["uids"] == 4
+
+
+def test_simulate_command(tmp_path, monkeypatch):
+    """``lincot simulate`` writes the fleet's events to a file."""
+    output = tmp_path / "fleet.cot"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["lincot", "simulate", "-o", str(output), "-n", "3", "-i", ".05", "-d", ".12"],
+    )
+    with pytest.raises(SystemExit) as exit_info:
+        commands.main()
+    assert exit_info.value.code == 0
+    assert output.read_bytes().count(b"<event ") >= 6
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Local CoT sink tests."""
+
+import asyncio
+import time
+
+import pytest
+
+from lincot.functions import position_to_cot, position_to_proto
+from lincot.sink import EventSplitter, Sink, SinkStats, run_sink
+
+CONFIG = {"COT_UID": "sink-node", "COCKPIT_URL": "http://sink.local:9090/"}
+TPV = {"class": "TPV", "lat": 1.0, "lon": 2.0}
+
+
+def test_jitter_is_per_uid():
+    """Gaps are measured between events of the same uid."""
+    stats = SinkStats()
+    alpha = position_to_cot(TPV, CONFIG)
+    bravo = position_to_cot(TPV, dict(CONFIG, COT_UID="bravo"))
+    for now, event in ((0.0, alpha), (0.1, bravo), (1.0, alpha), (1.1, bravo),
+                       (3.0, alpha)):
+        stats.record(event, now=now)
+    summary = stats.summary()
+    assert (summary["events"], summary["uids"], summary["seconds"]) == (5, 2, 3.0)
+    assert summary["gap_mean_ms"] == pytest.approx(1000 * 4 / 3)
+    assert summary["gap_max_ms"] == 2000.0
+    assert summary["jitter_ms"] == pytest.approx(471.405, abs=0.01)
+
+
+def test_splitter_handles_xml_and_protobuf():
+    """XML and stream-framed protobuf events are split across chunk boundaries."""
+    xml = position_to_cot(TPV, CONFIG)
+    proto = position_to_proto(TPV, CONFIG, "stream")
+    stream = xml + proto + b"\n" + xml
+    splitter = EventSplitter()
+    events = []
+    for start in range(0, len(stream), 7):
+        events.extend(splitter.feed(stream[start:start + 7]))
+    assert events == [xml.strip(), proto, xml.strip()]
+
+
+@pytest.mark.asyncio
+async def test_udp_sink_counts_datagrams():
+    """Each UDP datagram is one event."""
+    sink = Sink()
+    _, host, port = await sink.listen("udp://127.0.0.1:0")
+    try:
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(host, port)
+        )
+        event = position_to_cot(TPV, CONFIG)
+        for _ in range(3):
+            transport.sendto(event)
+        transport.close()
+        for _ in range(100):
+            if sink.stats.events == 3:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        sink.close()
+    assert sink.stats.summary()["bytes"] == 3 * len(event)
+
+
+@pytest.mark.asyncio
+async def test_rejects_unknown_scheme():
+    """Only udp:// and tcp:// can be listened on."""
+    with pytest.raises(ValueError):
+        await Sink().listen("tls://127.0.0.1:0")
+
+
+@pytest.mark.asyncio
+async def test_sink_without_reports_idles(capsys):
+    """With no progress lines the sink sleeps instead of spinning on the loop."""
+    cpu = time.process_time()
+    started = time.monotonic()
+    summary = await run_sink(["udp://127.0.0.1:0"], 0.5, 0)
+    assert time.monotonic() - started >= 0.5
+    assert time.process_time() - cpu < 0.25
+    assert summary["events"] == 0
+    assert "{" not in capsys.readouterr().err
+
+    task = asyncio.ensure_future(run_sink(["udp://127.0.0.1:0"], 0, 0))
+    await asyncio.sleep(0.3)
+    assert not task.done()
+    task.cancel()
+    assert (await asyncio.wait_for(task, 1))["events"] == 0
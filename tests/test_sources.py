@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Multi-source (SOURCES) tests."""
+
+import asyncio
+import time
+
+import pytest
+
+import lincot
+from lincot.bus import PositionBus
+from lincot.sources import Failover, backups, source_config, source_names
+
+CONFIG = {
+    "COT_URL": "udp://239.2.3.1:6969",
+    "COT_UID": "host-node",
+    "CALLSIGN": "host",
+    "POLL_INTERVAL": "2",
+    "NMEA_DEVICE": "/dev/ttyACM0",
+    "SOURCES": "cab, trailer",
+    "SOURCE_TRAILER_NMEA_DEVICE": "/dev/ttyUSB0",
+    "SOURCE_TRAILER_CALLSIGN": "trailer-7",
+}
+
+
+def _tpv(age: float, lat: float = 45.0) -> dict:
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(time.time() - age))
+    return {"class": "TPV", "mode": 3, "lat": lat, "lon": -122.0, "time": stamp}
+
+
+class _CLITool:
+    tx_queue = asyncio.Queue()
+
+
+def test_source_config_layers_over_top_level():
+    """Sources inherit shared keys but not the receiver or the identity."""
+    cab = source_config(CONFIG, "cab")
+    trailer = source_config(CONFIG, "trailer")
+    assert cab["POLL_INTERVAL"] == trailer["POLL_INTERVAL"] == "2"
+    assert "NMEA_DEVICE" not in cab
+    assert trailer["NMEA_DEVICE"] == "/dev/ttyUSB0"
+    assert trailer["CALLSIGN"] == "trailer-7"
+    assert cab["CALLSIGN"].endswith("-cab")
+    assert cab["COT_UID"].endswith("-cab") and trailer["COT_UID"].endswith("-trailer")
+    assert not any(key.startswith("SOURCE") for key in trailer)
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        {"SOURCES": "cab, trailer-1"},
+        {"SOURCES": "cab, CAB"},
+        {"SOURCES": "cab", "SOURCE_CAB_BACKUP": "cab"},
+        {"SOURCES": "cab", "SOURCE_CAB_BACKUP": "mast"},
+        {
+            "SOURCES": "a, b, c",
+            "SOURCE_A_BACKUP": "c",
+            "SOURCE_B_BACKUP": "c",
+        },
+    ],
+)
+def test_invalid_sources(config):
+    """Bad names and backup pairs fail at startup."""
+    with pytest.raises(ValueError):
+        backups(config)
+
+
+def test_single_source_mode():
+    """Without SOURCES nothing changes."""
+    assert not source_names({})
+    assert not backups({})
+
+
+@pytest.mark.asyncio
+async def test_failover_relays_backup_while_primary_is_stale():
+    """The backup is reported only while the primary has no recent fix."""
+    primary, backup = PositionBus(), PositionBus()
+    failover = Failover("cab", primary, backup, after=5, backup_name="trailer")
+
+    fix = await primary.publish(_tpv(0, lat=1.0), "nmea")
+    await failover.relay(fix, from_backup=False)
+    fix = await backup.publish(_tpv(0, lat=2.0), "nmea")
+    await failover.relay(fix, from_backup=True)
+    assert failover.bus.latest().tpv["lat"] == 1.0
+
+    # A stale TPV (receiver lost its fix, gpsd keeps repeating it).
+    fix = await primary.publish(_tpv(30, lat=1.0), "nmea")
+    await failover.relay(fix, from_backup=False)
+    fix = await backup.publish(_tpv(0, lat=2.0), "nmea")
+    await failover.relay(fix, from_backup=True)
+    assert failover.bus.latest().tpv["lat"] == 2.0
+    assert failover.active == "trailer"
+
+    fix = await primary.publish(_tpv(0, lat=3.0), "nmea")
+    await failover.relay(fix, from_backup=False)
+    assert failover.bus.latest().tpv["lat"] == 3.0
+    assert failover.active == "cab"
+
+
+@pytest.mark.asyncio
+async def test_failover_when_primary_loses_fix():
+    """Current no-fix TPVs from the primary do not keep it in charge."""
+    primary, backup = PositionBus(), PositionBus()
+    failover = Failover("cab", primary, backup, after=5, backup_name="trailer")
+
+    await primary.publish({"class": "TPV", "mode": 1, "time": _tpv(0)["time"]}, "gpsd")
+    fix = await backup.publish(_tpv(0, lat=2.0), "nmea")
+    assert failover.use_backup()
+    await failover.relay(fix, from_backup=True)
+    assert failover.bus.latest().tpv["lat"] == 2.0
+    assert failover.active == "trailer"
+
+
+@pytest.mark.asyncio
+async def test_failover_run_follows_both_buses():
+    """The relay task picks up fixes from whichever bus publishes."""
+    primary, backup = PositionBus(), PositionBus()
+    failover = Failover("cab", primary, backup, after=5)
+    task = asyncio.ensure_future(failover.run())
+    try:
+        await asyncio.sleep(0)
+        await backup.publish(_tpv(0, lat=2.0), "nmea")
+        fix = await asyncio.wait_for(failover.bus.wait(0), 1)
+        assert fix.tpv["lat"] == 2.0
+        await primary.publish(_tpv(0, lat=1.0), "nmea")
+        fix = await asyncio.wait_for(failover.bus.wait(fix.seq), 1)
+        assert fix.tpv["lat"] == 1.0
+    finally:
+        task.cancel()
+
+
+def test_create_tasks_one_worker_per_identity():
+    """Each source gets a position service; backups do not report themselves."""
+    config = dict(CONFIG, SOURCES="cab, trailer, spare", SOURCE_CAB_BACKUP="spare")
+    tasks = lincot.create_tasks(config, _CLITool)
+    services = [task for task in tasks if isinstance(task, lincot.PositionService)]
+    workers = [task for task in tasks if isinstance(task, lincot.LincotWorker)]
+    failovers = [task for task in tasks if isinstance(task, lincot.FailoverWorker)]
+    assert len(services) == 3
+    assert len({worker.settings.cot_uid for worker in workers}) == 2
+    assert len(failovers) == 1
+    cab = next(w for w in workers if w.settings.cot_uid.endswith("-cab"))
+    assert cab.bus is failovers[0].failover.bus
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Store-and-forward spool tests."""
+
+import asyncio
+import os
+
+import pytak
+import pytest
+
+import lincot
+from lincot import metrics
+from lincot.coalesce import Backfill, CoalescingQueue, event_uid
+from lincot.spool import (
+    HEADER,
+    RECORD_SIZE,
+    Spool,
+    close_spools,
+    decode_record,
+    encode_record,
+    get_recorder,
+    get_spool,
+)
+
+SMALL_SEGMENT = HEADER.size + 4 * RECORD_SIZE
+CONFIG = {"COT_UID": "spool-node", "COCKPIT_URL": "http://spool.local:9090/"}
+
+
+@pytest.fixture(autouse=True)
+def close_all():
+    yield
+    close_spools()
+
+
+def _tpv(step: int) -> dict:
+    return {
+        "class": "TPV",
+        "mode": 3,
+        "time": f"2023-06-14T17:{step // 60:02d}:{step % 60:02d}.250Z",
+        "lat": 45.0 + step / 1000,
+        "lon": -122.0,
+        "altHAE": 20.626,
+        "epx": 3.0,
+        "epy": 4.0,
+        "track": 90.0,
+        "speed": 1.5,
+    }
+
+
+def _segments(directory) -> list:
+    return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def test_record_round_trip():
+    """Records are compact, checksummed and decode back to a TPV."""
+    record = encode_record(_tpv(3))
+    assert len(record) == RECORD_SIZE == 48
+    assert decode_record(record) == {
+        "class": "TPV",
+        "mode": 3,
+        "time": "2023-06-14T17:00:03.250000Z",
+        "lat": 45.003,
+        "lon": -122.0,
+        "altHAE": 20.626,
+        "eph": 5.0,
+        "track": 90.0,
+        "speed": 1.5,
+    }
+    assert decode_record(record[:-1] + bytes([record[-1] ^ 1])) is None
+    assert encode_record({"class": "TPV", "mode": 1}) is None
+    assert decode_record(encode_record({"lat": 1.0, "lon": 2.0}, now=0.0))["mode"] == 2
+
+
+def test_segments_rotate_and_cap(tmp_path):
+    """Full segments rotate and the oldest is dropped at the size cap."""
+    dropped = metrics.SPOOL_DROPPED.value
+    spool = Spool(
+        str(tmp_path), segment_bytes=SMALL_SEGMENT, max_bytes=3 * SMALL_SEGMENT
+    )
+    for step in range(14):
+        spool.append(_tpv(step))
+    assert _segments(tmp_path) == ["0000000001.seg", "0000000002.seg", "0000000003.seg"]
+    assert spool.pending == 10
+    assert metrics.SPOOL_DROPPED.value == dropped + 4
+    assert spool.peek()["lat"] == 45.004
+
+
+def test_drained_segments_are_deleted(tmp_path):
+    """Draining walks the records in order and removes spent segments."""
+    spool = Spool(str(tmp_path), segment_bytes=SMALL_SEGMENT)
+    for step in range(6):
+        spool.append(_tpv(step))
+    drained = []
+    while (tpv := spool.peek()) is not None:
+        drained.append(tpv["lat"])
+        spool.advance()
+    assert drained == [45.0, 45.001, 45.002, 45.003, 45.004, 45.005]
+    assert _segments(tmp_path) == ["0000000001.seg"]
+    spool.append(_tpv(6))
+    assert spool.peek()["lat"] == 45.006
+
+
+def test_recovery_after_crash(tmp_path):
+    """Reopening resumes from the header cursors and skips damage."""
+    spool = Spool(str(tmp_path), segment_bytes=SMALL_SEGMENT)
+    for step in range(10):
+        spool.append(_tpv(step))
+    for _ in range(3):
+        spool.peek()
+        spool.advance()
+    spool.close()  # as if the process died: nothing else is written
+    with open(tmp_path / "0000000000.seg", "r+b") as segment:
+        segment.seek(HEADER.size + 3 * RECORD_SIZE)
+        segment.write(b"\xff" * 8)
+    (tmp_path / "0000000009.seg").write_bytes(b"junk")
+
+    spool = Spool(str(tmp_path), segment_bytes=SMALL_SEGMENT)
+    assert spool.pending == 7
+    assert "0000000009.seg" not in _segments(tmp_path)
+    assert spool.peek()["lat"] == 45.004  # corrupt record 45.003 skipped
+    for step in range(10, 13):
+        spool.append(_tpv(step))
+    assert _segments(tmp_path)[-1] == "0000000010.seg"
+
+
+@pytest.mark.asyncio
+async def test_spool_worker_backfills_at_rate(tmp_path):
+    """Spooled fixes are replayed in order, with their own times, never coalesced."""
+    config = dict(CONFIG, SPOOL_DIR=str(tmp_path), SPOOL_DRAIN_RATE="1000")
+    spool = get_spool(config)
+    for step in range(5):
+        spool.append(_tpv(step))
+    queue = CoalescingQueue()
+    worker = lincot.SpoolWorker(queue, config)
+    drained = metrics.SPOOL_DRAINED.value
+    await asyncio.wait_for(worker.run(), 5)
+    assert queue.qsize() == 5
+    events = [queue.get_nowait() for _ in range(5)]
+    assert all(isinstance(event, Backfill) for event in events)
+    assert {event_uid(event) for event in events} == {"spool-node"}
+    assert b'time="2023-06-14T17:00:00.250000Z"' in events[0]
+    assert b'lat="45.004"' in events[4]
+    # Queued is not sent: the spool keeps every record until TX acknowledges it.
+    assert spool.pending == 5
+    for event in events:
+        event.on_sent()
+    assert spool.pending == 0
+    assert metrics.SPOOL_DRAINED.value == drained + 5
+
+
+@pytest.mark.asyncio
+async def test_backfill_survives_disconnect(tmp_path):
+    """Records queued but not sent before a disconnect are backfilled again."""
+    config = dict(CONFIG, SPOOL_DIR=str(tmp_path), SPOOL_DRAIN_RATE="1000")
+    spool = get_spool(config)
+    for step in range(4):
+        spool.append(_tpv(step))
+    queue = asyncio.Queue()
+    await asyncio.wait_for(lincot.SpoolWorker(queue, config).run(), 5)
+    first = [queue.get_nowait() for _ in range(4)]
+    first[0].on_sent()
+    first[1].on_sent()
+    assert spool.pending == 2
+
+    # PyTAK drops its tx_queue with the connection; the rest is never sent.
+    worker = lincot.SpoolWorker(asyncio.Queue(), config)
+    await worker.close()
+    first[3].on_sent()  # a late ack from the old connection changes nothing
+    assert spool.pending == 2
+
+    queue = asyncio.Queue()
+    await asyncio.wait_for(lincot.SpoolWorker(queue, config).run(), 5)
+    again = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert len(again) == 2
+    assert b'lat="45.002"' in again[0]
+    assert b'lat="45.003"' in again[1]
+    again[1].on_sent()
+    assert spool.pending == 2  # held back until the record before it is sent
+    again[0].on_sent()
+    assert spool.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_tx_send_acknowledges_backfill(tmp_path):
+    """The TX worker wrapper acknowledges a backfill event after sending it."""
+    config = dict(CONFIG, SPOOL_DIR=str(tmp_path))
+    spool = get_spool(config)
+    spool.append(_tpv(0))
+    sent = []
+
+    class _TXWorker(pytak.TXWorker):
+        async def send_data(self, data):
+            sent.append(data)
+
+    queue = asyncio.Queue()
+    tx_worker = _TXWorker(queue, {}, writer=None)
+
+    class _CLITool:
+        tx_queue = queue
+        tasks = {tx_worker}
+
+    lincot.create_tasks(config, _CLITool)
+    await asyncio.wait_for(lincot.SpoolWorker(queue, config).run(), 5)
+    event = queue.get_nowait()
+    assert spool.pending == 1
+    await tx_worker.send_data(event)
+    assert sent == [event]
+    assert spool.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_offline_recording_between_connections(tmp_path):
+    """A transport error starts recording; the next SpoolWorker stops it."""
+    config = dict(
+        CONFIG,
+        SPOOL_DIR=str(tmp_path),
+        STATIC_LAT="10.5",
+        STATIC_LON="20.25",
+        POLL_INTERVAL="60",
+    )
+
+    class _CLITool:
+        running_tasks: set = set()
+
+    service = lincot.PositionService(asyncio.Queue(), config)
+    worker = lincot.SpoolWorker(asyncio.Queue(), config, clitool=_CLITool)
+    recorder = get_recorder(worker.spool, config)
+    recorder.follow(service)
+    await worker.close()
+    assert not recorder.running  # a normal shutdown is not an outage
+
+    failed = asyncio.get_running_loop().create_future()
+    failed.set_exception(ConnectionResetError("TAK server went away"))
+    _CLITool.running_tasks = {failed}
+    await worker.close()
+    assert recorder.running
+    for _ in range(100):
+        if worker.spool.pending:
+            break
+        await asyncio.sleep(0.01)
+    assert worker.spool.peek()["lat"] == 10.5
+    assert service.running  # the torn-down service, run again by the recorder
+
+    queue = asyncio.Queue()
+    await asyncio.wait_for(lincot.SpoolWorker(queue, config).run(), 5)
+    assert not recorder.running
+    assert queue.qsize() == 1
+    await asyncio.sleep(0.05)
+    assert not service.running
+
+
+@pytest.mark.asyncio
+async def test_recorder_follows_running_service(tmp_path):
+    """A service that outlives the connection is followed, never run twice."""
+    config = dict(
+        CONFIG,
+        SPOOL_DIR=str(tmp_path),
+        STATIC_LAT="10.5",
+        STATIC_LON="20.25",
+        POLL_INTERVAL="1",
+    )
+    service = lincot.PositionService(asyncio.Queue(), config)
+    service_task = asyncio.ensure_future(service.run())
+    await service.bus.wait()
+    recorder = get_recorder(get_spool(config), config)
+    recorder.follow(service)
+    recorder.start()
+    for _ in range(300):
+        if recorder.spool.pending:
+            break
+        await asyncio.sleep(0.01)
+    assert recorder.spool.pending == 1
+    recorder.stop()
+    await asyncio.sleep(0.05)
+    assert service.running and not service_task.done()
+    service_task.cancel()
+
+
+def test_create_tasks_adds_spool_worker(tmp_path):
+    """The spool worker only runs when SPOOL_DIR is set."""
+
+    class _CLITool:
+        tx_queue = asyncio.Queue()
+
+    def _names(config):
+        return {type(task).__name__ for task in lincot.create_tasks(config, _CLITool)}
+
+    assert "SpoolWorker" not in _names({})
+    config = {"SPOOL_DIR": str(tmp_path)}
+    assert "SpoolWorker" in _names(config)
+    service = get_recorder(get_spool(config), config).service
+    assert isinstance(service, lincot.PositionService)
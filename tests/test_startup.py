@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Import-time budget tests for ``import lincot``."""
+
+import subprocess
+import sys
+
+import pytest
+
+import lincot
+
+# Cumulative microseconds ``import lincot`` may take (measured ~5 ms; PyTAK alone
+# is ~90 ms), generous enough for slow CI runners.
+IMPORT_BUDGET_US = 60_000
+
+# Modules the bare package import must not pull in.
+DEFERRED = (
+    "pytak",
+    "gpsd",
+    "asyncio",
+    "subprocess",
+    "xml.etree.ElementTree",
+    "importlib.metadata",
+    "lincot.classes",
+    "lincot.functions",
+)
+
+
+def _importtime(code: str) -> dict:
+    """Cumulative import time (us) per module for ``code`` in a fresh interpreter."""
+    run = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    times = {}
+    for line in run.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_is_lazy_and_within_budget():
+    """``import lincot`` defers heavy modules and stays under the budget."""
+    times = _importtime("import lincot")
+    assert "lincot" in times
+    assert [name for name in DEFERRED if name in times] == []
+    assert times["lincot"] < IMPORT_BUDGET_US
+
+
+def test_lazy_attributes_resolve():
+    """Public names still resolve, and show up in dir()."""
+    assert lincot.LincotWorker.__name__ == "LincotWorker"
+    assert lincot.position_to_cot is lincot.functions.position_to_cot
+    assert lincot.DEFAULT_SENSOR_ID.startswith("lincot_")
+    assert lincot.__version__
+    assert {"PositionBus", "create_tasks", "__version__"} <= set(dir(lincot))
+
+
+def test_unknown_attribute_raises():
+    """Unknown names raise AttributeError rather than importing anything."""
+    with pytest.raises(AttributeError, match="no_such_name"):
+        getattr(lincot, "no_such_name")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Dead-reckoning suppression tests."""
+
+import asyncio
+
+import pytest
+
+from lincot.classes import LincotWorker
+from lincot.suppression import MovementFilter, distance_m, project
+
+
+def _tpv(lat, lon, track=0.0, speed=0.0):
+    return {"class": "TPV", "lat": lat, "lon": lon, "track": track, "speed": speed}
+
+
+def _offer(movement, tpv, now):
+    """Run the filter the way the workers do: decide, then record what was sent."""
+    if movement.should_send(tpv, now):
+        movement.mark_sent(tpv, now)
+        return True
+    return False
+
+
+def test_project_and_distance():
+    """Projection and haversine distance agree with each other."""
+    lat, lon = project(45.0, -122.0, 90.0, 1000.0)
+    assert distance_m(45.0, -122.0, lat, lon) == pytest.approx(1000.0, rel=1e-6)
+    assert distance_m(0.0, 0.0, 1.0, 0.0) == pytest.approx(111195, rel=1e-3)
+
+
+def test_stationary_reports_are_suppressed_until_keepalive():
+    """Identical fixes are dropped until max-silence forces a keepalive."""
+    movement = MovementFilter(distance=10.0, max_silence=300.0)
+    assert _offer(movement, _tpv(45.0, -122.0), 0.0)
+    assert not _offer(movement, _tpv(45.0, -122.0), 61.0)
+    assert not _offer(movement, _tpv(45.00001, -122.0), 122.0)
+    assert _offer(movement, _tpv(45.0, -122.0), 300.0)
+    assert movement.stats() == {"sent": 2, "suppressed": 2}
+
+
+def test_dead_reckoned_track_is_suppressed():
+    """A vehicle holding course and speed matches its projection."""
+    movement = MovementFilter(distance=25.0, heading=20.0)
+    assert _offer(movement, _tpv(45.0, -122.0, track=90.0, speed=10.0), 0.0)
+    lat, lon = project(45.0, -122.0, 90.0, 600.0)
+    assert not _offer(movement, _tpv(lat, lon, track=90.0, speed=10.0), 60.0)
+    # Stopped: 50 m short of where it would have been projected.
+    lat, lon = project(45.0, -122.0, 90.0, 1150.0)
+    assert _offer(movement, _tpv(lat, lon, track=90.0, speed=0.0), 120.0)
+
+
+def test_heading_change_is_sent():
+    """A turn beyond the heading threshold is reported even on the projection."""
+    movement = MovementFilter(heading=20.0)
+    assert _offer(movement, _tpv(45.0, -122.0, track=90.0, speed=5.0), 0.0)
+    assert not _offer(movement, _tpv(45.0, -122.0, track=100.0, speed=5.0), 1.0)
+    assert _offer(movement, _tpv(45.0, -122.0, track=135.0, speed=5.0), 2.0)
+
+
+def test_undelivered_report_is_not_recorded():
+    """A fix is only remembered once the caller marks it sent."""
+    movement = MovementFilter(distance=10.0)
+    assert movement.should_send(_tpv(45.0, -122.0), now=0.0)
+    # Encoding or queueing failed: the next fix must still go out.
+    assert movement.should_send(_tpv(45.0, -122.0), now=1.0)
+    movement.mark_sent(_tpv(45.0, -122.0), now=1.0)
+    assert not movement.should_send(_tpv(45.0, -122.0), now=2.0)
+    assert movement.stats() == {"sent": 1, "suppressed": 1}
+
+
+def test_disabled_without_thresholds():
+    """No SUPPRESS_* thresholds means no filter."""
+    assert MovementFilter.from_config({}) is None
+    movement = MovementFilter.from_config(
+        {"SUPPRESS_DISTANCE": "15", "SUPPRESS_MAX_SILENCE": "120"}
+    )
+    assert movement.distance == 15.0 and movement.max_silence == 120.0
+
+
+@pytest.mark.asyncio
+async def test_worker_skips_suppressed_reports():
+    """LincotWorker only queues reports that pass the filter."""
+    queue = asyncio.Queue()
+    config = {
+        "COT_URL": "udp://239.2.3.1:6969",
+        "COT_UID": "suppress-node",
+        "COCKPIT_URL": "http://suppress.local:9090/",
+        "SUPPRESS_DISTANCE": "10",
+    }
+    worker = LincotWorker(queue, config)
+    for _ in range(3):
+        await worker.handle_data(_tpv(45.0, -122.0))
+    assert queue.qsize() == 1
+    assert worker.movement_filter.stats() == {"sent": 1, "suppressed": 2}
+
+
+@pytest.mark.asyncio
+async def test_worker_records_only_queued_reports():
+    """A report whose encoding fails does not suppress the next fix."""
+    queue = asyncio.Queue()
+    config = {
+        "COT_URL": "udp://239.2.3.1:6969",
+        "COT_UID": "suppress-node",
+        "COCKPIT_URL": "http://suppress.local:9090/",
+        "SUPPRESS_DISTANCE": "10",
+    }
+    worker = LincotWorker(queue, config)
+    encode = worker.encode
+    worker.encode = lambda data, settings: None
+    await worker.handle_data(_tpv(45.0, -122.0))
+    assert queue.qsize() == 0
+    worker.encode = encode
+    await worker.handle_data(_tpv(45.0, -122.0))
+    assert queue.qsize() == 1
+    assert worker.movement_filter.stats() == {"sent": 1, "suppressed": 0}
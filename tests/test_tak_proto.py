@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Native TAK Protocol Version 1 encoder tests."""
+
+import asyncio
+import datetime
+import struct
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import pytak
+import pytest
+
+import lincot
+from lincot.functions import _position_parts, position_to_cot_xml
+from lincot.settings import Settings
+from lincot.tak_proto import (
+    MESH,
+    STREAM,
+    _flow_tag_key,
+    encode_event,
+    encode_position,
+    wire_format,
+)
+
+FROZEN = datetime.datetime(2023, 6, 14, 17, 32, 3, 250000, tzinfo=datetime.timezone.utc)
+# Generated once with takproto.xml2proto from the XML of GOLDEN_PARTS (mesh and
+# stream) and of the golden sensor beacon (stream), at FROZEN with host id
+# golden@host.
+GOLDEN = Path(__file__).with_name("test_tak_proto_position.bin")
+GOLDEN_STREAM = Path(__file__).with_name("test_tak_proto_position_stream.bin")
+GOLDEN_SENSOR = Path(__file__).with_name("test_tak_proto_sensor.bin")
+GOLDEN_PARTS = {
+    "uid": "golden-uid",
+    "cot_type": "a-f-G-E-S",
+    "stale": 120,
+    "access": "UNCLASSIFIED",
+    "callsign": "golden",
+    "link_url": "http://golden.local:9090",
+    "lat": 45.12345,
+    "lon": -122.5,
+    "hae": 100.5,
+    "ce": "5.0",
+    "le": "9999999.0",
+    "course": "90.0",
+    "speed": "1.5",
+    "remarks": "Golden <node> & ü",
+    "children": [],
+    "fix_time": None,
+}
+
+# Field number -> (name, nested schema or wire type) for the messages we emit.
+CONTACT = {1: "endpoint", 2: "callsign"}
+TRACK = {1: "speed", 2: "course"}
+STATUS = {1: "battery"}
+DETAIL = {
+    1: "xmlDetail",
+    2: ("contact", CONTACT),
+    3: ("group", {1: "name", 2: "role"}),
+    4: ("precisionLocation", {1: "geopointsrc", 2: "altsrc"}),
+    5: ("status", STATUS),
+    6: ("takv", {1: "device", 2: "platform", 3: "os", 4: "version"}),
+    7: ("track", TRACK),
+}
+COT_EVENT = {
+    1: "type", 2: "access", 3: "qos", 4: "opex", 5: "uid", 6: "sendTime",
+    7: "startTime", 8: "staleTime", 9: "how", 10: "lat", 11: "lon", 12: "hae",
+    13: "ce", 14: "le", 15: ("detail", DETAIL),
+}
+TAK_MESSAGE = {2: ("cotEvent", COT_EVENT)}
+
+
+def _varint(data: bytes, pos: int):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def decode(data: bytes, schema: dict) -> dict:
+    """Minimal protobuf decoder for the TAK message subset."""
+    message, pos = {}, 0
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _varint(data, pos)
+        elif wire_type == 1:
+            value = struct.unpack("<d", data[pos:pos + 8])[0]
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        else:
+            raise ValueError(f"unexpected wire type {wire_type}")
+        spec = schema[field]
+        if isinstance(spec, tuple):
+            message[spec[0]] = decode(value, spec[1])
+        else:
+            message[spec] = value.decode() if isinstance(value, bytes) else value
+    return message
+
+
+def unframe(data: bytes) -> dict:
+    """Strip mesh/stream framing and decode the TakMessage."""
+    if data[:3] == b"\xbf\x01\xbf":
+        return decode(data[3:], TAK_MESSAGE)
+    assert data[0] == 0xBF
+    length, pos = _varint(data, 1)
+    assert len(data) == pos + length
+    return decode(data[pos:], TAK_MESSAGE)
+
+
+@pytest.fixture(autouse=True)
+def frozen_cot_time(monkeypatch):
+    """Freeze PyTAK timestamps at FROZEN so both paths agree."""
+
+    def _cot_time(cot_stale=None):
+        moment = FROZEN + datetime.timedelta(seconds=int(cot_stale or 0))
+        return moment.strftime(pytak.W3C_XML_DATETIME)
+
+    monkeypatch.setattr(pytak, "cot_time", _cot_time)
+
+
+@pytest.fixture
+def gps_info():
+    return {
+        "class": "TPV",
+        "mode": 3,
+        "lat": 37.760050100,
+        "lon": -122.497702900,
+        "altHAE": 20.6260,
+        "epx": 3.0,
+        "epy": 4.0,
+        "epv": 6.5,
+        "track": 359.4589,
+        "speed": 0.027,
+    }
+
+
+CONFIG = {
+    "CALLSIGN": "edge-node-1",
+    "COT_UID": "abc123def4567890",
+    "COT_URL": "tls://tak.example.com:8089",
+    "COCKPIT_URL": "http://edge-node-1.local:9090/",
+}
+
+
+def _assert_matches_xml(gps_info, config, wire=STREAM):
+    parts = _position_parts(gps_info, Settings.from_config(config))
+    direct = encode_position(parts, wire, now=FROZEN)
+    assert direct == encode_event(position_to_cot_xml(gps_info, config), wire)
+    return direct
+
+
+def test_direct_encoder_matches_xml_path(gps_info):
+    """The direct encoder matches encoding the ElementTree event."""
+    decoded = unframe(_assert_matches_xml(gps_info, CONFIG))["cotEvent"]
+    assert decoded["uid"] == "abc123def4567890"
+    assert decoded["type"] == "a-f-G-E-S"
+    assert decoded["how"] == "m-g"
+    assert decoded["sendTime"] == decoded["startTime"] == 1686763923250
+    assert decoded["staleTime"] == 1686763923250 + 3600 * 1000
+    assert decoded["lat"] == 37.76
+    assert (decoded["lon"], decoded["hae"]) == (-122.4977, 20.626)
+    assert decoded["ce"] == 5.0
+    detail = decoded["detail"]
+    assert detail["contact"] == {"callsign": "edge-node-1"}
+    assert detail["track"] == {"speed": 0.027, "course": 359.4589}
+    assert detail["xmlDetail"].startswith("<_flow-tags_ ")
+    assert "<remarks>Host: " in detail["xmlDetail"]
+    assert detail["xmlDetail"].endswith(
+        '<link url="http://edge-node-1.local:9090" relation="r-u" type="a-f-G-E-S" />'
+    )
+
+
+@pytest.fixture
+def golden_host(monkeypatch, request):
+    """Use the host id the golden messages were recorded with."""
+    monkeypatch.setattr(pytak, "DEFAULT_HOST_ID", "golden@host")
+    _flow_tag_key.cache_clear()
+    request.addfinalizer(_flow_tag_key.cache_clear)
+
+
+def test_golden_position(golden_host):
+    """A fixed position encodes to the recorded golden message."""
+    encoded = encode_position(GOLDEN_PARTS, MESH, now=FROZEN)
+    assert encoded == GOLDEN.read_bytes()
+    decoded = unframe(encoded)["cotEvent"]
+    assert decoded["detail"]["xmlDetail"].endswith(
+        "<remarks>Golden &lt;node&gt; &amp; &#252;</remarks>"
+        '<link url="http://golden.local:9090" relation="r-u" type="a-f-G-E-S" />'
+    )
+    assert decoded["staleTime"] - decoded["sendTime"] == 120000
+
+
+def test_escaping_and_detail_children(gps_info, tmp_path):
+    """Typed children become fields; unknown and namespaced ones go to xmlDetail."""
+    script = tmp_path / "detail.sh"
+    script.write_text(
+        "#!/bin/sh\n"
+        "echo '<status battery=\"90\" />'\n"
+        "echo '<aryaos version=\"1\"><host name=\"n&amp;1\" /></aryaos>'\n"
+        "echo '<x:ext xmlns:x=\"urn:example\" x:v=\"1\" />'\n"
+        "echo '<takv device=\"pi\" os=\"linux\" />'\n",
+        encoding="utf-8",
+    )
+    script.chmod(0o755)
+    config = dict(
+        CONFIG,
+        CALLSIGN='ed<ge> & "node"',
+        REMARKS_EXTRA="Site <Alpha> — ünïcode",
+        COT_DETAIL_XML_CMD=str(script),
+    )
+    detail = unframe(_assert_matches_xml(gps_info, config))["cotEvent"]["detail"]
+    assert detail["status"] == {"battery": 90}
+    assert detail["takv"] == {"device": "pi", "os": "linux"}
+    assert detail["contact"] == {"callsign": 'ed<ge> & "node"'}
+    assert '<aryaos version="1"><host name="n&amp;1" /></aryaos>' in detail["xmlDetail"]
+    assert 'xmlns:ns0="urn:example"' in detail["xmlDetail"]
+    assert "&#8212;" in detail["xmlDetail"]
+
+
+def test_time_from_fix(gps_info):
+    """COT_TIME_FROM_FIX is honoured by the direct encoder too."""
+    gps_info["time"] = "2023-06-14T10:00:00.500Z"
+    config = dict(CONFIG, COT_TIME_FROM_FIX="1", COT_STALE="60")
+    decoded = unframe(_assert_matches_xml(gps_info, config, MESH))["cotEvent"]
+    assert decoded["sendTime"] == 1686736800500
+    assert decoded["staleTime"] == 1686736860500
+
+    config["COT_STALE"] = "0"
+    decoded = unframe(_assert_matches_xml(gps_info, config, MESH))["cotEvent"]
+    assert decoded["staleTime"] == 1686736800500 + 1000 * int(pytak.DEFAULT_COT_STALE)
+
+
+def test_matches_takproto(golden_host):
+    """Byte-identical to takproto's XML conversion, for both framings."""
+    assert encode_position(GOLDEN_PARTS, MESH, FROZEN) == GOLDEN.read_bytes()
+    assert encode_position(GOLDEN_PARTS, STREAM, FROZEN) == GOLDEN_STREAM.read_bytes()
+    sensor = lincot.gen_sensor_cot({"SENSOR_ID": "golden-sensor"}, 1.5, 2.5, 3.0)
+    assert encode_event(sensor, STREAM) == GOLDEN_SENSOR.read_bytes()
+
+
+def test_wire_format():
+    """Multicast destinations use mesh framing, everything else stream."""
+    assert wire_format({"COT_URL": "udp://239.2.3.1:6969"}) == MESH
+    assert wire_format({"COT_URL": "tls://tak.example.com:8089"}) == STREAM
+    assert wire_format({"COT_URL": "tcp://10.0.0.1:8087"}) == STREAM
+
+
+@pytest.mark.asyncio
+async def test_workers_emit_protobuf(gps_info):
+    """With TAK_PROTO set, events are queued as protobuf and PyTAK won't convert."""
+    queue = asyncio.Queue()
+    config = dict(CONFIG, TAK_PROTO="1")
+    worker = lincot.LincotWorker(queue, config)
+    await worker.handle_data(gps_info)
+    event = queue.get_nowait()
+    assert unframe(event)["cotEvent"]["uid"] == "abc123def4567890"
+
+    tx_worker = pytak.TXWorker(queue, config, writer=None)
+    tx_worker.use_protobuf = True
+
+    class _CLITool:
+        tx_queue = queue
+        tasks = {tx_worker}
+
+    lincot.create_tasks(config, _CLITool)
+    assert tx_worker.use_protobuf is False
+
+
+@pytest.mark.asyncio
+async def test_hello_is_encoded_for_protobuf():
+    """PyTAK's XML hello event is framed too, never written raw to the stream."""
+    sent = []
+
+    class _TXWorker(pytak.TXWorker):
+        async def send_data(self, data):
+            sent.append(data)
+
+    queue = asyncio.Queue()
+    config = dict(CONFIG, TAK_PROTO="1")
+    tx_worker = _TXWorker(queue, config, writer=None)
+
+    class _CLITool:
+        tx_queue = queue
+        tasks = {tx_worker}
+
+    lincot.create_tasks(config, _CLITool)
+    await tx_worker.send_data(pytak.hello_event("golden@host"))
+    await tx_worker.send_data(b"not xml")
+    assert len(sent) == 1
+    hello = unframe(sent[0])["cotEvent"]
+    assert hello["type"] == "t-x-d-d"
+    assert hello["uid"] == "golden@host"
+
+
+def test_negative_unsigned_fields_are_unset():
+    """A negative battery or pre-1970 time encodes as unset instead of failing."""
+    detail = pytak.cot_detail(ET.Element("status", battery="-5"))
+    event = pytak.cot_event(uid="old", cot_type="a-f-G", detail=detail)
+    event.set("time", "1960-01-01T00:00:00Z")
+    decoded = unframe(encode_event(event, STREAM))["cotEvent"]
+    assert "sendTime" not in decoded
+    assert decoded["uid"] == "old"
+    assert "status" not in decoded["detail"]
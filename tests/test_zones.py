@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright Sensors & Signals LLC https://www.snstac.com/
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Geofence zone index and adaptive reporting rate tests."""
+
+import asyncio
+import json
+import random
+
+import pytest
+
+import lincot
+from lincot.scheduler import Schedule
+from lincot.zones import (
+    RatePolicy,
+    ZoneIndex,
+    contains,
+    get_zone_index,
+    speed_bands,
+    zones_from_geojson,
+)
+
+
+def _square(lon, lat, size, interval, name=None, holes=()):
+    def ring(x, y, side):
+        return [[x, y], [x + side, y], [x + side, y + side], [x, y + side], [x, y]]
+
+    return {
+        "type": "Feature",
+        "properties": {"name": name, "interval": interval},
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [ring(lon, lat, size)] + [ring(*hole) for hole in holes],
+        },
+    }
+
+
+def _collection(*features):
+    return {"type": "FeatureCollection", "features": list(features)}
+
+
+def test_polygon_with_hole_and_concave_outline():
+    """Holes are excluded and concave outlines follow their edges."""
+    depot = zones_from_geojson(
+        _collection(_square(0, 0, 10, 600, holes=[(4, 4, 2)]))
+    )[0]
+    assert contains(depot, 1, 1)
+    assert not contains(depot, 5, 5)
+    assert not contains(depot, 11, 5)
+    ell = zones_from_geojson(
+        {
+            "type": "Feature",
+            "properties": {"interval": 5},
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[[0, 0], [4, 0], [4, 1], [1, 1], [1, 4], [0, 4]]],
+            },
+        }
+    )[0]
+    assert contains(ell, 3, 0.5)  # lat 3 in the vertical arm
+    assert not contains(ell, 3, 3)  # the notch
+
+
+def test_overlapping_zones_shortest_interval_wins():
+    """A gate inside the depot reports at the gate's faster rate."""
+    index = ZoneIndex(
+        zones_from_geojson(
+            _collection(
+                _square(0, 0, 10, 600, "depot"), _square(2, 2, 1, 5, "gate")
+            )
+        )
+    )
+    assert index.interval(2.5, 2.5) == 5
+    assert index.interval(8, 8) == 600
+    assert index.interval(20, 20) is None
+
+
+def test_grid_index_matches_brute_force():
+    """Thousands of zones: the grid gives the same answers, from few candidates."""
+    rng = random.Random(7)
+    features = [
+        _square(rng.uniform(-10, 10), rng.uniform(40, 50), 0.05, rng.randint(5, 600))
+        for _ in range(3000)
+    ]
+    features.append(_square(-20, 30, 40, 900, "region"))
+    zones = zones_from_geojson(_collection(*features))
+    index = ZoneIndex(zones)
+    assert [zone.name for zone in index.large] == ["region"]
+    assert max(len(cell) for cell in index.cells.values()) < 20
+    for _ in range(500):
+        lat, lon = rng.uniform(40, 50), rng.uniform(-10, 10)
+        expected = min(zone.interval for zone in zones if contains(zone, lat, lon))
+        assert index.interval(lat, lon) == expected
+
+
+@pytest.mark.parametrize(
+    "feature",
+    [
+        {"properties": {}, "geometry": {"type": "Polygon", "coordinates": []}},
+        {"properties": {"interval": 0}, "geometry": {"type": "Polygon"}},
+        {"properties": {"interval": 5}, "geometry": {"type": "Point"}},
+        {
+            "properties": {"interval": 5},
+            "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 1]]]},
+        },
+    ],
+)
+def test_invalid_zones(feature):
+    """Zones without a usable interval or polygon fail at startup."""
+    with pytest.raises(ValueError):
+        zones_from_geojson(_collection(feature))
+
+
+def test_speed_bands():
+    """Bands apply from their speed upwards; the highest band reached wins."""
+    policy = RatePolicy(60, bands=speed_bands("15:0.1, 2:0.5"), minimum=1)
+    assert policy.speed_factor(None) == 1.0
+    assert policy.speed_factor(1.9) == 1.0
+    assert policy.speed_factor(2.0) == 0.5
+    assert policy.speed_factor(30) == 0.1
+    assert policy.interval({"speed": 30}) == 6
+    with pytest.raises(ValueError):
+        speed_bands("fast:0.5")
+    with pytest.raises(ValueError):
+        speed_bands("2:0")
+
+
+def test_rate_policy_from_config(tmp_path):
+    """Zones and speed combine, clamped at MIN_POLL_INTERVAL; loaded once."""
+    path = tmp_path / "zones.geojson"
+    path.write_text(
+        json.dumps(_collection(_square(-123, 45, 1, 4, "range"))), encoding="utf-8"
+    )
+    assert RatePolicy.from_config({}, 61) is None
+    config = {"ZONES_FILE": str(path), "SPEED_BANDS": "5:0.5", "MIN_POLL_INTERVAL": 3}
+    policy = RatePolicy.from_config(config, 61)
+    assert policy.interval({"lat": 45.5, "lon": -122.5, "speed": 0}) == 4
+    assert policy.interval({"lat": 45.5, "lon": -122.5, "speed": 9}) == 3
+    assert policy.interval({"lat": 10.0, "lon": 10.0, "speed": 9}) == 30.5
+    assert policy.index is get_zone_index(str(path))
+    with pytest.raises(ValueError):
+        RatePolicy.from_config({"ZONES_FILE": str(tmp_path / "missing.json")}, 61)
+
+
+def test_position_service_adapts_poll_period(tmp_path):
+    """Entering a zone shortens the position schedule's period."""
+    path = tmp_path / "zones.geojson"
+    path.write_text(
+        json.dumps(_collection(_square(-123, 45, 1, 5, "range"))), encoding="utf-8"
+    )
+    config = {
+        "ZONES_FILE": str(path),
+        "STATIC_LAT": "45.5",
+        "STATIC_LON": "-122.5",
+        "POLL_INTERVAL": "600",
+    }
+    service = lincot.PositionService(asyncio.Queue(), config)
+    schedule = Schedule(service.poll_interval)
+    schedule.delay(now=0.0)
+    service.adapt(schedule, {"lat": 45.5, "lon": -122.5})
+    assert schedule.period == 5
+    assert schedule.deadline == 605.0  # first tick at 600, next one 5 s later